@@ -0,0 +1,358 @@
+"""
+Motor ALNS (Adaptive Large Neighbourhood Search) para instâncias grandes demais para o MIP.
+
+Cada iteração destrói parte da solução (remoção aleatória, pior custo, relacionada/Shaw ou de viagem
+inteira) e a reconstrói por inserção gulosa ou por arrependimento (regret-2/3). Os operadores são
+sorteados por roleta com pesos adaptados ao desempenho recente, e a aceitação segue um recozimento
+simulado com resfriamento geométrico. As inserções reavaliam só as viagens do veículo a
+partir da viagem alterada (ver `heuristicas.melhores_insercoes`).
+"""
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from heuristicas import (
+    Instancia,
+    Viagem,
+    melhores_insercoes,
+    ordenar_por_tipo,
+    rotas_rapidas,
+)
+
+Tarefa = Tuple[str, int, int]     # ("delivery", nó, quantidade) ou ("pair", pickup, dropoff)
+Rotas = Dict[str, List[Viagem]]
+
+
+@dataclass
+class ParametrosALNS:
+    tempo_limite_s: float = 60.0
+    seed: int = 0
+    # fração das tarefas removidas por iteração (sorteada no intervalo) e teto absoluto
+    remocao_min: float = 0.1
+    remocao_max: float = 0.3
+    remocao_teto: int = 40
+    # roleta adaptativa: pontuações (novo melhor, melhora a atual, aceita), tamanho do segmento e reação
+    pontuacoes: Tuple[float, float, float] = (33.0, 9.0, 13.0)
+    segmento: int = 50
+    reacao: float = 0.2
+    # piora relativa aceita com probabilidade 1/2 no início; a temperatura cai por um fator fixo a cada
+    # iteração (não pelo relógio), de modo que a mesma seed reproduz a mesma busca até o limite de tempo
+    piora_inicial: float = 0.05
+    resfriamento: float = 0.998
+    # aleatoriedade das remoções por pior custo e relacionada (maior = mais determinístico)
+    determinismo: float = 4.0
+    max_iteracoes: int | None = None
+    historico: bool = False
+
+
+@dataclass
+class EstatisticasALNS:
+    iteracoes: int = 0
+    melhorias: int = 0
+    custo_inicial: float = math.inf
+    custo_final: float = math.inf
+    tempo_s: float = 0.0
+    pesos_remocao: Dict[str, float] = field(default_factory=dict)
+    pesos_insercao: Dict[str, float] = field(default_factory=dict)
+    historico: List[Tuple[float, float]] = field(default_factory=list)
+
+
+class _Estado:
+    """Rotas por veículo com o custo de cada veículo em cache."""
+
+    def __init__(self, inst: Instancia, rotas: Rotas, custos: Dict[str, float] | None = None):
+        self.inst = inst
+        self.rotas = rotas
+        self.custos = custos if custos is not None else {k: inst.avaliar_veiculo(k, v)[1] for k, v in rotas.items()}
+
+    def copia(self) -> "_Estado":
+        return _Estado(self.inst, {k: [list(v) for v in viagens] for k, viagens in self.rotas.items()}, dict(self.custos))
+
+    @property
+    def custo(self) -> float:
+        return sum(self.custos.values())
+
+    def paradas(self) -> List[Tuple[str, int, int, int]]:
+        """Tarefas presentes (veículo, viagem, nó, quantidade); pares representados pela coleta."""
+        nodes = self.inst.nodes
+        return [
+            (k, t, n, q)
+            for k, viagens in self.rotas.items()
+            for t, viagem in enumerate(viagens)
+            for n, q in viagem
+            if nodes[n].service_type != "dropoff"
+        ]
+
+    def tarefa(self, n: int, q: int) -> Tarefa:
+        par = self.inst.drop_of.get(n)
+        return ("pair", n, par) if par is not None else ("delivery", n, q)
+
+    def remover(self, k: str, t: int, n: int, q: int) -> Tarefa:
+        par = self.inst.drop_of.get(n)
+        viagem = [m for m in self.rotas[k][t] if m != (n, q) and (par is None or m[0] != par)]
+        self.rotas[k][t] = viagem
+        return self.tarefa(n, q)
+
+    def compactar(self, veiculos: List[str]) -> None:
+        """Descarta viagens vazias e recalcula o custo dos veículos alterados."""
+        for k in set(veiculos):
+            self.rotas[k] = [v for v in self.rotas[k] if v]
+            ok, custo = self.inst.avaliar_veiculo(k, self.rotas[k])
+            self.custos[k] = custo if ok else math.inf
+
+
+# ---------------------------------------------------------------------------
+# Operadores de remoção: recebem o estado, o número de tarefas e o gerador; devolvem as tarefas retiradas
+# ---------------------------------------------------------------------------
+
+def _remocao_aleatoria(estado: _Estado, n_remover: int, rnd: random.Random, _: ParametrosALNS) -> List[Tarefa]:
+    paradas = estado.paradas()
+    escolhidas = rnd.sample(paradas, min(n_remover, len(paradas)))
+    return _remover_paradas(estado, escolhidas)
+
+
+def _remocao_pior(estado: _Estado, n_remover: int, rnd: random.Random, params: ParametrosALNS) -> List[Tarefa]:
+    """Remove tarefas cujo custo de permanência (custo do veículo com e sem a tarefa) é maior."""
+    inst = estado.inst
+    ganhos = []
+    for k, t, n, q in estado.paradas():
+        par = inst.drop_of.get(n)
+        viagens = list(estado.rotas[k])
+        viagens[t] = [m for m in viagens[t] if m != (n, q) and (par is None or m[0] != par)]
+        ok, custo = inst.avaliar_veiculo(k, [v for v in viagens if v])
+        ganhos.append((estado.custos[k] - custo if ok else -math.inf, (k, t, n, q)))
+    ganhos.sort(key=lambda g: -g[0])
+    escolhidas = []
+    while ganhos and len(escolhidas) < n_remover:
+        idx = int(len(ganhos) * rnd.random() ** params.determinismo)
+        escolhidas.append(ganhos.pop(idx)[1])
+    return _remover_paradas(estado, escolhidas)
+
+
+def _remocao_relacionada(estado: _Estado, n_remover: int, rnd: random.Random, params: ParametrosALNS) -> List[Tarefa]:
+    """Shaw: a partir de uma tarefa semente, remove as mais parecidas em local, prazo e item."""
+    inst = estado.inst
+    paradas = estado.paradas()
+    if not paradas:
+        return []
+    d_max = max(max(linha) for linha in inst._dist) or 1.0
+    prazo_max = max(n.prazo_horas for n in inst.nodes.values()) or 1.0
+    semente = rnd.choice(paradas)
+    ns = inst.nodes[semente[2]]
+
+    def relacao(p: Tuple[str, int, int, int]) -> float:
+        nd = inst.nodes[p[2]]
+        return (
+            inst.d(semente[2], p[2]) / d_max
+            + abs(nd.prazo_horas - ns.prazo_horas) / prazo_max
+            + (0.0 if nd.item == ns.item else 0.5)
+            + (0.0 if p[0] == semente[0] else 0.2)
+        )
+
+    candidatas = sorted((p for p in paradas if p != semente), key=relacao)
+    escolhidas = [semente]
+    while candidatas and len(escolhidas) < n_remover:
+        idx = int(len(candidatas) * rnd.random() ** params.determinismo)
+        escolhidas.append(candidatas.pop(idx))
+    return _remover_paradas(estado, escolhidas)
+
+
+def _remocao_viagem(estado: _Estado, n_remover: int, rnd: random.Random, _: ParametrosALNS) -> List[Tarefa]:
+    """Remove viagens inteiras (sorteadas, com preferência pelas curtas) até atingir o número pedido."""
+    viagens = [(k, t) for k, vs in estado.rotas.items() for t, v in enumerate(vs) if v]
+    rnd.shuffle(viagens)
+    viagens.sort(key=lambda kt: len(estado.rotas[kt[0]][kt[1]]))
+    escolhidas = []
+    for k, t in viagens:
+        if len(escolhidas) >= n_remover:
+            break
+        escolhidas.extend((k, t, n, q) for n, q in estado.rotas[k][t] if estado.inst.nodes[n].service_type != "dropoff")
+    return _remover_paradas(estado, escolhidas)
+
+
+def _remover_paradas(estado: _Estado, paradas: List[Tuple[str, int, int, int]]) -> List[Tarefa]:
+    removidas = [estado.remover(k, t, n, q) for k, t, n, q in paradas]
+    estado.compactar([k for k, *_ in paradas])
+    return removidas
+
+
+# ---------------------------------------------------------------------------
+# Operadores de inserção: reinserem todas as tarefas pendentes; retornam False se alguma não couber
+# ---------------------------------------------------------------------------
+
+def _aplicar(estado: _Estado, k: str, delta: float, viagens: List[Viagem]) -> None:
+    estado.rotas[k] = viagens
+    estado.custos[k] += delta
+
+
+def _qtd(tarefa: Tarefa) -> int:
+    return tarefa[2] if tarefa[0] == "delivery" else 0
+
+
+def _restante(tarefa: Tarefa, q: int) -> Tarefa | None:
+    if tarefa[0] == "delivery" and q < tarefa[2]:
+        return ("delivery", tarefa[1], tarefa[2] - q)
+    return None
+
+
+def _insercao_gulosa(estado: _Estado, pendentes: List[Tarefa], rnd: random.Random) -> bool:
+    inst = estado.inst
+    fila = list(pendentes)
+    rnd.shuffle(fila)
+    while fila:
+        tarefa = fila.pop()
+        por_veiculo = melhores_insercoes(inst, estado.rotas, estado.custos, tarefa, _qtd(tarefa), so_melhor=True)
+        if not por_veiculo:
+            return False
+        k = min(por_veiculo, key=lambda v: por_veiculo[v][0])
+        delta, viagens, q = por_veiculo[k]
+        _aplicar(estado, k, delta, viagens)
+        resto = _restante(tarefa, q)
+        if resto:
+            fila.append(resto)
+    return True
+
+
+def _insercao_regret(grau: int) -> Callable[[_Estado, List[Tarefa], random.Random], bool]:
+    def inserir(estado: _Estado, pendentes: List[Tarefa], rnd: random.Random) -> bool:
+        """
+        Regret-k: insere primeiro a tarefa que mais perderia se não fosse para o melhor veículo
+        (soma das diferenças entre o melhor e os k-1 seguintes). Só os veículos alterados são recalculados.
+        """
+        inst = estado.inst
+        fila = list(pendentes)
+        cache: Dict[int, Dict[str, Tuple[float, List[Viagem], int]]] = {}
+        alterado: str | None = None
+        while fila:
+            escolha = None
+            for i, tarefa in enumerate(fila):
+                if i not in cache:
+                    cache[i] = melhores_insercoes(inst, estado.rotas, estado.custos, tarefa, _qtd(tarefa))
+                elif alterado is not None:
+                    cache[i].pop(alterado, None)
+                    cache[i].update(melhores_insercoes(inst, estado.rotas, estado.custos, tarefa, _qtd(tarefa), [alterado]))
+                opcoes = sorted(cache[i].items(), key=lambda kv: kv[1][0])
+                if not opcoes:
+                    return False
+                custos = [c[0] for _, c in opcoes[:grau]]
+                custos += [math.inf] * (grau - len(custos))
+                arrependimento = sum(c - custos[0] for c in custos[1:])
+                chave = (arrependimento, -custos[0], rnd.random())
+                if escolha is None or chave > escolha[0]:
+                    escolha = (chave, i, opcoes[0])
+            _, i, (k, (delta, viagens, q)) = escolha
+            _aplicar(estado, k, delta, viagens)
+            alterado = k
+            tarefa = fila[i]
+            resto = _restante(tarefa, q)
+            # reindexa o cache (posições após i deslocam uma casa)
+            fila.pop(i)
+            cache = {j - (j > i): c for j, c in cache.items() if j != i}
+            if resto:
+                fila.append(resto)
+        return True
+
+    return inserir
+
+
+REMOCOES: Dict[str, Callable[..., List[Tarefa]]] = {
+    "aleatoria": _remocao_aleatoria,
+    "pior": _remocao_pior,
+    "relacionada": _remocao_relacionada,
+    "viagem": _remocao_viagem,
+}
+INSERCOES: Dict[str, Callable[[_Estado, List[Tarefa], random.Random], bool]] = {
+    "gulosa": _insercao_gulosa,
+    "regret2": _insercao_regret(2),
+    "regret3": _insercao_regret(3),
+}
+
+
+def _roleta(pesos: Dict[str, float], rnd: random.Random) -> str:
+    alvo = rnd.random() * sum(pesos.values())
+    for nome, peso in pesos.items():
+        alvo -= peso
+        if alvo <= 0:
+            return nome
+    return nome
+
+
+def alns(inst: Instancia, rotas: Rotas, params: ParametrosALNS | None = None) -> Tuple[Rotas, EstatisticasALNS]:
+    """Melhora as rotas iniciais por ALNS dentro do orçamento de tempo; retorna as melhores rotas encontradas."""
+    params = params or ParametrosALNS()
+    rnd = random.Random(params.seed)
+    t0 = time.perf_counter()
+    atual = _Estado(inst, {k: [list(v) for v in rotas.get(k, []) if v] for k in inst.veiculos})
+    melhor = atual.copia()
+    stats = EstatisticasALNS(custo_inicial=atual.custo)
+    pesos_r = {nome: 1.0 for nome in REMOCOES}
+    pesos_i = {nome: 1.0 for nome in INSERCOES}
+    placar_r = {nome: [0.0, 0] for nome in REMOCOES}
+    placar_i = {nome: [0.0, 0] for nome in INSERCOES}
+    # temperatura em que uma piora de `piora_inicial` * custo é aceita com probabilidade 1/2
+    temperatura = params.piora_inicial * atual.custo / math.log(2) if math.isfinite(atual.custo) else 0.0
+    n_tarefas = len(atual.paradas())
+
+    while True:
+        decorrido = time.perf_counter() - t0
+        if decorrido >= params.tempo_limite_s or n_tarefas == 0:
+            break
+        if params.max_iteracoes is not None and stats.iteracoes >= params.max_iteracoes:
+            break
+        stats.iteracoes += 1
+        temperatura *= params.resfriamento
+
+        nome_r = _roleta(pesos_r, rnd)
+        nome_i = _roleta(pesos_i, rnd)
+        fracao = rnd.uniform(params.remocao_min, params.remocao_max)
+        n_remover = max(1, min(params.remocao_teto, round(fracao * n_tarefas)))
+
+        candidato = atual.copia()
+        removidas = REMOCOES[nome_r](candidato, n_remover, rnd, params)
+        pontos = 0.0
+        if INSERCOES[nome_i](candidato, removidas, rnd):
+            custo = candidato.custo
+            if custo < melhor.custo - 1e-6:
+                melhor = candidato.copia()
+                atual = candidato
+                stats.melhorias += 1
+                pontos = params.pontuacoes[0]
+            elif custo < atual.custo - 1e-6:
+                atual = candidato
+                pontos = params.pontuacoes[1]
+            elif temperatura > 0 and rnd.random() < math.exp(-(custo - atual.custo) / temperatura):
+                atual = candidato
+                pontos = params.pontuacoes[2]
+        placar_r[nome_r][0] += pontos
+        placar_r[nome_r][1] += 1
+        placar_i[nome_i][0] += pontos
+        placar_i[nome_i][1] += 1
+        if params.historico:
+            stats.historico.append((time.perf_counter() - t0, melhor.custo))
+
+        if stats.iteracoes % params.segmento == 0:
+            for pesos, placar in ((pesos_r, placar_r), (pesos_i, placar_i)):
+                for nome, (soma, usos) in placar.items():
+                    if usos:
+                        pesos[nome] = (1 - params.reacao) * pesos[nome] + params.reacao * soma / usos
+                    pesos[nome] = max(pesos[nome], 0.05)
+                    placar[nome] = [0.0, 0]
+
+    stats.custo_final = melhor.custo
+    stats.tempo_s = time.perf_counter() - t0
+    stats.pesos_remocao = {k: round(v, 3) for k, v in pesos_r.items()}
+    stats.pesos_insercao = {k: round(v, 3) for k, v in pesos_i.items()}
+    return melhor.rotas, stats
+
+
+def plano_alns(dados: Dict[str, Any], params: ParametrosALNS | None = None) -> Tuple[Dict[str, Any], List[int], EstatisticasALNS]:
+    """Parte do plano rápido (Clarke-Wright + busca local) e o melhora por ALNS."""
+    inst = Instancia(dados)
+    rotas, pendentes = rotas_rapidas(inst)
+    rotas, stats = alns(inst, rotas, params)
+    rotas = ordenar_por_tipo(inst, rotas)
+    plano = inst.plano(rotas)
+    plano["custo"] = inst.custo_plano(rotas)
+    return plano, pendentes, stats
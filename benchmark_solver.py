@@ -0,0 +1,159 @@
+"""
+Benchmark do solver de rotas em instâncias sintéticas.
+
+Roda cada configuração de OpcoesSolver sobre as mesmas instâncias e compara tempo até o gap alvo,
+objetivo e gap final. Uso:
+
+    python benchmark_solver.py --entregas 6 --coletas 1 --veiculos 4 --seeds 0 1 2 --config base simetria
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+import solver_pulp
+
+# Configurações comparáveis: nome -> campos de OpcoesSolver
+CONFIGURACOES: Dict[str, Dict[str, Any]] = {
+    "base": {},
+    "simetria_veiculos": {"simetria_veiculos": True},
+    "simetria_viagens": {"simetria_viagens": True},
+    "simetria": {"simetria_veiculos": True, "simetria_viagens": True},
+    "portfolio": {"portfolio": 4},
+    "horizonte_dinamico": {"horizonte_dinamico": True},
+    "big_m_global": {"big_m_por_arco": False},
+    "fluxo_carga": {"formulacao_carga": "fluxo"},
+    "agrupar_locais": {"agrupar_locais": True},
+}
+
+
+def gerar_instancia(
+    n_entregas: int,
+    n_coletas: int,
+    n_veiculos: int,
+    seed: int = 0,
+    n_locais: int | None = None,
+    n_pessoas: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Frota com dois tipos alternados (caminhonete/caminhão) e demandas em torno do CD."""
+    rnd = random.Random(seed)
+    veiculos = []
+    for v in range(n_veiculos):
+        caminhonete = v % 2 == 0
+        veiculos.append({
+            "PLACA": f"V{v:02d}",
+            "MODELO": "SINTETICO",
+            "CATEGORIA": "CAMINHONETE" if caminhonete else "CAMINHAO",
+            "Capacidade (Slots)": 40 if caminhonete else 80,
+            "Custo Variável (R$/Km)": 1.5 if caminhonete else 2.5,
+            "VALOR LOCAÇÃO": 100.0,
+            "Custo Fixo Motorista": 50.0,
+            "Retorna_CD": 1,
+            "Comprimento": 3.5,
+            "Largura": 1.5,
+            "Altura": 1.0,
+        })
+
+    itens = pd.DataFrame([
+        {"Nomes Normalizados": "CAIXA A", "Comprimento (m)": 0.5, "Largura": 0.4, "Altura": 0.3},
+        {"Nomes Normalizados": "CAIXA B", "Comprimento (m)": 1.0, "Largura": 0.5, "Altura": 0.3},
+        {"Nomes Normalizados": "CAIXA PLÁSTICA DE TESTEMUNHO HQ/HWL – GERAÇÃO I", "Comprimento (m)": 0.5, "Largura": 0.3, "Altura": 0.2},
+    ])
+
+    lat0, lon0 = solver_pulp.CD_COORDS
+    n_locais = n_locais or max(2, n_entregas)
+    locais = [(f"Local{i:03d}", lat0 + rnd.uniform(-0.6, 0.6), lon0 + rnd.uniform(-0.6, 0.6)) for i in range(n_locais)]
+
+    linhas = []
+    for e in range(n_entregas):
+        nome, lat, lon = locais[e % n_locais]
+        item = "CAIXA A" if e % 2 == 0 else "CAIXA B"
+        qtd = rnd.randint(1, 5)
+        slots = 2 if item == "CAIXA A" else 4
+        linhas.append({
+            "Local": nome, "Latitude": lat, "Longitude": lon,
+            "Destino_Coleta": None, "Lat_Destino": None, "Lon_Destino": None,
+            "Tipo_Operacao": "Entrega", "Item": item, "Código": "SINT", "Quantidade": qtd,
+            "Peso_Unitario_kg": 5.0, "Slots (Unitário)": slots, "Slots (Total)": slots * qtd,
+            "Prioridade": rnd.randint(0, 2),
+        })
+    for item, n, qtd, slots in (("Coleta de Testemunho", n_coletas, None, 2), (solver_pulp.PESSOAS_ITEM, n_pessoas, 2, 7)):
+        for _ in range(n):
+            origem = locais[rnd.randrange(n_locais)]
+            destino = locais[rnd.randrange(n_locais)]
+            q = qtd or rnd.randint(1, 3)
+            linhas.append({
+                "Local": origem[0], "Latitude": origem[1], "Longitude": origem[2],
+                "Destino_Coleta": destino[0], "Lat_Destino": destino[1], "Lon_Destino": destino[2],
+                "Tipo_Operacao": "Coleta", "Item": item, "Código": "N/A", "Quantidade": q,
+                "Peso_Unitario_kg": 5.0, "Slots (Unitário)": slots, "Slots (Total)": slots * q,
+                "Prioridade": 1,
+            })
+    return pd.DataFrame(veiculos), pd.DataFrame(linhas), itens
+
+
+def rodar(
+    instancias: List[Tuple[int, Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]]],
+    configs: List[str],
+    base: Dict[str, Any],
+) -> pd.DataFrame:
+    linhas = []
+    for seed, (df_v, df_p, df_i) in instancias:
+        for nome in configs:
+            opcoes = solver_pulp.OpcoesSolver(**{**base, **CONFIGURACOES[nome]})
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado = solver_pulp.executar_solver(df_v, df_p, df_i, opcoes=opcoes)
+            linhas.append({
+                "seed": seed,
+                "config": nome,
+                "status": resultado.get("status"),
+                "tempo_s": round(time.perf_counter() - t0, 2),
+                "objetivo": resultado.get("objective_value"),
+                "gap_pct": resultado.get("mip_gap_pct"),
+                # limite dual ao fim do nó raiz: mede o aperto da formulação (big-M, cortes)
+                "limite_raiz": resultado.get("limite_raiz"),
+                "parada": resultado.get("motivo_parada"),
+                # instante do último incumbente: calibra janelas de estagnação e orçamentos de tempo
+                "ultimo_incumbente_s": (resultado.get("historico_incumbentes") or [{}])[-1].get("tempo_s"),
+                "viagens": resultado.get("summary", {}).get("viagens_utilizadas"),
+                "mensagem": resultado.get("mensagem", ""),
+            })
+            print(linhas[-1], flush=True)
+    return pd.DataFrame(linhas)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entregas", type=int, default=6)
+    parser.add_argument("--coletas", type=int, default=1)
+    parser.add_argument("--pessoas", type=int, default=0)
+    parser.add_argument("--veiculos", type=int, default=4)
+    parser.add_argument("--locais", type=int, default=None)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--config", nargs="+", default=list(CONFIGURACOES), choices=list(CONFIGURACOES))
+    parser.add_argument("--backend", default="highspy", choices=["pulp", "highspy"])
+    parser.add_argument("--gap", type=float, default=0.01, help="gap relativo alvo (mesmo para todas as configurações)")
+    parser.add_argument("--tempo", type=float, default=300.0, help="limite de tempo por execução (s)")
+    args = parser.parse_args()
+
+    instancias = [
+        (seed, gerar_instancia(args.entregas, args.coletas, args.veiculos, seed, args.locais, args.pessoas))
+        for seed in args.seeds
+    ]
+    # sem cache de resultados: cada execução mede o solver
+    base = {"backend": args.backend, "gap_rel": args.gap, "time_limit_s": args.tempo, "msg": False, "usar_cache": False}
+    tabela = rodar(instancias, args.config, base)
+
+    print()
+    print(tabela.to_string(index=False))
+    print()
+    print(tabela.groupby("config")[["tempo_s", "objetivo"]].mean().round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Formulação de cobertura sobre escalas de veículo, resolvida por geração de colunas no HiGHS.
+
+Cada coluna é a escala completa de um tipo de veículo: viagens encadeadas que saem do CD, atendem
+tarefas e voltam (o atraso de uma viagem depende da hora em que a anterior termina, então viagens
+isoladas não têm custo definido). O problema mestre cobre cada delivery pela quantidade e cada par
+coleta/entrega uma vez, com no máximo tantas colunas por tipo quanto placas do tipo.
+
+A precificação é um caminho mínimo com restrição de recursos (rótulos) sobre as tarefas, que
+respeita slots, itens longos e pessoas a bordo, pares na mesma viagem, horizonte e número de
+viagens. Rodadas heurísticas (feixe limitado, só vizinhos próximos) geram colunas; quando não acham
+mais nenhuma, a rodada exata (dominância completa) decide a convergência e fornece um limite
+inferior no espaço das colunas. Esse limite não vale para o modelo de arcos (a precificação só fraciona
+entregas que não cabem inteiras num veículo vazio, e sempre pelo máximo que cabe), então não prova
+otimalidade. O plano final vem do MIP sobre as colunas geradas (price-and-branch), sem coberturas repetidas.
+"""
+import math
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from heuristicas import Instancia, Viagem, inserir_tarefas, ordenar_por_tipo, rotas_rapidas
+from solver_pulp import MAX_PESSOAS_SIMULTANEAS, PENALIDADE_ATRASO, OpcoesSolver, _highs_options, _horizonte_modelo
+
+LARGURA_FEIXE = 40             # rótulos mantidos por nó e profundidade nas rodadas heurísticas
+VIZINHOS_PRECIFICACAO = 8      # sucessores mais próximos considerados nas rodadas heurísticas
+COLUNAS_POR_RODADA = 25        # colunas de custo reduzido negativo adicionadas por tipo e rodada
+MAX_ROTULOS_EXATA = 300_000    # acima disso a rodada exata desiste (limite inferior não certificado)
+FRACAO_TEMPO_CG = 0.5          # parte do time_limit_s reservada à geração de colunas
+CUSTO_ARTIFICIAL = 1e7
+EPS = 1e-6
+
+
+class _Rotulo:
+    __slots__ = ("no", "tempo", "custo", "rc", "visitados", "viagens", "d", "cur", "m", "ld", "lcur", "lm",
+                 "pessoas", "abertos", "pai", "passo")
+
+    def domina(self, outro: "_Rotulo") -> bool:
+        return (
+            self.rc <= outro.rc + EPS
+            and self.tempo <= outro.tempo + EPS
+            and self.viagens <= outro.viagens
+            and self.abertos == outro.abertos
+            and self.visitados & ~outro.visitados == 0
+            and self.d <= outro.d + EPS and self.cur <= outro.cur + EPS and self.m <= outro.m + EPS
+            and self.ld <= outro.ld + EPS and self.lcur <= outro.lcur + EPS and self.lm <= outro.lm + EPS
+            and self.pessoas <= outro.pessoas + EPS
+        )
+
+
+def _rotulo(pai: "_Rotulo | None", passo, **campos) -> _Rotulo:
+    r = _Rotulo()
+    r.pai = pai
+    r.passo = passo
+    for nome, valor in campos.items():
+        setattr(r, nome, valor)
+    return r
+
+
+def _viagens_do_rotulo(r: _Rotulo) -> List[Viagem]:
+    passos = []
+    while r is not None:
+        passos.append(r.passo)
+        r = r.pai
+    viagens: List[Viagem] = []
+    atual: Viagem = []
+    for passo in reversed(passos):
+        if passo == "inicio":
+            continue
+        if passo is None:
+            viagens.append(atual)
+            atual = []
+        else:
+            atual.append(passo)
+    return viagens
+
+
+class _Precificador:
+    """Rótulos de um tipo de veículo (placa representante) sobre as tarefas compatíveis."""
+
+    def __init__(self, inst: Instancia, placa: str):
+        self.inst = inst
+        self.k = placa
+        self.cap = inst.cap[placa]
+        self.long_cap = inst.long_cap[placa]
+        self.custo_km = inst.custo_km[placa]
+        self.nos = [n for n in inst.nodes if inst.compativel(placa, n)]
+        # sucessores por proximidade (o CD é o nó 0)
+        self.vizinhos = {
+            i: sorted((j for j in self.nos if j != i and inst.nodes[j].service_type != "dropoff"), key=lambda j: inst.d(i, j))
+            for i in [0] + self.nos
+        }
+
+    def _estender(self, r: _Rotulo, j: int, duais: Dict[int, float]) -> _Rotulo | None:
+        inst = self.inst
+        nd = inst.nodes[j]
+        q = 1
+        d, cur, m, ld, lcur, lm, pessoas, abertos = r.d, r.cur, r.m, r.ld, r.lcur, r.lm, r.pessoas, r.abertos
+        if nd.service_type == "delivery":
+            s, sl = inst.d_slots[j], inst.d_long[j]
+            total = int(round(nd.quantity))
+            cabe = math.floor((self.cap - d - m) / s + 1e-9) if s > 0 else total
+            if sl > 0 and math.isfinite(self.long_cap):
+                cabe = min(cabe, math.floor((self.long_cap - ld - lm) / sl + 1e-9))
+            # entrega parcial só para deliveries que não cabem inteiras num veículo vazio do tipo
+            inteira_cabe = s * total <= self.cap + 1e-9 and sl * total <= self.long_cap + 1e-9
+            q = total if cabe >= total else (cabe if not inteira_cabe else 0)
+            if q <= 0:
+                return None
+            d, cur, ld, lcur = d + s * q, cur - s * q, ld + sl * q, lcur - sl * q
+            ganho = duais.get(j, 0.0) * q
+        else:
+            cur += inst.d_slots[j]
+            lcur += inst.d_long[j]
+            m, lm = max(m, cur), max(lm, lcur)
+            pessoas += inst.d_people[j]
+            if d + m > self.cap + 1e-9 or ld + lm > self.long_cap + 1e-9 or pessoas > MAX_PESSOAS_SIMULTANEAS + 1e-9:
+                return None
+            abertos = abertos | (1 << j) if nd.service_type == "pickup" else abertos & ~(1 << inst.pick_of[j])
+            ganho = duais.get(j, 0.0)
+
+        chegada = r.tempo + inst.t(r.no, j)
+        custo_arco = self.custo_km * inst.d(r.no, j) + PENALIDADE_ATRASO * max(0.0, chegada - nd.prazo_horas)
+        return _rotulo(
+            r, (j, q), no=j, tempo=chegada + nd.service_time_h, custo=r.custo + custo_arco, rc=r.rc + custo_arco - ganho,
+            visitados=r.visitados | (1 << j), viagens=r.viagens, d=d, cur=cur, m=m, ld=ld, lcur=lcur, lm=lm,
+            pessoas=pessoas, abertos=abertos,
+        )
+
+    def _voltar(self, r: _Rotulo) -> _Rotulo | None:
+        inst = self.inst
+        fim = r.tempo + inst.t(r.no, 0)
+        if inst.horizonte is not None and fim > inst.horizonte + 1e-9:
+            return None
+        custo_arco = self.custo_km * inst.d(r.no, 0)
+        return _rotulo(
+            r, None, no=0, tempo=fim, custo=r.custo + custo_arco, rc=r.rc + custo_arco, visitados=r.visitados,
+            viagens=r.viagens + 1, d=0.0, cur=0.0, m=0.0, ld=0.0, lcur=0.0, lm=0.0, pessoas=0.0, abertos=0,
+        )
+
+    def precificar(self, duais: Dict[int, float], mu: float, exata: bool) -> Tuple[List[Tuple[float, List[Viagem]]], bool]:
+        """
+        Escalas de custo reduzido negativo [(custo reduzido, viagens)], as melhores primeiro, e se a busca
+        foi completa. Tarefas com dual nulo ficam de fora: visitá-las só acrescenta distância e tempo.
+        """
+        inst = self.inst
+        atrativos = {j for j in self.nos if inst.nodes[j].service_type != "dropoff" and duais.get(j, 0.0) > EPS}
+        inicio = _rotulo(None, "inicio", no=0, tempo=0.0, custo=0.0, rc=-mu, visitados=0, viagens=0,
+                         d=0.0, cur=0.0, m=0.0, ld=0.0, lcur=0.0, lm=0.0, pessoas=0.0, abertos=0)
+        guardados: Dict[int, List[_Rotulo]] = {}
+        fronteira = [inicio]
+        colunas: Dict[Tuple, Tuple[float, List[Viagem]]] = {}
+        n_rotulos = 0
+        while fronteira:
+            novos: Dict[int, List[_Rotulo]] = {}
+            for r in fronteira:
+                if r.no == 0:
+                    if r.viagens >= 1 and r.rc < -EPS:
+                        viagens = _viagens_do_rotulo(r)
+                        colunas.setdefault(tuple(map(tuple, viagens)), (r.rc, viagens))
+                    if r.viagens >= inst.r_max:
+                        continue
+                    candidatos = self.vizinhos[0]
+                else:
+                    candidatos = self.vizinhos[r.no]
+                    if r.abertos == 0:
+                        volta = self._voltar(r)
+                        if volta is not None:
+                            novos.setdefault(0, []).append(volta)
+                    else:
+                        candidatos = [inst.drop_of[p] for p in inst.drop_of if r.abertos >> p & 1] + candidatos
+                limite = len(candidatos) if exata else VIZINHOS_PRECIFICACAO
+                usados = 0
+                for j in candidatos:
+                    if usados >= limite:
+                        break
+                    if r.visitados >> j & 1:
+                        continue
+                    if inst.nodes[j].service_type != "dropoff":
+                        if j not in atrativos:
+                            continue
+                        usados += 1
+                    novo = self._estender(r, j, duais)
+                    if novo is not None:
+                        novos.setdefault(j, []).append(novo)
+
+            fronteira = []
+            for no, lista in novos.items():
+                if exata:
+                    base = guardados.setdefault(no, [])
+                    for r in sorted(lista, key=lambda r: r.rc):
+                        if any(g.domina(r) for g in base):
+                            continue
+                        base[:] = [g for g in base if not r.domina(g)]
+                        base.append(r)
+                        fronteira.append(r)
+                else:
+                    lista.sort(key=lambda r: r.rc)
+                    fronteira.extend(lista[:LARGURA_FEIXE])
+            n_rotulos += len(fronteira)
+            if exata and n_rotulos > MAX_ROTULOS_EXATA:
+                return sorted(colunas.values(), key=lambda c: c[0])[:COLUNAS_POR_RODADA], False
+        return sorted(colunas.values(), key=lambda c: c[0])[:COLUNAS_POR_RODADA], True
+
+
+class _Mestre:
+    """Problema mestre no HiGHS: linhas de cobertura por tarefa e de limite de placas por tipo."""
+
+    def __init__(self, inst: Instancia, tipos: Dict[str, List[str]], opcoes: OpcoesSolver):
+        import highspy
+
+        self.highspy = highspy
+        self.inst = inst
+        self.tarefas = [n for n, nd in inst.nodes.items() if nd.service_type != "dropoff"]
+        self.linha = {n: i for i, n in enumerate(self.tarefas)}
+        self.tipos = list(tipos)
+        self.linha_tipo = {t: len(self.tarefas) + i for i, t in enumerate(self.tipos)}
+        self.colunas: List[Dict[str, Any]] = []
+        self.chaves = set()
+        self.n_artificiais = len(self.tarefas)
+
+        inf = highspy.kHighsInf
+        lower = [inst.nodes[n].quantity if inst.nodes[n].service_type == "delivery" else 1.0 for n in self.tarefas]
+        lower += [-inf] * len(self.tipos)
+        upper = [inf] * len(self.tarefas) + [float(len(tipos[t])) for t in self.tipos]
+        h = highspy.Highs()
+        for chave, valor in _highs_options(opcoes).items():
+            h.setOptionValue(chave, valor)
+        h.setOptionValue("output_flag", False)
+        n = len(lower)
+        h.addRows(n, np.array(lower), np.array(upper), 0, np.zeros(n, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+        # artificiais: mantêm o mestre viável antes de haver colunas cobrindo tudo
+        m = len(self.tarefas)
+        h.addCols(m, np.full(m, CUSTO_ARTIFICIAL), np.zeros(m), np.full(m, inf), m,
+                  np.arange(m, dtype=np.int32), np.arange(m, dtype=np.int32), np.array(lower[:m]))
+        self.h = h
+
+    def adicionar(self, tipo: str, placa: str, viagens: List[Viagem]) -> bool:
+        chave = (tipo, tuple(map(tuple, viagens)))
+        if chave in self.chaves:
+            return False
+        ok, custo = self.inst.avaliar_veiculo(placa, viagens)
+        if not ok:
+            return False
+        cobertura: Dict[int, float] = {}
+        for viagem in viagens:
+            for n, q in viagem:
+                if n in self.linha:
+                    cobertura[self.linha[n]] = cobertura.get(self.linha[n], 0.0) + (q if self.inst.nodes[n].service_type == "delivery" else 1.0)
+        idx = sorted(cobertura) + [self.linha_tipo[tipo]]
+        val = [cobertura[i] for i in idx[:-1]] + [1.0]
+        self.h.addCols(1, np.array([custo]), np.zeros(1), np.array([self.highspy.kHighsInf]), len(idx),
+                       np.zeros(1, dtype=np.int32), np.array(idx, dtype=np.int32), np.array(val, dtype=float))
+        self.colunas.append({"tipo": tipo, "viagens": viagens, "custo": custo})
+        self.chaves.add(chave)
+        return True
+
+    def resolver_lp(self) -> Tuple[float, Dict[int, float], Dict[str, float]]:
+        self.h.run()
+        sol = self.h.getSolution()
+        duais = {n: sol.row_dual[i] for n, i in self.linha.items()}
+        mus = {t: sol.row_dual[i] for t, i in self.linha_tipo.items()}
+        return float(self.h.getInfo().objective_function_value), duais, mus
+
+    def resolver_mip(self, tempo_s: float, gap_rel: float, inicial: List[int]) -> Tuple[str, List[int]]:
+        """MIP sobre as colunas geradas; `inicial` são os índices das colunas da solução heurística."""
+        hs = self.highspy
+        n = len(self.colunas)
+        idx = np.arange(self.n_artificiais, self.n_artificiais + n, dtype=np.int32)
+        self.h.changeColsIntegrality(n, idx, np.array([hs.HighsVarType.kInteger] * n))
+        self.h.setOptionValue("time_limit", max(1.0, tempo_s))
+        self.h.setOptionValue("mip_rel_gap", gap_rel)
+        valores = np.zeros(self.n_artificiais + n)
+        valores[[self.n_artificiais + c for c in inicial]] = 1.0
+        self.h.setSolution(len(valores), np.arange(len(valores), dtype=np.int32), valores)
+        self.h.run()
+        from solver_pulp import _status_from_highs
+
+        status = _status_from_highs(self.h)
+        if status not in ("Optimal", "Feasible"):
+            return status, []
+        x = self.h.getSolution().col_value
+        escolhidas = []
+        for c in range(n):
+            escolhidas.extend([c] * int(round(x[self.n_artificiais + c])))
+        return status, escolhidas
+
+
+def _sem_repeticoes(inst: Instancia, escalas: List[List[Viagem]]) -> List[List[Viagem]]:
+    """Retira coberturas excedentes: quantidade além da demanda e pares já atendidos por outra escala."""
+    restante = {n: int(round(nd.quantity)) for n, nd in inst.nodes.items() if nd.service_type == "delivery"}
+    atendidos = set()
+    limpas = []
+    for viagens in escalas:
+        novas = []
+        for viagem in viagens:
+            nova = []
+            for n, q in viagem:
+                tipo = inst.nodes[n].service_type
+                if tipo == "delivery":
+                    q = min(q, restante[n])
+                    if q <= 0:
+                        continue
+                    restante[n] -= q
+                elif tipo == "pickup":
+                    if n in atendidos:
+                        continue
+                    atendidos.add(n)
+                elif inst.pick_of[n] not in [m for m, _ in nova]:
+                    continue
+                nova.append((n, q))
+            if nova:
+                novas.append(nova)
+        limpas.append(novas)
+    return limpas
+
+
+def resolver_colunas(dados: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    """Geração de colunas + MIP sobre as colunas; devolve a solução neutra no formato de `solver_pulp._otimizar_mip`."""
+    t0 = time.perf_counter()
+    inst = Instancia(dados, _horizonte_modelo(dados))
+    tipos = dados["vehicle_types"]
+    rep = {t: placas[0] for t, placas in tipos.items()}
+    tipo_de = {k: t for t, placas in tipos.items() for k in placas}
+    mestre = _Mestre(inst, tipos, opcoes)
+    precificadores = {t: _Precificador(inst, k) for t, k in rep.items()}
+
+    # Colunas iniciais: escalas do plano rápido (também a solução inicial do MIP)
+    rotas, _ = rotas_rapidas(inst)
+    inicial = []
+    for k, viagens in rotas.items():
+        viagens = [v for v in viagens if v]
+        if viagens and mestre.adicionar(tipo_de[k], rep[tipo_de[k]], viagens):
+            inicial.append(len(mestre.colunas) - 1)
+
+    limite_cg = t0 + FRACAO_TEMPO_CG * opcoes.time_limit_s
+    iteracoes = 0
+    convergiu = False
+    limite_inferior = None
+    valor_lp = math.inf
+    while time.perf_counter() < limite_cg:
+        iteracoes += 1
+        valor_lp, duais, mus = mestre.resolver_lp()
+        novas = 0
+        for exata in (False, True):
+            completa = True
+            menor_rc = {}
+            for t, prec in precificadores.items():
+                colunas, ok = prec.precificar(duais, mus[t], exata)
+                completa = completa and ok
+                menor_rc[t] = min((rc for rc, _ in colunas), default=0.0)
+                novas += sum(mestre.adicionar(t, rep[t], viagens) for _, viagens in colunas)
+            if exata and completa:
+                # limite lagrangiano: valor do LP mais o melhor custo reduzido de cada placa disponível
+                limite_inferior = valor_lp + sum(len(tipos[t]) * min(0.0, rc) for t, rc in menor_rc.items())
+                convergiu = novas == 0
+            if novas or time.perf_counter() >= limite_cg:
+                break
+        print(f"GERAÇÃO DE COLUNAS {iteracoes}: LP = {valor_lp:.2f}, {len(mestre.colunas)} colunas (+{novas})")
+        if novas == 0:
+            break
+    t_cg = time.perf_counter() - t0
+
+    status, escolhidas = mestre.resolver_mip(opcoes.time_limit_s - t_cg, opcoes.gap_rel, inicial)
+    if not escolhidas:
+        return {"status": status, "mensagem": "O MIP sobre as colunas geradas não encontrou solução."}
+
+    # Escalas escolhidas -> placas do tipo; coberturas excedentes removidas; tarefas descobertas reinseridas
+    livres = {t: list(placas) for t, placas in tipos.items()}
+    escalas = [mestre.colunas[c] for c in escolhidas]
+    limpas = _sem_repeticoes(inst, [e["viagens"] for e in escalas])
+    rotas = {}
+    for escala, viagens in zip(escalas, limpas):
+        if viagens:
+            rotas[livres[escala["tipo"]].pop(0)] = viagens
+    cobertos = {n for viagens in rotas.values() for v in viagens for n, _ in v}
+    faltantes = [
+        ("pair", n, inst.drop_of[n]) if nd.service_type == "pickup" else ("delivery", n, int(round(nd.quantity)))
+        for n, nd in inst.nodes.items()
+        if nd.service_type != "dropoff" and n not in cobertos
+    ]
+    rotas, pendentes = inserir_tarefas(inst, rotas, faltantes)
+    if pendentes:
+        return {"status": "Infeasible", "mensagem": "As colunas geradas não cobrem todas as tarefas."}
+    rotas = ordenar_por_tipo(inst, rotas)
+    custo = inst.custo_plano(rotas)
+
+    # o limite lagrangiano é do espaço das colunas (fracionamento restrito), não do modelo de arcos:
+    # fica fora do gap e o plano nunca é declarado ótimo
+    gap = {"mip_gap": None, "mip_gap_pct": None, "best_objective": custo, "best_bound": None}
+    gap_colunas_pct = None if limite_inferior is None else 100.0 * max(0.0, custo - limite_inferior) / max(abs(custo), 1e-9)
+    if status == "Optimal":
+        status = "Feasible"
+    print(f"COLUNAS: custo = {custo:.2f}, limite no espaço das colunas = {limite_inferior}, LP = {valor_lp:.2f}, convergiu = {convergiu}")
+    return {
+        "status": status,
+        "plano": inst.plano(rotas),
+        "objective_value": custo,
+        "gap": gap,
+        "modo": "colunas",
+        "backend": "highspy",
+        "colunas_geradas": len(mestre.colunas),
+        "iteracoes_geracao": iteracoes,
+        "geracao_convergiu": convergiu,
+        "valor_lp_mestre": round(valor_lp, 2),
+        "limite_colunas": None if limite_inferior is None else round(limite_inferior, 2),
+        "gap_colunas_pct": None if gap_colunas_pct is None else round(gap_colunas_pct, 2),
+        "tempo_geracao_s": round(t_cg, 2),
+    }
@@ -0,0 +1,248 @@
+"""
+Decomposição cluster-first, route-second.
+
+As tarefas (deliveries e pares coleta/entrega, que nunca são separados) são divididas em clusters por
+varredura angular em torno do CD ou por prazo, e a frota é repartida entre eles respeitando a
+compatibilidade de itens. Cada cluster vira um MIP menor, resolvido com a formulação de
+`solver_pulp` num processo próprio. Os planos são unidos (cada placa pertence a um só cluster, então
+a união é viável) e reparados: tarefas de clusters sem solução são inseridas nas rotas e uma busca
+local entre veículos corrige as fronteiras entre clusters.
+"""
+import dataclasses
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+import solver_pulp
+from heuristicas import Instancia, Viagem, busca_local, inserir_tarefas, ordenar_por_tipo, realocar_tarefas
+from solver_pulp import CD_COORDS, OpcoesSolver, ServiceNode
+
+# Tempo da busca local sobre o plano unido (s)
+TEMPO_REPARO_S = 30.0
+
+
+def _tarefas_cluster(dados: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Tarefas indivisíveis: uma delivery ou um par coleta/entrega, com posição, prazo e slots."""
+    nodes: List[ServiceNode] = dados["service_nodes"]
+    drop_by_pair = {n.pair_id: n for n in nodes if n.service_type == "dropoff"}
+    tarefas = []
+    for n in nodes:
+        if n.service_type == "dropoff":
+            continue
+        membros = [n]
+        if n.service_type == "pickup" and n.pair_id in drop_by_pair:
+            membros.append(drop_by_pair[n.pair_id])
+        tarefas.append({
+            "nodes": membros,
+            "local": n.local,
+            "angulo": math.atan2(n.lat - CD_COORDS[0], n.lon - CD_COORDS[1]),
+            "prazo": n.prazo_horas,
+            "slots": n.slots_total,
+            "itens": {n.item},
+        })
+    return tarefas
+
+
+def agrupar_tarefas(dados: Dict[str, Any], n_clusters: int, criterio: str = "geografico") -> List[List[Dict[str, Any]]]:
+    """
+    Varredura (geográfica ou por prazo e depois ângulo) cortada em clusters de slots equilibrados.
+    Tarefas do mesmo local ficam no mesmo cluster.
+    """
+    tarefas = _tarefas_cluster(dados)
+    if criterio == "geografico":
+        tarefas.sort(key=lambda t: (t["angulo"], t["local"]))
+    elif criterio == "prazo":
+        tarefas.sort(key=lambda t: (t["prazo"], t["angulo"], t["local"]))
+    else:
+        raise ValueError(f"Critério de cluster desconhecido: {criterio!r} (use 'geografico' ou 'prazo')")
+
+    alvo = sum(t["slots"] for t in tarefas) / max(1, n_clusters)
+    clusters: List[List[Dict[str, Any]]] = [[]]
+    acumulado = 0.0
+    for i, t in enumerate(tarefas):
+        clusters[-1].append(t)
+        acumulado += t["slots"]
+        proxima = tarefas[i + 1] if i + 1 < len(tarefas) else None
+        if (
+            proxima is not None
+            and len(clusters) < n_clusters
+            and acumulado >= alvo * len(clusters)
+            and proxima["local"] != t["local"]
+        ):
+            clusters.append([])
+    return [c for c in clusters if c]
+
+
+def repartir_frota(dados: Dict[str, Any], clusters: List[List[Dict[str, Any]]]) -> List[List[str]] | None:
+    """
+    Placas de cada cluster: primeiro cobre cada item do cluster com um veículo compatível (itens com
+    menos veículos primeiro), depois distribui o restante para equilibrar demanda por capacidade.
+    Retorna None se algum cluster ficar sem veículo compatível com algum item.
+    """
+    veiculos = dados["vehicles"]
+    compat = dados["compat"]
+    livres = sorted(veiculos, key=lambda k: (-veiculos[k]["cap_slots"], str(k)))
+    frota: List[List[str]] = [[] for _ in clusters]
+    demanda = [sum(t["slots"] for t in c) for c in clusters]
+    itens = [set().union(*(t["itens"] for t in c)) for c in clusters]
+
+    def serve(k: str, i: int) -> bool:
+        return any(compat.get((k, item), 0) == 1 for item in itens[i])
+
+    for i in sorted(range(len(clusters)), key=lambda i: -demanda[i]):
+        faltantes = sorted(itens[i], key=lambda item: sum(compat.get((k, item), 0) for k in livres))
+        for item in faltantes:
+            if any(compat.get((k, item), 0) == 1 for k in frota[i]):
+                continue
+            candidatos = [k for k in livres if compat.get((k, item), 0) == 1]
+            if not candidatos:
+                return None
+            k = max(candidatos, key=lambda k: sum(compat.get((k, it), 0) for it in itens[i]))
+            frota[i].append(k)
+            livres.remove(k)
+
+    for k in livres:
+        opcoes = [i for i in range(len(clusters)) if serve(k, i)]
+        if not opcoes:
+            continue
+        i = max(opcoes, key=lambda i: demanda[i] / (1.0 + sum(veiculos[v]["cap_slots"] for v in frota[i])))
+        frota[i].append(k)
+    return frota
+
+
+def _subproblema(dados: Dict[str, Any], cluster: List[Dict[str, Any]], placas: List[str], agrupar: bool) -> Dict[str, Any]:
+    """Dados do solver restritos às tarefas e placas de um cluster (matrizes e ids de nó são compartilhados)."""
+    nodes = [n for t in cluster for n in t["nodes"]]
+    pares = {n.pair_id for n in nodes if n.pair_id}
+    demanda = {(n.local, n.item) for n in nodes if n.service_type == "delivery"}
+    sub = dict(dados)
+    sub["service_nodes"] = sorted(nodes, key=lambda n: n.node_id)
+    sub["paired_requests"] = [p for p in dados["paired_requests"] if p["pair_id"] in pares]
+    sub["demand_free"] = {chave: q for chave, q in dados["demand_free"].items() if chave in demanda}
+    sub["vehicles"] = {k: v for k, v in dados["vehicles"].items() if k in placas}
+    sub["vehicle_types"] = {
+        tipo: [k for k in ps if k in sub["vehicles"]]
+        for tipo, ps in dados["vehicle_types"].items()
+        if any(k in sub["vehicles"] for k in ps)
+    }
+    total_slots = sum(n.slots_total for n in nodes if n.service_type in ("delivery", "pickup"))
+    min_cap = max(1.0, min(v["cap_slots"] for v in sub["vehicles"].values()))
+    sub["r_max"] = max(1, min(int(dados["r_max"]), math.ceil(total_slots / min_cap)))
+    if agrupar:
+        sub = solver_pulp._agrupar_veiculos(sub)
+    return sub
+
+
+def _resolver_cluster(sub: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    solucao = solver_pulp._otimizar_mip(sub, opcoes)
+    solucao["tempo_s"] = round(time.perf_counter() - t0, 2)
+    return solucao
+
+
+def _rotas_do_plano(plano: Dict[str, Any]) -> Dict[str, List[Viagem]]:
+    rotas: Dict[str, List[Viagem]] = {}
+    for viagem in sorted(plano["viagens"], key=lambda v: (str(v["vehicle"]), v["trip"])):
+        rotas.setdefault(viagem["vehicle"], []).append([(s["node"], int(s["qty"])) for s in viagem["stops"]])
+    return rotas
+
+
+def resolver_decomposicao(dados: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    """
+    Resolve a instância por clusters em paralelo e devolve a solução neutra (plano, objetivo, métricas)
+    no formato de `solver_pulp._otimizar_mip`, com o detalhe de cada cluster em "clusters".
+    """
+    n_tarefas = len(_tarefas_cluster(dados))
+    n_clusters = opcoes.n_clusters or math.ceil(n_tarefas / max(1, opcoes.tarefas_por_cluster))
+    n_clusters = max(1, min(n_clusters, n_tarefas, len(dados["vehicles"])))
+
+    # Menos clusters enquanto a frota não cobrir os itens de todos eles
+    while True:
+        clusters = agrupar_tarefas(dados, n_clusters, opcoes.criterio_cluster)
+        frota = repartir_frota(dados, clusters)
+        if (frota is not None and all(frota)) or n_clusters == 1:
+            break
+        n_clusters -= 1
+    if frota is None or not all(frota):
+        return {"status": "Infeasible", "mensagem": "A frota não cobre os itens de todas as tarefas."}
+
+    processos = max(1, min(opcoes.processos or os.cpu_count() or 1, len(clusters)))
+    threads = max(1, (os.cpu_count() or 1) // processos)
+    opcoes_sub = dataclasses.replace(opcoes, modo="mip", threads=threads, msg=False, progresso=None, ao_incumbente=None)
+    subs = [_subproblema(dados, c, placas, opcoes.agrupar_veiculos_identicos) for c, placas in zip(clusters, frota)]
+    print(f"DECOMPOSIÇÃO: {len(subs)} clusters ({opcoes.criterio_cluster}), {processos} processos x {threads} threads")
+
+    t0 = time.perf_counter()
+    solucoes: List[Dict[str, Any]] = [{}] * len(subs)
+
+    def concluido(i: int, solucao: Dict[str, Any]) -> None:
+        solucoes[i] = solucao
+        if opcoes.progresso is not None:
+            feitos = sum(1 for s in solucoes if s)
+            opcoes.progresso({"tempo_s": time.perf_counter() - t0, "objetivo": None, "limite": None, "gap_pct": None,
+                              "etapa": f"{feitos}/{len(subs)} clusters resolvidos"})
+
+    if processos == 1:
+        for i, sub in enumerate(subs):
+            concluido(i, _resolver_cluster(sub, opcoes_sub))
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            futuros = {pool.submit(_resolver_cluster, sub, opcoes_sub): i for i, sub in enumerate(subs)}
+            for futuro in as_completed(futuros):
+                concluido(futuros[futuro], futuro.result())
+    t_mip = time.perf_counter() - t0
+
+    # União dos planos; tarefas de clusters sem solução ficam para o reparo
+    inst = Instancia(dados)
+    rotas: Dict[str, List[Viagem]] = {}
+    pendentes = []
+    info_clusters = []
+    for i, (sub, solucao) in enumerate(zip(subs, solucoes), start=1):
+        ok = solucao["status"] in ("Optimal", "Feasible")
+        gap_pct = solucao["gap"].get("mip_gap_pct") if ok else None
+        if ok:
+            rotas.update(_rotas_do_plano(solucao["plano"]))
+        else:
+            pendentes.extend(
+                ("pair", n.node_id, inst.drop_of[n.node_id]) if n.service_type == "pickup" else ("delivery", n.node_id, int(round(n.quantity)))
+                for n in sub["service_nodes"]
+                if n.service_type != "dropoff"
+            )
+        info_clusters.append({
+            "cluster": i,
+            "tarefas": sum(1 for n in sub["service_nodes"] if n.service_type != "dropoff"),
+            "veiculos": list(sub["vehicles"]),
+            "status": solucao["status"],
+            "objetivo": round(solucao["objective_value"], 2) if ok else None,
+            "gap_pct": None if gap_pct is None else round(gap_pct, 2),
+            "tempo_s": solucao.get("tempo_s"),
+        })
+    custo_uniao = inst.custo_plano(rotas) if not pendentes else None
+
+    t0 = time.perf_counter()
+    rotas, nao_atendidas = inserir_tarefas(inst, rotas, sorted(pendentes, key=lambda t: inst.nodes[t[1]].prazo_horas))
+    if nao_atendidas:
+        locais = sorted({inst.nodes[n].local for n in nao_atendidas})
+        return {"status": "Infeasible", "mensagem": f"A decomposição não conseguiu alocar tarefas em: {', '.join(locais)}.", "clusters": info_clusters}
+    rotas = realocar_tarefas(inst, rotas, TEMPO_REPARO_S / 2)
+    rotas = busca_local(inst, rotas, TEMPO_REPARO_S / 2)
+    rotas = ordenar_por_tipo(inst, rotas)
+    t_reparo = time.perf_counter() - t0
+
+    custo = inst.custo_plano(rotas)
+    print(f"DECOMPOSIÇÃO: união = {custo_uniao}, após reparo = {custo:.2f} (MIPs {t_mip:.1f}s, reparo {t_reparo:.1f}s)")
+    return {
+        "status": "Feasible",
+        "plano": inst.plano(rotas),
+        "objective_value": custo,
+        "gap": {},
+        "modo": "decomposicao",
+        "backend": opcoes.backend,
+        "clusters": info_clusters,
+        "custo_uniao": None if custo_uniao is None else round(custo_uniao, 2),
+        "processos": processos,
+        "tempo_mip_s": round(t_mip, 2),
+        "tempo_reparo_s": round(t_reparo, 2),
+    }
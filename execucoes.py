@@ -0,0 +1,218 @@
+"""
+Execuções do solver em segundo plano.
+
+Cada execução roda `solver_pulp.executar_solver` num processo próprio, de modo que a página do
+Streamlit continua respondendo e a execução sobrevive a reruns e recarregamentos (o gerenciador vive
+no processo do servidor; a página guarda só o id). O processo envia o progresso do MIP (incumbente,
+limite, gap) e o resultado final por uma fila; o cancelamento encerra o processo e seus filhos, o
+que interrompe o HiGHS de imediato.
+"""
+import dataclasses
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import solver_pulp
+from solver_pulp import OpcoesSolver
+
+# Execuções rodando ao mesmo tempo; as demais esperam na fila
+MAX_EXECUCOES_SIMULTANEAS = max(1, (os.cpu_count() or 2) // 2)
+
+NA_FILA = "na_fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+CANCELADA = "cancelada"
+
+
+@dataclass
+class Execucao:
+    id: str
+    descricao: str
+    argumentos: Tuple[Any, ...] = field(repr=False)
+    opcoes: OpcoesSolver = field(repr=False)
+    # plano e assinaturas de um resultado anterior: reotimização incremental em vez do solver completo
+    anterior: Dict[str, Any] | None = field(default=None, repr=False)
+    criada_em: float = field(default_factory=time.time)
+    estado: str = NA_FILA
+    iniciada_em: float | None = None
+    encerrada_em: float | None = None
+    progresso: Dict[str, Any] = field(default_factory=dict)
+    # último incumbente do MIP decodificado em plano (viagens), antes do resultado final
+    plano_incumbente: Dict[str, Any] | None = field(default=None, repr=False)
+    resultado: Dict[str, Any] | None = field(default=None, repr=False)
+    erro: str | None = None
+    processo: Any = field(default=None, repr=False)
+    fila: Any = field(default=None, repr=False)
+
+    @property
+    def ativa(self) -> bool:
+        return self.estado in (NA_FILA, EXECUTANDO)
+
+    @property
+    def tempo_decorrido_s(self) -> float:
+        if self.iniciada_em is None:
+            return 0.0
+        return (self.encerrada_em or time.time()) - self.iniciada_em
+
+
+def _trabalhador(fila, argumentos: Tuple[Any, ...], opcoes: OpcoesSolver, anterior: Dict[str, Any] | None) -> None:
+    # grupo de processos próprio: o cancelamento também encerra os processos da decomposição/portfólio
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    def progresso(info: Dict[str, Any]) -> None:
+        fila.put(("progresso", info))
+
+    def ao_incumbente(ponto: Dict[str, Any], plano: Dict[str, Any]) -> None:
+        fila.put(("incumbente", plano))
+
+    opcoes = dataclasses.replace(opcoes, progresso=progresso, ao_incumbente=ao_incumbente)
+    try:
+        if anterior is None:
+            resultado = solver_pulp.executar_solver(*argumentos, opcoes=opcoes)
+        else:
+            df_v, df_p, df_i, finais = argumentos
+            resultado = solver_pulp.executar_reotimizacao(df_v, df_p, df_i, anterior, finais, opcoes=opcoes)
+        fila.put(("resultado", resultado))
+    except Exception:
+        fila.put(("erro", traceback.format_exc()))
+
+
+class GerenciadorExecucoes:
+    """Fila de execuções do solver em processos separados, compartilhada por todas as sessões."""
+
+    def __init__(self, max_simultaneas: int = MAX_EXECUCOES_SIMULTANEAS):
+        # spawn: o servidor do Streamlit tem várias threads, e fork com threads abertas pode travar o filho
+        self._ctx = mp.get_context("spawn")
+        self._execucoes: Dict[str, Execucao] = {}
+        self._trava = threading.Lock()
+        self.max_simultaneas = max_simultaneas
+
+    def submeter(
+        self,
+        df_veiculos_selecionados,
+        df_planejamento,
+        df_itens,
+        final_destinos_nao_retornam=None,
+        opcoes: OpcoesSolver | None = None,
+        descricao: str = "",
+        resultado_anterior: Dict[str, Any] | None = None,
+    ) -> str:
+        """
+        Enfileira uma execução de `executar_solver` (ou de `executar_reotimizacao`, se houver
+        resultado anterior) e devolve o id dela.
+        """
+        anterior = None
+        if resultado_anterior is not None:
+            # só o necessário para a reotimização: tabelas e mapa não vão para o processo
+            anterior = {chave: resultado_anterior[chave] for chave in ("plano", "assinaturas_tarefas")}
+        execucao = Execucao(
+            id=uuid.uuid4().hex[:12],
+            descricao=descricao,
+            argumentos=(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam),
+            opcoes=dataclasses.replace(opcoes or OpcoesSolver(), progresso=None, ao_incumbente=None),
+            anterior=anterior,
+        )
+        with self._trava:
+            self._execucoes[execucao.id] = execucao
+        self.atualizar()
+        return execucao.id
+
+    def obter(self, execucao_id: str) -> Execucao | None:
+        self.atualizar()
+        return self._execucoes.get(execucao_id)
+
+    def listar(self) -> List[Execucao]:
+        self.atualizar()
+        return sorted(self._execucoes.values(), key=lambda e: e.criada_em)
+
+    def cancelar(self, execucao_id: str) -> bool:
+        with self._trava:
+            execucao = self._execucoes.get(execucao_id)
+            if execucao is None or not execucao.ativa:
+                return False
+            if execucao.processo is None:
+                execucao.estado = CANCELADA
+                execucao.encerrada_em = time.time()
+            else:
+                try:
+                    os.killpg(execucao.processo.pid, signal.SIGTERM)
+                except (AttributeError, ProcessLookupError, PermissionError):
+                    # sem grupos de processos (Windows) ou o filho ainda não criou o seu
+                    execucao.processo.terminate()
+                self._encerrar(execucao, CANCELADA)
+        self.atualizar()
+        return True
+
+    def descartar(self, execucao_id: str) -> None:
+        """Esquece uma execução encerrada (o resultado já foi levado para a sessão)."""
+        with self._trava:
+            execucao = self._execucoes.get(execucao_id)
+            if execucao is not None and not execucao.ativa:
+                del self._execucoes[execucao_id]
+
+    def atualizar(self) -> None:
+        """Lê as filas das execuções em andamento, detecta as encerradas e inicia as que esperam vaga."""
+        with self._trava:
+            for execucao in self._execucoes.values():
+                if execucao.estado == EXECUTANDO:
+                    self._coletar(execucao)
+            rodando = sum(1 for e in self._execucoes.values() if e.estado == EXECUTANDO)
+            for execucao in sorted(self._execucoes.values(), key=lambda e: e.criada_em):
+                if rodando >= self.max_simultaneas:
+                    break
+                if execucao.estado == NA_FILA:
+                    self._iniciar(execucao)
+                    rodando += 1
+
+    def _iniciar(self, execucao: Execucao) -> None:
+        execucao.fila = self._ctx.Queue()
+        # não daemon: a decomposição e o portfólio criam processos filhos
+        execucao.processo = self._ctx.Process(
+            target=_trabalhador, args=(execucao.fila, execucao.argumentos, execucao.opcoes, execucao.anterior), daemon=False,
+        )
+        execucao.processo.start()
+        execucao.estado = EXECUTANDO
+        execucao.iniciada_em = time.time()
+
+    def _coletar(self, execucao: Execucao) -> None:
+        vivo = execucao.processo.is_alive()
+        while True:
+            try:
+                # processo encerrado: espera o que ainda estiver em trânsito na fila
+                tipo, dado = execucao.fila.get(timeout=1.0) if not vivo else execucao.fila.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == "progresso":
+                execucao.progresso = dado
+            elif tipo == "incumbente":
+                execucao.plano_incumbente = dado
+            elif tipo == "resultado":
+                execucao.resultado = dado
+                self._encerrar(execucao, CONCLUIDA)
+                return
+            else:
+                execucao.erro = dado
+                self._encerrar(execucao, FALHOU)
+                return
+        if not vivo:
+            execucao.erro = f"O processo do solver terminou sem resultado (código {execucao.processo.exitcode})."
+            self._encerrar(execucao, FALHOU)
+
+    def _encerrar(self, execucao: Execucao, estado: str) -> None:
+        execucao.estado = estado
+        execucao.encerrada_em = time.time()
+        execucao.processo.join(timeout=5)
+        execucao.fila.close()
+        execucao.processo = None
+        execucao.fila = None
+        execucao.argumentos = ()
+        execucao.anterior = None
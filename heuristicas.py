@@ -0,0 +1,639 @@
+"""
+Heurísticas para o planejamento de rotas.
+
+Trabalham sobre os dados de `solver_pulp.preparar_dados_solver` e produzem o plano neutro usado por
+`solver_pulp._montar_resultado`: viagens por veículo, cada uma com a sequência de paradas
+(nó, quantidade) e os valores de tempo, atraso e carga em cada parada.
+"""
+import math
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from solver_pulp import (
+    CATEGORIAS_LIMITE_LONGOS,
+    LIMITE_LONGOS_CAMINHONETE,
+    MAX_PESSOAS_SIMULTANEAS,
+    PENALIDADE_ATRASO,
+    PESSOAS_ITEM,
+    ServiceNode,
+)
+
+Parada = Tuple[int, int]          # (node_id, quantidade)
+Viagem = List[Parada]
+
+
+class Instancia:
+    """Visão compacta dos dados do solver para avaliação rápida de viagens."""
+
+    def __init__(self, dados: Dict[str, Any], horizonte: float | None = None):
+        self.dados = dados
+        self.horizonte = horizonte
+        self.nodes: Dict[int, ServiceNode] = {n.node_id: n for n in dados["service_nodes"]}
+        self.loc = dados["node_loc"]
+        self.dist = dados["dist_loc"]
+        self.tempo = dados["tempo_loc"]
+        self.r_max = int(dados["r_max"])
+        self.veiculos: List[str] = list(dados["vehicles"].keys())
+        self.cap = {k: float(v["cap_slots"]) for k, v in dados["vehicles"].items()}
+        self.custo_km = {k: float(v["custo_km"]) for k, v in dados["vehicles"].items()}
+        self.long_cap = {
+            k: (LIMITE_LONGOS_CAMINHONETE if v["categoria"] in CATEGORIAS_LIMITE_LONGOS else math.inf)
+            for k, v in dados["vehicles"].items()
+        }
+        self.compat = dados["compat"]
+        # cópias em listas Python: indexação elemento a elemento bem mais rápida que em arrays NumPy
+        self._loc = [int(x) for x in self.loc]
+        self._dist = self.dist.tolist()
+        self._tempo = self.tempo.tolist()
+
+        # Pares coleta -> entrega e variação de carga por unidade (delivery) ou total (pickup/dropoff)
+        self.drop_of: Dict[int, int] = {}
+        self.pick_of: Dict[int, int] = {}
+        pick_by_pair = {n.pair_id: n.node_id for n in dados["service_nodes"] if n.service_type == "pickup"}
+        for n in dados["service_nodes"]:
+            if n.service_type == "dropoff" and n.pair_id in pick_by_pair:
+                self.drop_of[pick_by_pair[n.pair_id]] = n.node_id
+                self.pick_of[n.node_id] = pick_by_pair[n.pair_id]
+        self.d_slots: Dict[int, float] = {}
+        self.d_long: Dict[int, float] = {}
+        self.d_people: Dict[int, float] = {}
+        for n in dados["service_nodes"]:
+            if n.service_type == "delivery":
+                self.d_slots[n.node_id] = n.slots_unit
+                self.d_long[n.node_id] = 1.0 if n.is_long else 0.0
+                self.d_people[n.node_id] = 0.0
+            else:
+                sinal = 1.0 if n.service_type == "pickup" else -1.0
+                self.d_slots[n.node_id] = sinal * n.slots_total
+                self.d_long[n.node_id] = sinal * n.quantity if n.is_long else 0.0
+                pessoas = str(n.item).strip().upper() == PESSOAS_ITEM.upper()
+                self.d_people[n.node_id] = sinal * n.quantity if pessoas else 0.0
+
+    def compativel(self, k: str, node_id: int) -> bool:
+        return self.compat.get((k, self.nodes[node_id].item), 0) == 1
+
+    def d(self, i: int, j: int) -> float:
+        return self._dist[self._loc[i]][self._loc[j]]
+
+    def t(self, i: int, j: int) -> float:
+        return self._tempo[self._loc[i]][self._loc[j]]
+
+    def avaliar_viagem(self, k: str, viagem: Viagem, inicio: float) -> Tuple[bool, float, float, float]:
+        """
+        Avalia uma viagem que sai do CD em `inicio`.
+        Retorna (viável, distância km, atraso total h, fim da viagem).
+        """
+        cap = self.cap[k]
+        long_cap = self.long_cap[k]
+        nodes = self.nodes
+        load = 0.0
+        long_load = 0.0
+        for n, q in viagem:
+            if nodes[n].service_type == "delivery":
+                load += self.d_slots[n] * q
+                long_load += self.d_long[n] * q
+        if load > cap + 1e-9 or long_load > long_cap + 1e-9:
+            return False, 0.0, 0.0, inicio
+
+        people = 0.0
+        vistos = set()
+        dist = 0.0
+        atraso = 0.0
+        tempo_atual = inicio
+        loc = self._loc
+        D = self._dist
+        Tm = self._tempo
+        anterior = 0
+        for n, q in viagem:
+            nd = nodes[n]
+            if n in vistos:
+                return False, 0.0, 0.0, inicio
+            vistos.add(n)
+            if nd.service_type == "dropoff" and self.pick_of.get(n) not in vistos:
+                return False, 0.0, 0.0, inicio
+            if nd.service_type == "delivery":
+                load -= self.d_slots[n] * q
+                long_load -= self.d_long[n] * q
+            else:
+                load += self.d_slots[n]
+                long_load += self.d_long[n]
+                people += self.d_people[n]
+            if load > cap + 1e-9 or long_load > long_cap + 1e-9 or people > MAX_PESSOAS_SIMULTANEAS + 1e-9:
+                return False, 0.0, 0.0, inicio
+
+            la, ln = loc[anterior], loc[n]
+            dist += D[la][ln]
+            tempo_atual += Tm[la][ln]
+            if tempo_atual > nd.prazo_horas:
+                atraso += tempo_atual - nd.prazo_horas
+            tempo_atual += nd.service_time_h
+            anterior = n
+
+        # pickup sem a entrega correspondente na mesma viagem
+        for n in vistos:
+            if n in self.drop_of and self.drop_of[n] not in vistos:
+                return False, 0.0, 0.0, inicio
+
+        dist += self.d(anterior, 0)
+        fim = tempo_atual + self.t(anterior, 0)
+        if self.horizonte is not None and fim > self.horizonte + 1e-9:
+            return False, 0.0, 0.0, inicio
+        return True, dist, atraso, fim
+
+    def avaliar_veiculo(self, k: str, viagens: List[Viagem], a_partir: int = 0, inicio: float = 0.0) -> Tuple[bool, float]:
+        """
+        Custo das viagens encadeadas de um veículo (a próxima sai quando a anterior volta ao CD).
+        Com `a_partir`/`inicio`, avalia só as viagens a partir desse índice, saindo do CD em `inicio`.
+        """
+        if len(viagens) > self.r_max:
+            return False, math.inf
+        custo = 0.0
+        for viagem in viagens[a_partir:]:
+            ok, dist, atraso, fim = self.avaliar_viagem(k, viagem, inicio)
+            if not ok:
+                return False, math.inf
+            custo += self.custo_km[k] * dist + PENALIDADE_ATRASO * atraso
+            inicio = fim
+        return True, custo
+
+    def prefixos(self, k: str, viagens: List[Viagem]) -> Tuple[List[float], List[float]]:
+        """Saída do CD e custo acumulado antes de cada viagem (mais uma posição para uma nova viagem no fim)."""
+        inicios = [0.0]
+        custos = [0.0]
+        for viagem in viagens:
+            ok, dist, atraso, fim = self.avaliar_viagem(k, viagem, inicios[-1])
+            inicios.append(fim if ok else math.inf)
+            custos.append(custos[-1] + (self.custo_km[k] * dist + PENALIDADE_ATRASO * atraso if ok else math.inf))
+        return inicios, custos
+
+    def custo_plano(self, rotas: Dict[str, List[Viagem]]) -> float:
+        total = 0.0
+        for k, viagens in rotas.items():
+            ok, custo = self.avaliar_veiculo(k, viagens)
+            if not ok:
+                return math.inf
+            total += custo
+        return total
+
+    def plano(self, rotas: Dict[str, List[Viagem]]) -> Dict[str, Any]:
+        """Converte as rotas no plano neutro, com tempos, atrasos e cargas em cada parada."""
+        viagens_plano = []
+        for k in self.veiculos:
+            inicio = 0.0
+            for r, viagem in enumerate([v for v in rotas.get(k, []) if v], start=1):
+                load = sum(self.d_slots[n] * q for n, q in viagem if self.nodes[n].service_type == "delivery")
+                long_load = sum(self.d_long[n] * q for n, q in viagem if self.nodes[n].service_type == "delivery")
+                people = 0.0
+                tempo_atual = inicio
+                anterior = 0
+                paradas = []
+                for n, q in viagem:
+                    nd = self.nodes[n]
+                    if nd.service_type == "delivery":
+                        load -= self.d_slots[n] * q
+                        long_load -= self.d_long[n] * q
+                    else:
+                        load += self.d_slots[n]
+                        long_load += self.d_long[n]
+                        people += self.d_people[n]
+                    tempo_atual += self.t(anterior, n)
+                    paradas.append({
+                        "node": n,
+                        "qty": int(q),
+                        "T": tempo_atual,
+                        "late": max(0.0, tempo_atual - nd.prazo_horas),
+                        "load": load,
+                        "long_load": long_load,
+                        "people_load": people,
+                    })
+                    tempo_atual += nd.service_time_h
+                    anterior = n
+                fim = tempo_atual + self.t(anterior, 0)
+                viagens_plano.append({"vehicle": k, "trip": r, "start": inicio, "end": fim, "stops": paradas})
+                inicio = fim
+        return {"viagens": viagens_plano}
+
+
+def _tarefas(inst: Instancia) -> List[Tuple[str, int, int]]:
+    """Tarefas a inserir: ("delivery", nó, quantidade) e ("pair", pickup, dropoff), mais urgentes primeiro."""
+    tarefas = []
+    for n in inst.nodes.values():
+        if n.service_type == "delivery":
+            tarefas.append(("delivery", n.node_id, int(round(n.quantity))))
+        elif n.service_type == "pickup" and n.node_id in inst.drop_of:
+            tarefas.append(("pair", n.node_id, inst.drop_of[n.node_id]))
+    tarefas.sort(key=lambda t: (inst.nodes[t[1]].prazo_horas, -inst.d(0, t[1])))
+    return tarefas
+
+
+def _max_unidades(inst: Instancia, k: str, viagem: Viagem, n: int) -> int:
+    """Máximo de unidades da delivery `n` que ainda cabem na saída do CD desta viagem."""
+    load0 = sum(inst.d_slots[m] * q for m, q in viagem if inst.nodes[m].service_type == "delivery")
+    long0 = sum(inst.d_long[m] * q for m, q in viagem if inst.nodes[m].service_type == "delivery")
+    pico = load0
+    load = load0
+    for m, q in viagem:
+        load += -inst.d_slots[m] * q if inst.nodes[m].service_type == "delivery" else inst.d_slots[m]
+        pico = max(pico, load)
+    livre = inst.cap[k] - pico
+    unidades = math.floor((livre + 1e-9) / inst.d_slots[n]) if inst.d_slots[n] > 0 else 10**9
+    if inst.d_long[n] > 0:
+        unidades = min(unidades, math.floor(inst.long_cap[k] - long0 + 1e-9) if math.isfinite(inst.long_cap[k]) else unidades)
+    return max(0, unidades)
+
+
+def melhores_insercoes(
+    inst: Instancia,
+    rotas: Dict[str, List[Viagem]],
+    custos: Dict[str, float],
+    tarefa,
+    qtd: int = 0,
+    veiculos: List[str] | None = None,
+    so_melhor: bool = False,
+) -> Dict[str, Tuple[float, List[Viagem], int]]:
+    """
+    Melhor inserção da tarefa em cada veículo: {veículo: (custo incremental, novas viagens, unidades)}.
+    O desvio em km é um limite inferior do custo incremental (atrasos só aumentam com a inserção),
+    então as posições são avaliadas em ordem de desvio até o limite não melhorar a melhor encontrada.
+    Só as viagens a partir da alterada são reavaliadas. Com `so_melhor`, o limite é compartilhado
+    entre veículos e só interessa o mínimo global (os demais veículos podem ficar de fora).
+    """
+    tipo, a, b = tarefa
+    d = inst.d
+    resultado = {}
+    melhor_global = math.inf
+    for k in (veiculos if veiculos is not None else inst.veiculos):
+        if not inst.compativel(k, a):
+            continue
+        viagens = rotas[k]
+        custo_km = inst.custo_km[k]
+        candidatos = []
+        for t in range(min(len(viagens) + 1, inst.r_max)):
+            viagem = viagens[t] if t < len(viagens) else []
+            nos = [0] + [n for n, _ in viagem] + [0]
+            if tipo == "delivery":
+                q = min(qtd, _max_unidades(inst, k, viagem, a))
+                if q <= 0:
+                    continue
+                ja = [p for p, (m, _) in enumerate(viagem) if m == a]
+                if ja:
+                    nova = viagem[:ja[0]] + [(a, viagem[ja[0]][1] + q)] + viagem[ja[0] + 1:]
+                    candidatos.append((0.0, t, nova, q))
+                    continue
+                for p in range(len(viagem) + 1):
+                    lb = custo_km * (d(nos[p], a) + d(a, nos[p + 1]) - d(nos[p], nos[p + 1]))
+                    candidatos.append((lb, t, viagem[:p] + [(a, q)] + viagem[p:], q))
+            else:
+                qa = int(round(inst.nodes[a].quantity))
+                qb = int(round(inst.nodes[b].quantity))
+                for p in range(len(viagem) + 1):
+                    desvio_a = d(nos[p], a) + d(a, nos[p + 1]) - d(nos[p], nos[p + 1])
+                    for e in range(p, len(viagem) + 1):
+                        if e == p:
+                            lb = d(nos[p], a) + d(a, b) + d(b, nos[p + 1]) - d(nos[p], nos[p + 1])
+                        else:
+                            lb = desvio_a + d(nos[e], b) + d(b, nos[e + 1]) - d(nos[e], nos[e + 1])
+                        nova = viagem[:p] + [(a, qa)] + viagem[p:e] + [(b, qb)] + viagem[e:]
+                        candidatos.append((custo_km * lb, t, nova, 0))
+        if not candidatos:
+            continue
+
+        candidatos.sort(key=lambda c: c[0])
+        prefixo = None
+        melhor = (math.inf, None, 0)
+        for lb, t, nova, q in candidatos:
+            if lb >= min(melhor[0], melhor_global) - 1e-9:
+                break
+            if prefixo is None:
+                inicios, acumulado = prefixo = inst.prefixos(k, viagens)
+            teste = viagens[:t] + [nova] + viagens[t + 1:]
+            ok, custo = inst.avaliar_veiculo(k, teste, t, inicios[t])
+            delta = acumulado[t] + custo - custos[k]
+            if ok and delta < melhor[0]:
+                melhor = (delta, teste, q)
+        if melhor[1] is not None:
+            resultado[k] = melhor
+            if so_melhor:
+                melhor_global = min(melhor_global, melhor[0])
+    return resultado
+
+
+def _melhor_insercao(inst: Instancia, rotas: Dict[str, List[Viagem]], custos: Dict[str, float], tarefa, qtd: int = 0):
+    """Inserção de menor custo incremental em todas as viagens (existentes ou novas) de todos os veículos."""
+    por_veiculo = melhores_insercoes(inst, rotas, custos, tarefa, qtd, so_melhor=True)
+    if not por_veiculo:
+        return math.inf, None, None, 0
+    k = min(por_veiculo, key=lambda v: por_veiculo[v][0])
+    delta, viagens, q = por_veiculo[k]
+    return delta, k, viagens, q
+
+
+def construir_por_insercao(inst: Instancia) -> Tuple[Dict[str, List[Viagem]], List[int]]:
+    """
+    Inserção gulosa mais barata: cada tarefa (delivery ou par coleta/entrega) entra na posição de menor
+    custo incremental, abrindo uma nova viagem quando necessário. Deliveries que não cabem numa viagem
+    são divididas em partes. Retorna as rotas e os nós que não puderam ser atendidos.
+    """
+    return inserir_tarefas(inst, {k: [] for k in inst.veiculos}, _tarefas(inst))
+
+
+def inserir_tarefas(
+    inst: Instancia,
+    rotas: Dict[str, List[Viagem]],
+    tarefas: List[Tuple[str, int, int]],
+) -> Tuple[Dict[str, List[Viagem]], List[int]]:
+    """Insere as tarefas, na ordem dada, nas rotas existentes pela inserção mais barata; retorna rotas e pendentes."""
+    rotas = {k: [list(v) for v in rotas.get(k, [])] for k in inst.veiculos}
+    custos = {k: inst.avaliar_veiculo(k, v)[1] for k, v in rotas.items()}
+    pendentes: List[int] = []
+    for tarefa in tarefas:
+        restante = tarefa[2] if tarefa[0] == "delivery" else 1
+        while restante > 0:
+            delta, k, viagens, q = _melhor_insercao(inst, rotas, custos, tarefa, restante)
+            if k is None:
+                pendentes.append(tarefa[1])
+                break
+            rotas[k] = viagens
+            custos[k] += delta
+            restante = restante - q if tarefa[0] == "delivery" else 0
+    return rotas, pendentes
+
+
+def ordenar_por_tipo(
+    inst: Instancia, rotas: Dict[str, List[Viagem]], visita_de: Dict[int, int] | None = None
+) -> Dict[str, List[Viagem]]:
+    """
+    Troca rotas inteiras entre placas do mesmo tipo (idênticas para o modelo) para que as primeiras
+    placas de cada tipo fiquem com mais visitas, como exigem as restrições de uso ordenado. Visitas
+    contam como no MIP: nós distintos por viagem, com os itens de uma visita agrupada (`visita_de`) num só.
+    """
+    visita_de = visita_de or {}
+    novas = dict(rotas)
+    for placas in inst.dados.get("vehicle_types", {}).values():
+        placas = [k for k in placas if k in rotas]
+        ordem = sorted(placas, key=lambda k: -sum(len({visita_de.get(n, n) for n, _ in v}) for v in rotas[k]))
+        for destino, origem in zip(placas, ordem):
+            novas[destino] = rotas[origem]
+    return novas
+
+
+def ordenar_viagens(
+    inst: Instancia, rotas: Dict[str, List[Viagem]], visita_de: Dict[int, int] | None = None
+) -> Dict[str, List[Viagem]]:
+    """
+    Viagens de cada veículo em ordem não decrescente do menor nó atendido (a ordem das restrições
+    TripLex do MIP; empates, como uma entrega fracionada, mantêm a ordem), quando isso mantém a viabilidade.
+    Com visitas agrupadas (`visita_de`), o nó de um item é o da sua visita.
+    """
+    visita_de = visita_de or {}
+    novas = dict(rotas)
+    for k, viagens in rotas.items():
+        ordem = sorted(viagens, key=lambda v: min(visita_de.get(n, n) for n, _ in v))
+        if inst.avaliar_veiculo(k, ordem)[0]:
+            novas[k] = ordem
+    return novas
+
+
+def plano_construtivo(
+    dados: Dict[str, Any],
+    horizonte: float | None = None,
+    viagens_ordenadas: bool = False,
+    visita_de: Dict[int, int] | None = None,
+) -> Dict[str, Any] | None:
+    """
+    Plano da heurística de inserção, ou None se alguma tarefa ficou sem veículo/viagem viável.
+    `visita_de` (item -> visita agrupada do MIP) faz as ordenações de simetria contarem visitas como o modelo.
+    """
+    inst = Instancia(dados, horizonte)
+    rotas, pendentes = construir_por_insercao(inst)
+    if pendentes:
+        return None
+    if viagens_ordenadas:
+        rotas = ordenar_viagens(inst, rotas, visita_de)
+    rotas = ordenar_por_tipo(inst, rotas, visita_de)
+    plano = inst.plano(rotas)
+    plano["custo"] = inst.custo_plano(rotas)
+    return plano
+
+
+
+def _representantes(inst: Instancia) -> Dict[str, List[str]]:
+    """Uma placa por tipo de veículo (placas do mesmo tipo avaliam qualquer viagem igualmente)."""
+    tipos = inst.dados.get("vehicle_types") or {k: [k] for k in inst.veiculos}
+    reps = {}
+    for placas in tipos.values():
+        placas = [k for k in placas if k in inst.cap]
+        if placas:
+            reps[placas[0]] = placas
+    return reps
+
+
+def _custo_viagem(inst: Instancia, reps: List[str], viagem: Viagem) -> Tuple[float, List[str]]:
+    """Menor custo da viagem saindo em t = 0 entre os tipos que a comportam, e quais tipos a comportam."""
+    melhor = math.inf
+    aptos = []
+    for k in reps:
+        if not all(inst.compativel(k, n) for n, _ in viagem):
+            continue
+        ok, dist, atraso, _ = inst.avaliar_viagem(k, viagem, 0.0)
+        if ok:
+            aptos.append(k)
+            melhor = min(melhor, inst.custo_km[k] * dist + PENALIDADE_ATRASO * atraso)
+    return melhor, aptos
+
+
+def _rotas_iniciais(inst: Instancia, reps: List[str]) -> Tuple[List[Viagem], List[int]]:
+    """Uma rota por tarefa; deliveries maiores que a maior caçamba compatível são divididas em partes."""
+    rotas: List[Viagem] = []
+    pendentes: List[int] = []
+    for tipo, a, b in _tarefas(inst):
+        if tipo == "pair":
+            rotas.append([(a, int(round(inst.nodes[a].quantity))), (b, int(round(inst.nodes[b].quantity)))])
+            continue
+        parte = max((_max_unidades(inst, k, [], a) for k in reps if inst.compativel(k, a)), default=0)
+        if parte <= 0:
+            pendentes.append(a)
+            continue
+        restante = b
+        while restante > 0:
+            q = min(parte, restante)
+            rotas.append([(a, q)])
+            restante -= q
+    return rotas, pendentes
+
+
+def clarke_wright(inst: Instancia, vizinhos: int = 15) -> Tuple[List[Viagem], List[int]]:
+    """
+    Economias de Clarke-Wright: junta o fim de uma rota ao início de outra enquanto a junção for viável
+    para algum tipo de veículo (capacidades, longos, pessoas, coleta antes da entrega) e não aumentar o custo.
+    Só as `vizinhos` maiores economias de cada rota são consideradas.
+    """
+    reps = list(_representantes(inst))
+    iniciais, pendentes = _rotas_iniciais(inst, reps)
+    if not iniciais:
+        return [], pendentes
+
+    custos = [_custo_viagem(inst, reps, r)[0] for r in iniciais]
+    primeiro = np.array([inst.loc[r[0][0]] for r in iniciais])
+    ultimo = np.array([inst.loc[r[-1][0]] for r in iniciais])
+    dist = inst.dist
+    economia = dist[ultimo, 0][:, None] + dist[0, primeiro][None, :] - dist[ultimo[:, None], primeiro[None, :]]
+    np.fill_diagonal(economia, -np.inf)
+    vizinhos = min(vizinhos, len(iniciais) - 1)
+    candidatos = []
+    if vizinhos > 0:
+        melhores = np.argpartition(-economia, vizinhos - 1, axis=1)[:, :vizinhos]
+        for a in range(len(iniciais)):
+            for b in melhores[a]:
+                if economia[a, b] > 0:
+                    candidatos.append((economia[a, b], a, int(b)))
+    candidatos.sort(reverse=True)
+
+    # rota atual de cada rota inicial; junções só entre o fim de uma rota e o início de outra
+    rota_de = list(range(len(iniciais)))
+    membros = {i: [i] for i in range(len(iniciais))}
+    paradas = {i: list(r) for i, r in enumerate(iniciais)}
+    custo_rota = dict(enumerate(custos))
+    for _, a, b in candidatos:
+        ra, rb = rota_de[a], rota_de[b]
+        if ra == rb or membros[ra][-1] != a or membros[rb][0] != b:
+            continue
+        juntas = paradas[ra] + paradas[rb]
+        custo, aptos = _custo_viagem(inst, reps, juntas)
+        if not aptos or custo > custo_rota[ra] + custo_rota[rb] + 1e-9:
+            continue
+        membros[ra].extend(membros[rb])
+        paradas[ra] = juntas
+        custo_rota[ra] = custo
+        for i in membros[rb]:
+            rota_de[i] = ra
+        del membros[rb], paradas[rb], custo_rota[rb]
+    return list(paradas.values()), pendentes
+
+
+def distribuir_viagens(inst: Instancia, viagens: List[Viagem]) -> Tuple[Dict[str, List[Viagem]], List[int]]:
+    """Encaixa as viagens nos veículos, cada uma como próxima viagem do veículo de menor custo incremental."""
+    rotas: Dict[str, List[Viagem]] = {k: [] for k in inst.veiculos}
+    fim = {k: 0.0 for k in inst.veiculos}
+    pendentes: List[int] = []
+    ordem = sorted(viagens, key=lambda v: (min(inst.nodes[n].prazo_horas for n, _ in v), -len(v)))
+    for viagem in ordem:
+        melhor = (math.inf, None, 0.0)
+        for k in inst.veiculos:
+            if len(rotas[k]) >= inst.r_max or not all(inst.compativel(k, n) for n, _ in viagem):
+                continue
+            ok, dist, atraso, fim_k = inst.avaliar_viagem(k, viagem, fim[k])
+            if not ok:
+                continue
+            custo = inst.custo_km[k] * dist + PENALIDADE_ATRASO * atraso
+            if custo < melhor[0]:
+                melhor = (custo, k, fim_k)
+        if melhor[1] is None:
+            pendentes.extend(n for n, _ in viagem)
+            continue
+        rotas[melhor[1]].append(viagem)
+        fim[melhor[1]] = melhor[2]
+    return rotas, pendentes
+
+
+def realocar_tarefas(inst: Instancia, rotas: Dict[str, List[Viagem]], tempo_limite_s: float | None = None) -> Dict[str, List[Viagem]]:
+    """
+    Retira cada tarefa (parte de delivery ou par coleta/entrega) da sua viagem e a reinsere na melhor
+    posição de qualquer veículo, quando isso reduz o custo total. Corrige sobretudo atrasos criados
+    pelo encadeamento de viagens longas no mesmo veículo.
+    """
+    limite = None if tempo_limite_s is None else time.perf_counter() + tempo_limite_s
+    rotas = {k: [list(v) for v in viagens] for k, viagens in rotas.items()}
+    custos = {k: inst.avaliar_veiculo(k, v)[1] for k, v in rotas.items()}
+    tarefas = [
+        (k, n, q) for k, viagens in rotas.items() for v in viagens for n, q in v
+        if inst.nodes[n].service_type != "dropoff"
+    ]
+    for k, n, q in tarefas:
+        if limite is not None and time.perf_counter() > limite:
+            break
+        par = inst.drop_of.get(n)
+        t = next((t for t, v in enumerate(rotas[k]) if (n, q) in v), None)
+        if t is None:
+            continue
+        sem = [m for m in rotas[k][t] if m != (n, q) and (par is None or m[0] != par)]
+        viagens_sem = [v for v in rotas[k][:t] + [sem] + rotas[k][t + 1:] if v]
+        ok, custo_sem = inst.avaliar_veiculo(k, viagens_sem)
+        if not ok:
+            continue
+        antes = dict(rotas), dict(custos)
+        rotas[k], custos[k] = viagens_sem, custo_sem
+        tarefa = ("pair", n, par) if par is not None else ("delivery", n, q)
+        delta, k2, viagens2, q2 = _melhor_insercao(inst, rotas, custos, tarefa, q)
+        ganho = antes[1][k] - custo_sem
+        if k2 is None or (tarefa[0] == "delivery" and q2 != q) or delta >= ganho - 1e-9:
+            rotas, custos = antes
+            continue
+        rotas[k2] = viagens2
+        custos[k2] += delta
+    return rotas
+
+
+def busca_local(inst: Instancia, rotas: Dict[str, List[Viagem]], tempo_limite_s: float | None = None) -> Dict[str, List[Viagem]]:
+    """
+    Melhoria intra-viagem por 2-opt (inversão de trecho) e or-opt (realocação de trechos de 1 a 3
+    paradas), aceitando o primeiro movimento viável que reduz o custo do veículo.
+    """
+    limite = None if tempo_limite_s is None else time.perf_counter() + tempo_limite_s
+    rotas = {k: [list(v) for v in viagens] for k, viagens in rotas.items()}
+    for k, viagens in rotas.items():
+        custo_k = inst.avaliar_veiculo(k, viagens)[1]
+        for t in range(len(viagens)):
+            melhorou = True
+            while melhorou:
+                if limite is not None and time.perf_counter() > limite:
+                    return rotas
+                melhorou = False
+                v = viagens[t]
+                n = len(v)
+                vizinhos = [v[:i] + v[i:j + 1][::-1] + v[j + 1:] for i in range(n - 1) for j in range(i + 1, n)]
+                for tam in (1, 2, 3):
+                    for i in range(n - tam + 1):
+                        trecho, resto = v[i:i + tam], v[:i] + v[i + tam:]
+                        vizinhos.extend(resto[:p] + trecho + resto[p:] for p in range(len(resto) + 1) if p != i)
+                for nova in vizinhos:
+                    viagens[t] = nova
+                    ok, custo = inst.avaliar_veiculo(k, viagens)
+                    if ok and custo < custo_k - 1e-9:
+                        custo_k = custo
+                        melhorou = True
+                        break
+                    viagens[t] = v
+    return rotas
+
+
+def rotas_rapidas(inst: Instancia, tempo_limite_s: float | None = None) -> Tuple[Dict[str, List[Viagem]], List[int]]:
+    """
+    Rotas por economias de Clarke-Wright, realocação de tarefas e 2-opt/or-opt. A inserção gulosa
+    melhorada pela mesma busca local serve de alternativa; ficam as rotas mais baratas.
+    Retorna as rotas e os nós não atendidos.
+    """
+    viagens, pendentes = clarke_wright(inst)
+    rotas, nao_alocados = distribuir_viagens(inst, viagens)
+    rotas = realocar_tarefas(inst, rotas, tempo_limite_s)
+    rotas = busca_local(inst, rotas, tempo_limite_s)
+    pendentes = sorted(set(pendentes + nao_alocados))
+
+    rotas_ins, pendentes_ins = construir_por_insercao(inst)
+    if not pendentes_ins:
+        rotas_ins = busca_local(inst, rotas_ins, tempo_limite_s)
+        if pendentes or inst.custo_plano(rotas_ins) < inst.custo_plano(rotas):
+            rotas, pendentes = rotas_ins, []
+    return rotas, pendentes
+
+
+def plano_rapido(dados: Dict[str, Any], tempo_limite_s: float | None = None) -> Tuple[Dict[str, Any], List[int]]:
+    """Plano de `rotas_rapidas`, com as viagens ordenadas por veículo. Retorna o plano e os nós não atendidos."""
+    inst = Instancia(dados)
+    rotas, pendentes = rotas_rapidas(inst, tempo_limite_s)
+    rotas = ordenar_por_tipo(inst, rotas)
+    plano = inst.plano(rotas)
+    plano["custo"] = inst.custo_plano(rotas)
+    return plano, pendentes
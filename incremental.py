@@ -0,0 +1,148 @@
+"""
+Reotimização incremental depois de pequenas mudanças na lista de tarefas.
+
+As tarefas do plano anterior são reconhecidas na nova instância pela assinatura (tipo, local, item,
+código, prazo, destino da coleta e ordem entre repetições), e não pelo id do nó, que muda quando
+linhas de df_planejamento são removidas. Os veículos afetados são os que tinham uma tarefa removida
+ou com quantidade alterada, os que saíram da seleção e os que recebem as tarefas novas na inserção
+mais barata. As tarefas deles e as novas voltam a um MIP restrito a essas placas e às ociosas. As
+viagens dos demais veículos ficam fixas, como estavam.
+"""
+import dataclasses
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+import solver_pulp
+from decomposicao import _rotas_do_plano, _subproblema, _tarefas_cluster
+from heuristicas import Instancia, Viagem, inserir_tarefas
+from solver_pulp import OpcoesSolver
+
+
+def _traduzir_plano(dados: Dict[str, Any], anterior: Dict[str, Any]) -> Tuple[Dict[str, List[Viagem]], Set[str]]:
+    """
+    Viagens do plano anterior com os ids de nó da nova instância, sem as paradas de tarefas removidas
+    ou alteradas, e as placas afetadas (perderam paradas ou saíram da seleção).
+    """
+    novas = solver_pulp._assinaturas_tarefas(dados)
+    por_chave = {a["chave"]: node_id for node_id, a in novas.items()}
+    mapa: Dict[int, int] = {}
+    for node_id, a in anterior["assinaturas_tarefas"].items():
+        novo = por_chave.get(a["chave"])
+        if novo is None or novas[novo]["quantidade"] != a["quantidade"]:
+            continue
+        mapa[node_id] = novo
+        if a["dropoff"] is not None:
+            mapa[a["dropoff"]] = novas[novo]["dropoff"]
+
+    rotas: Dict[str, List[Viagem]] = {}
+    afetados: Set[str] = set()
+    for k, viagens in _rotas_do_plano(anterior["plano"]).items():
+        if k not in dados["vehicles"]:
+            afetados.add(k)
+            continue
+        for viagem in viagens:
+            mantidas = [(mapa[n], q) for n, q in viagem if n in mapa]
+            if len(mantidas) < len(viagem):
+                afetados.add(k)
+            if mantidas:
+                rotas.setdefault(k, []).append(mantidas)
+    return rotas, afetados
+
+
+def _fechar_afetados(inst: Instancia, rotas: Dict[str, List[Viagem]], afetados: Set[str]) -> Set[str]:
+    """Inclui as placas que dividem uma tarefa (entrega fracionada) com uma placa afetada."""
+    placas_por_tarefa: Dict[int, Set[str]] = {}
+    for k, viagens in rotas.items():
+        for viagem in viagens:
+            for n, _ in viagem:
+                placas_por_tarefa.setdefault(inst.pick_of.get(n, n), set()).add(k)
+    afetados = set(afetados)
+    while True:
+        novos = {k for placas in placas_por_tarefa.values() if placas & afetados for k in placas} - afetados
+        if not novos:
+            return afetados
+        afetados |= novos
+
+
+def reotimizar(dados: Dict[str, Any], anterior: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    """
+    Solução neutra (formato de `solver_pulp._otimizar_mip`) que mantém as viagens dos veículos não
+    afetados pelas mudanças e reotimiza o restante, com as métricas de reaproveitamento.
+    """
+    if "plano" not in anterior or "assinaturas_tarefas" not in anterior:
+        raise ValueError("O resultado anterior não tem plano para reaproveitar (execute a otimização completa antes).")
+    t0 = time.perf_counter()
+    inst = Instancia(dados)
+    tarefas = _tarefas_cluster(dados)
+    rotas, afetados = _traduzir_plano(dados, anterior)
+
+    # Tarefas fora do plano traduzido (novas ou alteradas): a inserção mais barata indica quais
+    # veículos recebem cada uma e serve de plano de referência para a vizinhança
+    atendidas = {n for viagens in rotas.values() for viagem in viagens for n, _ in viagem}
+    novas = [t for t in tarefas if t["nodes"][0].node_id not in atendidas]
+    pendentes = [
+        ("pair", n.node_id, inst.drop_of[n.node_id]) if n.service_type == "pickup" else ("delivery", n.node_id, int(round(n.quantity)))
+        for n in (t["nodes"][0] for t in novas)
+    ]
+    referencia, nao_inseridas = inserir_tarefas(inst, rotas, sorted(pendentes, key=lambda t: inst.nodes[t[1]].prazo_horas))
+    afetados |= {k for k in inst.veiculos if referencia.get(k, []) != rotas.get(k, [])}
+    for n in nao_inseridas:
+        # sem inserção viável nas rotas atuais: todos os veículos compatíveis entram na vizinhança
+        afetados |= {k for k in inst.veiculos if inst.compativel(k, n)}
+    afetados = _fechar_afetados(inst, referencia, afetados) & set(inst.veiculos)
+
+    fixas = {k: v for k, v in rotas.items() if k not in afetados and v}
+    fixos = {n for viagens in fixas.values() for viagem in viagens for n, _ in viagem}
+    vizinhanca = [t for t in tarefas if t["nodes"][0].node_id not in fixos]
+    ociosas = [k for k in inst.veiculos if k not in fixas and k not in afetados]
+    placas = [k for k in inst.veiculos if k in afetados] + ociosas
+    print(
+        f"INCREMENTAL: {len(fixas)} veículos mantidos, {len(afetados)} afetados + {len(ociosas)} ociosos; "
+        f"{len(tarefas) - len(vizinhanca)} tarefas fixas, {len(vizinhanca)} reotimizadas ({len(novas)} novas ou alteradas)"
+    )
+
+    solucao_viz = None
+    rotas_viz: Dict[str, List[Viagem]] = {}
+    if vizinhanca:
+        sub = _subproblema(dados, vizinhanca, placas, opcoes.agrupar_veiculos_identicos)
+        opcoes_sub = dataclasses.replace(opcoes, modo="mip", ao_incumbente=None)
+        solucao_viz = solver_pulp._otimizar_mip(sub, opcoes_sub)
+        if solucao_viz["status"] in ("Optimal", "Feasible"):
+            rotas_viz = _rotas_do_plano(solucao_viz["plano"])
+        # o MIP pode parar (tempo, regra de parada) com plano pior que a inserção de referência
+        if not nao_inseridas:
+            rotas_ref = {k: v for k, v in referencia.items() if k in placas and any(v)}
+            if not rotas_viz or inst.custo_plano(rotas_ref) < inst.custo_plano(rotas_viz) - 1e-6:
+                rotas_viz = rotas_ref
+        if not rotas_viz:
+            return {
+                "status": solucao_viz["status"],
+                "mensagem": "A reotimização não encontrou solução viável para as tarefas alteradas.",
+            }
+
+    rotas_finais = {**fixas, **rotas_viz}
+    custo = inst.custo_plano(rotas_finais)
+    n_tarefas = max(1, len(tarefas))
+    reaproveitamento = {
+        "veiculos_mantidos": len(fixas),
+        "veiculos_reotimizados": len(placas) if vizinhanca else 0,
+        "tarefas_mantidas": len(tarefas) - len(vizinhanca),
+        "tarefas_reotimizadas": len(vizinhanca),
+        "tarefas_novas_ou_alteradas": len(novas),
+        "pct_tarefas_mantidas": round(100.0 * (len(tarefas) - len(vizinhanca)) / n_tarefas, 1),
+        "viagens_mantidas": sum(len(v) for v in fixas.values()),
+    }
+    gap = {} if solucao_viz is None else solucao_viz.get("gap", {})
+    print(f"INCREMENTAL: custo = {custo:.2f} em {time.perf_counter() - t0:.2f}s, {reaproveitamento['pct_tarefas_mantidas']}% das tarefas mantidas")
+    return {
+        "status": "Feasible",
+        "plano": inst.plano(rotas_finais),
+        "objective_value": custo,
+        # gap da vizinhança, não do plano inteiro (as viagens fixas não passam pelo MIP)
+        "gap": {},
+        "gap_vizinhanca_pct": gap.get("mip_gap_pct"),
+        "modo": "incremental",
+        "backend": opcoes.backend,
+        "reaproveitamento": reaproveitamento,
+        "motivo_parada": None if solucao_viz is None else solucao_viz.get("motivo_parada"),
+    }
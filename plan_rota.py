@@ -6,8 +6,34 @@ import time # Importa a biblioteca time para usar time.sleep
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError
 # Importa as funções do novo módulo do solver
 import solver_pulp
+import execucoes
 from io import BytesIO
 
+INTERVALO_ATUALIZACAO_S = 2.0  # intervalo de consulta ao andamento da execução em segundo plano
+
+# Política de parada da otimização completa: gap de 1% (exibido como ótimo), 10 min sem melhorar o
+# incumbente ou orçamento de 2 min + 20 s por nó de serviço, no máximo os 30 min do solver; o número
+# de viagens por veículo cresce sob demanda a partir do limite inferior
+OPCOES_OTIMIZACAO_COMPLETA = solver_pulp.OpcoesSolver(
+    parar_gap_pct=1.0,
+    parar_sem_melhora_s=600.0,
+    tempo_base_s=120.0,
+    tempo_por_no_s=20.0,
+    horizonte_dinamico=True,
+)
+
+DESCRICAO_PARADA = {
+    "otimo": "ótimo provado",
+    "gap_rel": "gap alvo do solver atingido",
+    "gap_pct": "gap abaixo do alvo da política",
+    "gap_abs": "diferença para o limite abaixo do alvo",
+    "objetivo_alvo": "custo alvo atingido",
+    "sem_melhora": "sem melhora do incumbente na janela da política",
+    "tempo_limite": "orçamento de tempo esgotado",
+    "inviavel": "modelo inviável",
+    "interrompido": "execução interrompida",
+}
+
 
 @st.cache_data # Cacheia os resultados da geocodificação para evitar requisições repetidas
 def geocode_with_retry(_geolocator, address, retries=3, delay=2):
@@ -25,6 +51,86 @@ def geocode_with_retry(_geolocator, address, retries=3, delay=2):
                 return None
     return None
 
+@st.cache_resource
+def gerenciador_execucoes():
+    """Gerenciador único por servidor: as execuções sobrevivem a reruns e recarregamentos da página."""
+    return execucoes.GerenciadorExecucoes()
+
+
+def acompanhar_execucao():
+    """
+    Mostra o andamento da execução em segundo plano desta sessão (id na sessão ou na URL) e,
+    quando ela termina, leva o resultado para `resultados_otimizacao`.
+    """
+    execucao_id = st.session_state.get("execucao_id") or st.query_params.get("execucao")
+    if not execucao_id:
+        return
+    gerenciador = gerenciador_execucoes()
+    execucao = gerenciador.obter(execucao_id)
+
+    def esquecer():
+        st.session_state.pop("execucao_id", None)
+        st.query_params.pop("execucao", None)
+
+    if execucao is None:
+        esquecer()
+        st.warning("A execução anterior não está mais disponível (o servidor pode ter sido reiniciado).")
+        return
+
+    if execucao.ativa:
+        st.session_state.execucao_id = execucao.id
+        progresso = execucao.progresso
+        if execucao.estado == execucoes.NA_FILA:
+            st.info(f"{execucao.descricao}: aguardando vaga para executar...")
+        else:
+            st.info(f"{execucao.descricao}: executando em segundo plano. Você pode continuar usando a página.")
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Tempo decorrido", f"{execucao.tempo_decorrido_s:,.0f} s")
+        objetivo = progresso.get("objetivo")
+        c2.metric("Melhor custo encontrado", "—" if objetivo is None else f"R$ {objetivo:,.2f}")
+        gap = progresso.get("gap_pct")
+        c3.metric("Gap de otimalidade", "—" if gap is None else f"{gap:.2f}%")
+        if progresso.get("etapa"):
+            st.caption(progresso["etapa"])
+        if st.button("Cancelar execução", key="cancelar_execucao"):
+            gerenciador.cancelar(execucao.id)
+            st.rerun()
+        time.sleep(INTERVALO_ATUALIZACAO_S)
+        st.rerun()
+
+    if execucao.estado == execucoes.CONCLUIDA:
+        st.session_state.resultados_otimizacao = execucao.resultado
+    elif execucao.estado == execucoes.CANCELADA:
+        st.warning(f"{execucao.descricao}: execução cancelada após {execucao.tempo_decorrido_s:,.0f} s.")
+    else:
+        st.error(f"{execucao.descricao}: a execução falhou.")
+        with st.expander("Detalhes do erro"):
+            st.code(execucao.erro or "")
+    gerenciador.descartar(execucao.id)
+    esquecer()
+
+
+def submeter_execucao(descricao, df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam, opcoes=None, resultado_anterior=None):
+    """Envia o planejamento ao gerenciador e guarda o id na sessão e na URL (sobrevive a recarregar a página)."""
+    # mesmas entradas de uma execução anterior: o resultado do cache dispensa o processo em segundo plano
+    em_cache = solver_pulp.resultado_em_cache(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam, opcoes)
+    if em_cache is not None:
+        st.session_state.resultados_otimizacao = em_cache
+        return
+    execucao_id = gerenciador_execucoes().submeter(
+        df_veiculos_selecionados,
+        df_planejamento,
+        df_itens,
+        final_destinos_nao_retornam=final_destinos_nao_retornam,
+        opcoes=opcoes,
+        descricao=descricao,
+        resultado_anterior=resultado_anterior,
+    )
+    st.session_state.execucao_id = execucao_id
+    st.query_params["execucao"] = execucao_id
+    st.session_state.pop("resultados_otimizacao", None)
+
+
 def render(df_veiculos, df_itens):
     """
     Renderiza a página de Planejamento de Rotas.
@@ -632,21 +738,64 @@ def render(df_veiculos, df_itens):
 
     st.header("3. Planejar Rotas")
     st.markdown("---")
-    if st.button("Executar Planejamento de Rotas", type="primary", use_container_width=True):
+    modo_planejamento = st.radio(
+        "Modo de planejamento",
+        ("Otimização completa", "Plano rápido", "Busca heurística (ALNS)"),
+        horizontal=True,
+        help="A otimização completa usa o solver MIP e pode levar até 30 minutos. "
+             "O plano rápido usa uma heurística (economias + busca local) e responde em segundos, sem garantia de ótimo. "
+             "A busca ALNS melhora o plano rápido durante o tempo escolhido; indicada para instâncias grandes.",
+    )
+    tempo_alns = 60
+    if modo_planejamento == "Busca heurística (ALNS)":
+        tempo_alns = st.slider("Tempo da busca ALNS (s)", min_value=10, max_value=600, value=60, step=10)
+    # Plano atual reaproveitável: pequenas edições na lista de tarefas reotimizam só os veículos afetados
+    resultado_atual = st.session_state.get("resultados_otimizacao") or {}
+    reotimizar = False
+    if modo_planejamento == "Otimização completa" and resultado_atual.get("plano") and resultado_atual.get("status") in ("Optimal", "Feasible"):
+        reotimizar = st.checkbox(
+            "Reotimizar só o que mudou",
+            value=True,
+            help="Mantém as viagens dos veículos que não foram afetados pelas mudanças na lista de tarefas "
+                 "e resolve de novo apenas as tarefas dos demais veículos e as tarefas novas.",
+        )
+    execucao_em_andamento = bool(st.session_state.get("execucao_id") or st.query_params.get("execucao"))
+    if st.button("Executar Planejamento de Rotas", type="primary", use_container_width=True, disabled=execucao_em_andamento):
         if not st.session_state.get('itens_planejamento'):
             st.warning("Nenhum item foi adicionado ou todas as tarefas foram removidas. Adicione itens para continuar.")
         elif itens_incompativeis:
             st.error("Não é possível planejar as rotas devido a itens incompatíveis. Verifique o alerta acima.")
         elif veiculos_nao_retornam and len(final_destinos_nao_retornam) != len(veiculos_nao_retornam):
             st.error("Por favor, selecione um destino final para todos os veículos que ficam em campo.")
-        else:
-            with st.spinner("Executando o solver, isso pode levar até 30 minutos..."):
-                st.session_state.resultados_otimizacao = solver_pulp.run_optimization(
+        elif modo_planejamento == "Plano rápido":
+            with st.spinner("Gerando plano rápido..."):
+                st.session_state.resultados_otimizacao = solver_pulp.executar_plano_rapido(
                     df_veiculos_selecionados,
                     df_planejamento,
                     df_itens,
                     final_destinos_nao_retornam=final_destinos_nao_retornam,
                 )
+        elif modo_planejamento == "Busca heurística (ALNS)":
+            submeter_execucao(
+                f"Busca ALNS ({tempo_alns}s)",
+                df_veiculos_selecionados,
+                df_planejamento,
+                df_itens,
+                final_destinos_nao_retornam,
+                opcoes=solver_pulp.OpcoesSolver(modo="alns", alns_tempo_s=float(tempo_alns)),
+            )
+        else:
+            submeter_execucao(
+                "Reotimização incremental" if reotimizar else "Otimização completa",
+                df_veiculos_selecionados,
+                df_planejamento,
+                df_itens,
+                final_destinos_nao_retornam,
+                opcoes=OPCOES_OTIMIZACAO_COMPLETA,
+                resultado_anterior=resultado_atual if reotimizar else None,
+            )
+
+    acompanhar_execucao()
 
     if 'resultados_otimizacao' in st.session_state and st.session_state.resultados_otimizacao:
         resultados = st.session_state.resultados_otimizacao
@@ -655,11 +804,30 @@ def render(df_veiculos, df_itens):
             st.error(resultados.get("mensagem", f"Solver sem solução viável. Status: {resultados.get('status', 'Desconhecido')}"))
             return
 
-        if resultados.get("status") == "Optimal":
+        if resultados.get("modo") == "rapido":
+            st.info(f"Plano rápido gerado por heurística em {resultados.get('tempo_heuristica_s', 0):.2f}s (sem prova de otimalidade).")
+        elif resultados.get("modo") == "alns":
+            estat = resultados.get("alns", {})
+            st.info(
+                f"Plano ALNS em {resultados.get('tempo_heuristica_s', 0):.1f}s: {estat.get('iteracoes', 0)} iterações, "
+                f"custo inicial {estat.get('custo_inicial', 0):,.2f} (sem prova de otimalidade)."
+            )
+        elif resultados.get("modo") == "incremental":
+            reap = resultados.get("reaproveitamento", {})
+            st.info(
+                f"Reotimização incremental: {reap.get('pct_tarefas_mantidas', 0):.0f}% das tarefas mantidas "
+                f"({reap.get('veiculos_mantidos', 0)} veículos sem alteração, {reap.get('tarefas_reotimizadas', 0)} tarefas "
+                f"reotimizadas, das quais {reap.get('tarefas_novas_ou_alteradas', 0)} novas ou alteradas)."
+            )
+        elif resultados.get("status") == "Optimal":
             st.success("Solução ótima encontrada para a formulação híbrida.")
         else:
             st.warning("Solução viável encontrada. O modelo foi resolvido, mas sem prova de otimalidade dentro do limite do solver.")
 
+        if resultados.get("cache", {}).get("hit"):
+            salvo_em = time.strftime("%d/%m/%Y %H:%M", time.localtime(resultados["cache"]["criado_em"]))
+            st.caption(f"Resultado reaproveitado do cache: mesmas entradas e opções de uma execução de {salvo_em}.")
+
         resumo = resultados.get("summary", {})
         c1, c2, c3, c4 = st.columns(4)
         c1.metric("Objetivo", f"R$ {resultados.get('objective_value', 0):,.2f}")
@@ -673,6 +841,15 @@ def render(df_veiculos, df_itens):
                 st.success(f"Gap do solver: {gap_pct:.2f}% (ótimo)")
             else:
                 st.warning(f"Gap do solver: {gap_pct:.2f}%")
+        if resultados.get("motivo_parada"):
+            motivo = resultados["motivo_parada"]
+            st.caption(f"Parada do solver: {DESCRICAO_PARADA.get(motivo, motivo)} (orçamento de {resultados.get('tempo_limite_s', 0):,.0f}s).")
+        if resultados.get("rodadas_horizonte"):
+            rodadas = resultados["rodadas_horizonte"]
+            st.caption(
+                f"Horizonte de viagens: {len(rodadas)} rodada(s), "
+                f"{' → '.join(str(rd['viagens']) for rd in rodadas)} viagens por veículo."
+            )
 
         st.subheader("Demandas livres e estoque parametrizado")
         st.caption("Na versão atual, a ferramenta considera estoque infinito no galpão.")
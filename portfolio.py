@@ -0,0 +1,223 @@
+"""
+Portfólio de configurações do HiGHS disputando o mesmo MIP em processos paralelos.
+
+Cada corrida recebe o modelo matricial já montado e uma variação de opções (semente, esforço de
+heurísticas, presolve, heurísticas de viabilidade). Pelos callbacks do HiGHS as corridas publicam
+incumbentes e limites duais num estado compartilhado, importam o melhor incumbente das outras e
+param todas assim que o gap global (melhor incumbente contra melhor limite) atinge o alvo ou quando
+uma regra de parada do chamador (`parar_gap_pct`, `parar_sem_melhora_s`, ...) vale para o estado global.
+"""
+import dataclasses
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from solver_pulp import (
+    MOTIVOS_PARADA,
+    OpcoesSolver,
+    _Acompanhamento,
+    _gap_pct,
+    _highs_do_modelo,
+    _regra_de_parada,
+    _status_from_highs,
+)
+
+# Variações de opções do HiGHS, na ordem em que entram no portfólio
+CONFIGURACOES_PORTFOLIO: List[Tuple[str, Dict[str, Any]]] = [
+    ("padrao", {}),
+    ("heuristicas_fortes", {"random_seed": 1, "mip_heuristic_effort": 0.3}),
+    ("sem_presolve", {"random_seed": 2, "presolve": "off"}),
+    ("arredondamento", {"random_seed": 3, "mip_heuristic_effort": 0.15, "mip_heuristic_run_zi_round": True, "mip_heuristic_run_shifting": True}),
+    ("foco_limite", {"random_seed": 4, "mip_heuristic_effort": 0.01, "mip_heuristic_run_feasibility_jump": False, "mip_heuristic_run_rins": False, "mip_heuristic_run_rens": False}),
+    ("sem_reinicio", {"random_seed": 5, "mip_allow_restart": False, "mip_detect_symmetry": False}),
+    ("semente_6", {"random_seed": 6}),
+    ("semente_7", {"random_seed": 7, "mip_heuristic_effort": 0.1}),
+]
+
+# Estado de cada processo do portfólio (definido pelo inicializador do pool)
+_processo: Dict[str, Any] = {}
+
+
+def _inicializar(arrays, opcoes, solucao_inicial, melhor, parar, versao, solucao, trava) -> None:
+    _processo.update(
+        arrays=arrays, opcoes=opcoes, solucao_inicial=solucao_inicial,
+        melhor=melhor, parar=parar, versao=versao, solucao=solucao, trava=trava,
+    )
+
+
+def _gap(incumbente: float, limite: float) -> float:
+    if not (math.isfinite(incumbente) and math.isfinite(limite)):
+        return math.inf
+    return max(0.0, incumbente - limite) / max(abs(incumbente), 1e-9)
+
+
+def _parar(parar, motivo: str) -> None:
+    # parar guarda 1 + índice do primeiro motivo em MOTIVOS_PARADA (0 = continuar)
+    if not parar.value:
+        parar.value = 1 + MOTIVOS_PARADA.index(motivo)
+
+
+def _motivo_portfolio(codigo: int, modelos: set) -> str:
+    if codigo:
+        return MOTIVOS_PARADA[codigo - 1]
+    return "tempo_limite" if "Time limit reached" in modelos else "interrompido"
+
+
+def _corrida(indice: int) -> Dict[str, Any]:
+    """Uma configuração do portfólio; publica e importa incumbentes pelo estado compartilhado."""
+    p = _processo
+    opcoes: OpcoesSolver = p["opcoes"]
+    nome, extras = CONFIGURACOES_PORTFOLIO[indice]
+    h = _highs_do_modelo(p["arrays"], opcoes, p["solucao_inicial"], extras)
+    melhor, parar, versao, solucao, trava = p["melhor"], p["parar"], p["versao"], p["solucao"], p["trava"]
+    importada = [0]
+
+    def ao_melhorar(e) -> None:
+        valor = e.data_out.objective_function_value
+        with trava:
+            if valor < melhor[0] - 1e-9:
+                melhor[0] = valor
+                if valor < melhor[3] - 1e-6 * max(1.0, abs(melhor[3])):
+                    melhor[2], melhor[3] = time.time(), valor
+                np.frombuffer(solucao.get_obj(), dtype=float)[:] = e.data_out.mip_solution
+                versao.value += 1
+                importada[0] = versao.value
+
+    def ao_interromper(e) -> None:
+        with trava:
+            melhor[1] = max(melhor[1], e.data_out.mip_dual_bound)
+            if _gap(melhor[0], melhor[1]) <= opcoes.gap_rel:
+                _parar(parar, "gap_rel")
+            elif math.isfinite(melhor[0]):
+                # regras do chamador sobre o estado global (incumbente de qualquer corrida)
+                limite = melhor[1] if math.isfinite(melhor[1]) else None
+                motivo = _regra_de_parada(opcoes, melhor[0], limite, time.time() - melhor[2])
+                if motivo is not None:
+                    _parar(parar, motivo)
+            interromper = bool(parar.value)
+        if interromper:
+            e.data_in.user_interrupt = True
+
+    def ao_pedir_solucao(e) -> None:
+        if versao.value == importada[0]:
+            return
+        with trava:
+            importada[0] = versao.value
+            if melhor[0] < e.data_out.mip_primal_bound - 1e-9:
+                e.data_in.user_solution[:] = np.frombuffer(solucao.get_obj(), dtype=float)
+                e.data_in.user_has_solution = True
+
+    h.cbMipImprovingSolution.subscribe(ao_melhorar)
+    h.cbMipInterrupt.subscribe(ao_interromper)
+    h.cbMipUserSolution.subscribe(ao_pedir_solucao)
+    t0 = time.perf_counter()
+    h.run()
+    status = _status_from_highs(h)
+    info = h.getInfo()
+    col_value = np.asarray(h.getSolution().col_value, dtype=float) if status in ("Optimal", "Feasible") else None
+    limite = float(getattr(info, "mip_dual_bound", -math.inf))
+    with trava:
+        if math.isfinite(limite):
+            melhor[1] = max(melhor[1], limite)
+        # ótimo ou inviável provado por uma corrida vale para todas
+        modelo = h.modelStatusToString(h.getModelStatus())
+        if modelo == "Optimal":
+            _parar(parar, "otimo" if _gap(melhor[0], melhor[1]) <= 1e-9 else "gap_rel")
+        elif modelo == "Infeasible":
+            _parar(parar, "inviavel")
+    return {
+        "configuracao": nome,
+        "status": status,
+        "modelo": h.modelStatusToString(h.getModelStatus()),
+        "objetivo": float(info.objective_function_value) if status in ("Optimal", "Feasible") else None,
+        "limite": limite if math.isfinite(limite) else None,
+        "tempo_s": round(time.perf_counter() - t0, 2),
+        "solucao": col_value,
+    }
+
+
+def resolver_portfolio(
+    arrays: Dict[str, Any],
+    opcoes: OpcoesSolver,
+    solucao_inicial: np.ndarray | None = None,
+    acompanhamento: _Acompanhamento | None = None,
+) -> Tuple[str, np.ndarray | None, Dict[str, float | None], List[Dict[str, Any]]]:
+    """
+    Dispara `opcoes.portfolio` corridas (até o número de configurações) e devolve o status, o melhor
+    incumbente entre todas, o gap contra o melhor limite e o resumo de cada corrida. O histórico de
+    incumbentes globais vai para `acompanhamento` (amostrado pelo processo principal a cada ~1 s).
+    """
+    n = max(1, min(opcoes.portfolio, len(CONFIGURACOES_PORTFOLIO)))
+    n_cols = int(arrays["n_cols"])
+    ctx = mp.get_context()
+    # melhor incumbente, melhor limite, instante (time.time) da última melhora e objetivo dela; com a
+    # referência de uma rodada anterior (horizonte dinâmico), a janela sem melhora continua de lá
+    referencia = acompanhamento.referencia if acompanhamento is not None else None
+    if referencia is None:
+        melhor = ctx.Array("d", [math.inf, -math.inf, time.time(), math.inf], lock=False)
+    else:
+        melhor = ctx.Array("d", [math.inf, -math.inf, time.time() - (time.perf_counter() - referencia[1]), referencia[0]], lock=False)
+    parar = ctx.Value("b", 0, lock=False)
+    versao = ctx.Value("i", 0, lock=False)
+    solucao = ctx.Array("d", n_cols)
+    trava = ctx.Lock()
+    threads = opcoes.threads or max(1, (os.cpu_count() or 1) // n)
+    opcoes_corrida = dataclasses.replace(opcoes, threads=threads, msg=False, progresso=None, ao_incumbente=None)
+
+    print(f"PORTFÓLIO: {n} corridas x {threads} threads ({', '.join(nome for nome, _ in CONFIGURACOES_PORTFOLIO[:n])})")
+    with ProcessPoolExecutor(
+        max_workers=n, mp_context=ctx, initializer=_inicializar,
+        initargs=(arrays, opcoes_corrida, solucao_inicial, melhor, parar, versao, solucao, trava),
+    ) as pool:
+        futuros = [pool.submit(_corrida, i) for i in range(n)]
+        t0 = time.perf_counter()
+        pendentes = set(futuros)
+        vista = 0
+        while pendentes:
+            _, pendentes = wait(pendentes, timeout=1.0, return_when=FIRST_COMPLETED)
+            with trava:
+                incumbente, limite, v = melhor[0], melhor[1], versao.value
+                x_atual = np.frombuffer(solucao.get_obj(), dtype=float).copy() if v != vista else None
+            objetivo = incumbente if math.isfinite(incumbente) else None
+            limite = limite if math.isfinite(limite) else None
+            ponto = {"tempo_s": round(time.perf_counter() - t0, 3), "objetivo": objetivo, "limite": limite, "gap_pct": _gap_pct(objetivo, limite)}
+            if opcoes.progresso is not None:
+                opcoes.progresso(ponto)
+            if acompanhamento is not None and x_atual is not None:
+                vista = v
+                acompanhamento.historico.append({**ponto, "nos": None})
+                if opcoes.ao_incumbente is not None and acompanhamento.decodificar is not None:
+                    acompanhamento.plano = acompanhamento.decodificar(x_atual)
+                    opcoes.ao_incumbente(ponto, acompanhamento.plano)
+        corridas = [f.result() for f in futuros]
+    for c in corridas:
+        print(f"  {c['configuracao']}: {c['modelo']}, objetivo = {c['objetivo']}, limite = {c['limite']}, {c['tempo_s']}s")
+
+    # melhor incumbente: o compartilhado ou o final de alguma corrida (p. ex. a solução inicial aceita)
+    x = np.frombuffer(solucao.get_obj(), dtype=float).copy() if versao.value else None
+    incumbente, limite = melhor[0], melhor[1]
+    for c in corridas:
+        valor = c.pop("solucao")
+        if valor is not None and c["objetivo"] < incumbente - 1e-9:
+            incumbente, x = c["objetivo"], valor
+    gap_rel = _gap(incumbente, limite)
+    gap = {
+        "mip_gap": None if not math.isfinite(gap_rel) else gap_rel,
+        "mip_gap_pct": None if not math.isfinite(gap_rel) else 100.0 * gap_rel,
+        "best_objective": incumbente if math.isfinite(incumbente) else None,
+        "best_bound": limite if math.isfinite(limite) else None,
+    }
+    modelos = {c["modelo"] for c in corridas}
+    if acompanhamento is not None:
+        acompanhamento.motivo = _motivo_portfolio(parar.value, modelos)
+    if not math.isfinite(incumbente):
+        status = "Infeasible" if "Infeasible" in modelos else "Not Solved"
+        return status, None, gap, corridas
+    status = "Optimal" if "Optimal" in modelos or gap_rel <= opcoes.gap_rel else "Feasible"
+    return status, x, gap, corridas
+
@@ -0,0 +1,328 @@
+import hashlib
+import heapq
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as _scipy_dijkstra
+except ImportError:  # scipy é opcional: sem ele usamos o Dijkstra em Python puro
+    csr_matrix = None
+    _scipy_dijkstra = None
+
+RAIO_TERRA_KM = 6371.0088
+GRID_CELULA_GRAUS = 0.02         # ~2 km: células do índice espacial usado no snap
+CSR_CACHE_VERSION = 1
+
+# Vias trafegáveis por veículos (tag highway do OSM)
+HIGHWAYS_TRAFEGAVEIS = {
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "living_street", "service", "track", "road",
+}
+
+
+def _haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    # Suficiente para trechos curtos de via e para as pernas de acesso ao grafo
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp = p2 - p1
+    dl = np.radians(lon2 - lon1)
+    h = np.sin(dp / 2.0) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2.0) ** 2
+    return 2.0 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def _file_signature(paths: List[str]) -> str:
+    h = hashlib.sha1()
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{os.path.abspath(p)}|{st.st_size}|{int(st.st_mtime)}".encode())
+    h.update(str(CSR_CACHE_VERSION).encode())
+    return h.hexdigest()[:16]
+
+
+class RoadGraph:
+    """
+    Grafo viário dirigido em formato CSR (indptr/indices/weights_km) com coordenadas dos vértices.
+    Responde consultas muitos-para-muitos de menor caminho entre coordenadas arbitrárias,
+    encaixando cada coordenada no vértice mais próximo do grafo.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, weights_km: np.ndarray, lat: np.ndarray, lon: np.ndarray, signature: str = ""):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights_km = weights_km
+        self.lat = lat
+        self.lon = lon
+        self.signature = signature
+        self._grid = None
+
+    @property
+    def n_nodes(self) -> int:
+        return int(len(self.lat))
+
+    @property
+    def n_edges(self) -> int:
+        return int(len(self.indices))
+
+    # ------------------------------------------------------------------ construção
+
+    @classmethod
+    def from_edges(cls, lat: np.ndarray, lon: np.ndarray, u: np.ndarray, v: np.ndarray, km: np.ndarray, oneway: np.ndarray, signature: str = "") -> "RoadGraph":
+        """Monta o CSR a partir de arestas u->v (índices 0..n-1); vias de mão dupla geram os dois sentidos."""
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        km = np.asarray(km, dtype=np.float64)
+        oneway = np.asarray(oneway, dtype=bool)
+        src = np.concatenate([u, v[~oneway]])
+        dst = np.concatenate([v, u[~oneway]])
+        w = np.concatenate([km, km[~oneway]])
+
+        # Arestas paralelas: mantém a mais curta
+        order = np.lexsort((w, dst, src))
+        src, dst, w = src[order], dst[order], w[order]
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, w = src[keep], dst[keep], w[keep]
+
+        # Remove vértices isolados para compactar o grafo
+        used = np.zeros(len(lat), dtype=bool)
+        used[src] = True
+        used[dst] = True
+        remap = np.full(len(lat), -1, dtype=np.int64)
+        remap[used] = np.arange(int(used.sum()))
+        src, dst = remap[src], remap[dst]
+        n = int(used.sum())
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(indptr, src + 1, 1)
+        indptr = np.cumsum(indptr)
+        return cls(
+            indptr=indptr,
+            indices=dst.astype(np.int32),
+            weights_km=w.astype(np.float32),
+            lat=np.asarray(lat, dtype=np.float64)[used],
+            lon=np.asarray(lon, dtype=np.float64)[used],
+            signature=signature,
+        )
+
+    @classmethod
+    def from_csv(cls, nodes_csv: str, edges_csv: str) -> "RoadGraph":
+        """
+        Lê uma lista de arestas pré-extraída (ex.: exportada do osmnx):
+        nodes_csv com colunas id/osmid, lat/y, lon/x; edges_csv com u, v, length (m) e, opcionalmente, oneway.
+        """
+        nodes = pd.read_csv(nodes_csv)
+        edges = pd.read_csv(edges_csv)
+        id_col = "osmid" if "osmid" in nodes.columns else "id"
+        lat_col = "y" if "y" in nodes.columns else "lat"
+        lon_col = "x" if "x" in nodes.columns else "lon"
+
+        ids = nodes[id_col].to_numpy()
+        order = np.argsort(ids)
+        ids_sorted = ids[order]
+        u = order[np.searchsorted(ids_sorted, edges["u"].to_numpy())]
+        v = order[np.searchsorted(ids_sorted, edges["v"].to_numpy())]
+        if "length_km" in edges.columns:
+            km = edges["length_km"].to_numpy(dtype=float)
+        else:
+            km = edges["length"].to_numpy(dtype=float) / 1000.0
+        if "oneway" in edges.columns:
+            oneway = edges["oneway"].astype(str).str.strip().str.lower().isin(["true", "1", "yes"]).to_numpy()
+        else:
+            oneway = np.zeros(len(edges), dtype=bool)
+        return cls.from_edges(
+            nodes[lat_col].to_numpy(dtype=float), nodes[lon_col].to_numpy(dtype=float),
+            u, v, km, oneway, signature=_file_signature([nodes_csv, edges_csv]),
+        )
+
+    @classmethod
+    def from_osm_pbf(cls, pbf_path: str) -> "RoadGraph":
+        """Extrai a malha trafegável de um recorte .osm.pbf (requer o pacote opcional `osmium`)."""
+        try:
+            import osmium
+        except ImportError as exc:
+            raise ImportError("Leitura de .osm.pbf requer o pacote 'osmium' (pip install osmium).") from exc
+
+        way_nodes: List[np.ndarray] = []
+        way_oneway: List[int] = []
+
+        class _WayHandler(osmium.SimpleHandler):
+            def way(self, w):
+                hw = w.tags.get("highway")
+                if hw not in HIGHWAYS_TRAFEGAVEIS or len(w.nodes) < 2:
+                    return
+                refs = np.fromiter((nd.ref for nd in w.nodes), dtype=np.int64, count=len(w.nodes))
+                ow = w.tags.get("oneway", "no")
+                if ow == "-1":
+                    refs = refs[::-1]
+                way_nodes.append(refs)
+                way_oneway.append(1 if ow in ("yes", "1", "true", "-1") or hw.startswith("motorway") else 0)
+
+        _WayHandler().apply_file(pbf_path)
+        if not way_nodes:
+            raise ValueError(f"Nenhuma via trafegável encontrada em {pbf_path}")
+
+        wanted = np.unique(np.concatenate(way_nodes))
+        node_lat = np.full(len(wanted), np.nan)
+        node_lon = np.full(len(wanted), np.nan)
+
+        class _NodeHandler(osmium.SimpleHandler):
+            def node(self, n):
+                pos = np.searchsorted(wanted, n.id)
+                if pos < len(wanted) and wanted[pos] == n.id:
+                    node_lat[pos] = n.location.lat
+                    node_lon[pos] = n.location.lon
+
+        _NodeHandler().apply_file(pbf_path)
+
+        seg_u = np.concatenate([np.searchsorted(wanted, refs[:-1]) for refs in way_nodes])
+        seg_v = np.concatenate([np.searchsorted(wanted, refs[1:]) for refs in way_nodes])
+        seg_ow = np.concatenate([np.full(len(refs) - 1, ow, dtype=bool) for refs, ow in zip(way_nodes, way_oneway)])
+        valid = ~(np.isnan(node_lat[seg_u]) | np.isnan(node_lat[seg_v]))
+        seg_u, seg_v, seg_ow = seg_u[valid], seg_v[valid], seg_ow[valid]
+        km = _haversine_km(node_lat[seg_u], node_lon[seg_u], node_lat[seg_v], node_lon[seg_v])
+        return cls.from_edges(node_lat, node_lon, seg_u, seg_v, km, seg_ow, signature=_file_signature([pbf_path]))
+
+    # ------------------------------------------------------------------ cache em disco
+
+    def save(self, directory: str) -> None:
+        """Grava o CSR como .npy soltos, para reabrir com mmap sem reprocessar o extrato."""
+        os.makedirs(directory, exist_ok=True)
+        for nome in ("indptr", "indices", "weights_km", "lat", "lon"):
+            np.save(os.path.join(directory, f"{nome}.npy"), getattr(self, nome))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump({"signature": self.signature, "version": CSR_CACHE_VERSION, "n_nodes": self.n_nodes, "n_edges": self.n_edges}, fh)
+
+    @classmethod
+    def load(cls, directory: str, signature: str | None = None) -> "RoadGraph | None":
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("version") != CSR_CACHE_VERSION or (signature is not None and meta.get("signature") != signature):
+            return None
+        arrays = {nome: np.load(os.path.join(directory, f"{nome}.npy"), mmap_mode="r") for nome in ("indptr", "indices", "weights_km", "lat", "lon")}
+        return cls(signature=meta["signature"], **arrays)
+
+    @classmethod
+    def open(cls, source: str, cache_dir: str) -> "RoadGraph":
+        """
+        Abre o grafo a partir de um .osm.pbf ou de um diretório com nodes.csv/edges.csv,
+        reaproveitando o CSR pré-processado em `cache_dir` quando o arquivo de origem não mudou.
+        """
+        if os.path.isdir(source):
+            inputs = [os.path.join(source, "nodes.csv"), os.path.join(source, "edges.csv")]
+        else:
+            inputs = [source]
+        signature = _file_signature(inputs)
+        target = os.path.join(cache_dir, f"{os.path.basename(os.path.normpath(source))}_{signature}")
+
+        graph = cls.load(target, signature)
+        if graph is not None:
+            return graph
+
+        if os.path.isdir(source):
+            graph = cls.from_csv(*inputs)
+        else:
+            graph = cls.from_osm_pbf(source)
+        try:
+            graph.save(target)
+        except OSError as exc:
+            print("NÃO FOI POSSÍVEL GRAVAR O GRAFO PRÉ-PROCESSADO:", exc)
+        return graph
+
+    # ------------------------------------------------------------------ consultas
+
+    def _build_grid(self) -> None:
+        ci = np.floor(np.asarray(self.lat) / GRID_CELULA_GRAUS).astype(np.int64)
+        cj = np.floor(np.asarray(self.lon) / GRID_CELULA_GRAUS).astype(np.int64)
+        order = np.lexsort((cj, ci))
+        self._grid = (ci[order], cj[order], order)
+
+    def _grid_candidates(self, lat: float, lon: float, raio: int) -> np.ndarray:
+        ci_s, cj_s, order = self._grid
+        i0 = int(np.floor(lat / GRID_CELULA_GRAUS))
+        j0 = int(np.floor(lon / GRID_CELULA_GRAUS))
+        out = []
+        for ci in range(i0 - raio, i0 + raio + 1):
+            lo = np.searchsorted(ci_s, ci, side="left")
+            hi = np.searchsorted(ci_s, ci, side="right")
+            if lo == hi:
+                continue
+            a = lo + np.searchsorted(cj_s[lo:hi], j0 - raio, side="left")
+            b = lo + np.searchsorted(cj_s[lo:hi], j0 + raio, side="right")
+            if a < b:
+                out.append(order[a:b])
+        return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
+
+    def snap(self, coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vértice mais próximo de cada coordenada e a distância (km) até ele."""
+        if self._grid is None:
+            self._build_grid()
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        idx = np.empty(len(coords), dtype=np.int64)
+        gap = np.empty(len(coords))
+        for p, (lat, lon) in enumerate(coords):
+            raio = 1
+            cand = self._grid_candidates(lat, lon, raio)
+            while len(cand) == 0 and raio < 64:
+                raio *= 2
+                cand = self._grid_candidates(lat, lon, raio)
+            if len(cand) == 0:
+                cand = np.arange(self.n_nodes)
+            else:
+                # garante que nenhum vértice fora do anel consultado esteja mais perto
+                cand = self._grid_candidates(lat, lon, raio + 1)
+            d = _haversine_km(lat, lon, np.asarray(self.lat)[cand], np.asarray(self.lon)[cand])
+            best = int(np.argmin(d))
+            idx[p] = cand[best]
+            gap[p] = d[best]
+        return idx, gap
+
+    def shortest_paths_km(self, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """Matriz len(sources) x len(targets) de menores caminhos (km); inf quando não há caminho."""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if _scipy_dijkstra is not None:
+            graph = csr_matrix((np.asarray(self.weights_km), np.asarray(self.indices), np.asarray(self.indptr)), shape=(self.n_nodes, self.n_nodes))
+            uniq, inv = np.unique(sources, return_inverse=True)
+            full = _scipy_dijkstra(graph, directed=True, indices=uniq)
+            return full[inv][:, targets]
+        return np.vstack([self._dijkstra_to_targets(int(s), targets) for s in sources])
+
+    def _dijkstra_to_targets(self, source: int, targets: np.ndarray) -> np.ndarray:
+        # Dijkstra com parada antecipada quando todos os destinos são fixados
+        indptr, indices, weights = self.indptr, self.indices, self.weights_km
+        pendentes = set(int(t) for t in targets)
+        dist: Dict[int, float] = {source: 0.0}
+        done = set()
+        heap = [(0.0, source)]
+        while heap and pendentes:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            pendentes.discard(u)
+            for e in range(int(indptr[u]), int(indptr[u + 1])):
+                v = int(indices[e])
+                nd = d + float(weights[e])
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return np.array([dist.get(int(t), np.inf) if int(t) in done else np.inf for t in targets])
+
+    def distance_matrix_km(self, origens: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+        """
+        Distâncias rodoviárias entre coordenadas (lat, lon): caminho mínimo entre os vértices encaixados
+        mais as pernas de acesso em linha reta até o grafo.
+        """
+        s_idx, s_gap = self.snap(origens)
+        t_idx, t_gap = self.snap(destinos)
+        uniq_t, inv_t = np.unique(t_idx, return_inverse=True)
+        sp = self.shortest_paths_km(s_idx, uniq_t)[:, inv_t]
+        return sp + s_gap[:, None] + t_gap[None, :]
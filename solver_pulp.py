@@ -1,6 +1,14 @@
+import hashlib
+import json
 import math
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Any
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, replace
+from typing import Callable, Dict, List, Set, Tuple, Any, Iterator
 from io import BytesIO
 
 import numpy as np
@@ -16,6 +24,123 @@ PESSOAS_ITEM = "Pessoas"
 SLOTS_POR_PESSOA = 7.0
 MAX_PESSOAS_SIMULTANEAS = 3
 
+# Matriz de distâncias
+FATOR_DESVIO_ROTA = 1.5          # distância geodésica -> distância rodoviária estimada
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+VINCENTY_MAX_ITER = 200
+VALIDAR_DISTANCIAS = False       # compara a matriz vetorizada com geopy.geodesic (lento)
+TOLERANCIA_VALIDACAO_DISTANCIA = 1e-6
+
+# Cache persistente de distâncias (SQLite)
+USAR_CACHE_DISTANCIAS = True
+DISTANCE_CACHE_PATH = os.environ.get(
+    "DISTANCE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "distancias.sqlite"),
+)
+DISTANCE_CACHE_MAX_ENTRIES = 2_000_000
+DISTANCE_CACHE_DECIMALS = 5      # ~1 m de resolução nas coordenadas arredondadas
+
+# Cache persistente de resultados do solver (SQLite; resultado completo em pickle comprimido)
+USAR_CACHE_RESULTADOS = True
+RESULT_CACHE_PATH = os.environ.get(
+    "RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(DISTANCE_CACHE_PATH), "resultados.sqlite"),
+)
+RESULT_CACHE_MAX_ENTRIES = 200
+VERSAO_CACHE_RESULTADOS = 1      # incrementar quando uma mudança no modelo alterar o resultado das mesmas entradas
+
+# Malha viária offline: .osm.pbf ou diretório com nodes.csv/edges.csv (None = geodésica x FATOR_DESVIO_ROTA)
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH") or None
+ROAD_GRAPH_CACHE_DIR = os.path.join(os.path.dirname(DISTANCE_CACHE_PATH), "grafos")
+
+PENALIDADE_ATRASO = 1334.72      # custo por hora de atraso
+LIMITE_LONGOS_CAMINHONETE = 4    # itens longos simultâneos em caminhonetes/pickups
+CATEGORIAS_LIMITE_LONGOS = ("CAMINHONETE", "PICKUP")
+
+# Motivos de término do MIP informados em `motivo_parada`
+MOTIVOS_PARADA = (
+    "otimo",          # gap zero
+    "gap_rel",        # gap_rel do HiGHS atingido
+    "gap_pct",        # parar_gap_pct
+    "gap_abs",        # parar_gap_abs
+    "objetivo_alvo",  # parar_objetivo
+    "sem_melhora",    # parar_sem_melhora_s
+    "tempo_limite",   # orçamento de tempo esgotado
+    "inviavel",
+    "interrompido",   # outra interrupção (cancelamento, limite do HiGHS)
+)
+
+
+@dataclass
+class OpcoesSolver:
+    # "mip" (modelo exato no HiGHS), "rapido" (heurística Clarke-Wright + busca local, em segundos)
+    # ou "alns" (plano rápido melhorado por busca adaptativa em grande vizinhança até alns_tempo_s)
+    # ou "decomposicao" (clusters de tarefas com parte da frota, um MIP por cluster em processos paralelos)
+    # ou "colunas" (cobertura sobre escalas de veículo por geração de colunas; sempre usa o highspy)
+    modo: str = "mip"
+    alns_tempo_s: float = 60.0
+    seed: int = 0
+    # Decomposição: número de clusters (None = um a cada tarefas_por_cluster tarefas), agrupamento
+    # "geografico" (varredura angular em torno do CD) ou "prazo" (urgência, depois ângulo) e processos
+    # simultâneos (None = núcleos da máquina)
+    n_clusters: int | None = None
+    tarefas_por_cluster: int = 8
+    criterio_cluster: str = "geografico"
+    processos: int | None = None
+    # Vizinhança granular: k sucessores mais próximos por nó (None = todos os arcos admissíveis)
+    granular_k: int | None = None
+    # "pulp" (referência) ou "highspy" (arrays passados direto ao HiGHS, sem objetos do PuLP)
+    backend: str = "pulp"
+    # Nomes de variáveis/restrições no modelo (útil para depurar; custa memória em instâncias grandes)
+    nomes: bool = False
+    # Veículos idênticos (mesmo tipo) usados em ordem fixa de placas, limitados ao número de tarefas atendíveis
+    agrupar_veiculos_identicos: bool = True
+    # Quebra de simetria: placas do mesmo tipo ordenadas por número de visitas (exata) e viagens de um
+    # veículo em ordem não decrescente do menor nó atendido (pode excluir ordens de viagem que reduziriam
+    # atraso, mas nunca torna inviável uma instância viável)
+    simetria_veiculos: bool = False
+    simetria_viagens: bool = False
+    # Plano da heurística de inserção passado ao HiGHS como solução inicial do MIP
+    warm_start: bool = True
+    time_limit_s: float = 1800.0
+    gap_rel: float = 0.0005
+    # Threads do HiGHS (0 = automático)
+    threads: int = 0
+    # Portfólio: N > 1 corridas do HiGHS com configurações diferentes em processos paralelos, sobre o mesmo
+    # modelo (sempre via highspy), compartilhando incumbente e limite; todas param no gap alvo
+    portfolio: int = 0
+    # Chamada a cada ~1 s durante o MIP com {"tempo_s", "objetivo", "limite", "gap_pct"} (execuções em segundo plano)
+    progresso: Callable[[Dict[str, Any]], None] | None = field(default=None, repr=False, compare=False)
+    # Chamada a cada novo incumbente do MIP com o ponto {"tempo_s", "objetivo", "limite", "gap_pct", "nos"}
+    # e o plano decodificado (mesmo formato de `plano` na solução)
+    ao_incumbente: Callable[[Dict[str, Any], Dict[str, Any]], None] | None = field(default=None, repr=False, compare=False)
+    # Regras de parada além de time_limit_s/gap_rel: gap abaixo de parar_gap_pct (%) ou de parar_gap_abs (R$),
+    # incumbente com custo até parar_objetivo ("bom o bastante") ou nenhum incumbente melhor há
+    # parar_sem_melhora_s segundos (contados a partir do primeiro incumbente)
+    parar_gap_pct: float | None = None
+    parar_gap_abs: float | None = None
+    parar_objetivo: float | None = None
+    parar_sem_melhora_s: float | None = None
+    # Orçamento proporcional à instância: min(time_limit_s, tempo_base_s + tempo_por_no_s x nós de serviço)
+    tempo_por_no_s: float | None = None
+    tempo_base_s: float = 60.0
+    # Reaproveita o resultado de uma execução anterior com as mesmas entradas e opções (cache em disco)
+    usar_cache: bool = True
+    # Horizonte de viagens dinâmico: começa no limite inferior de viagens por veículo e acrescenta
+    # viagens enquanto o modelo for inviável ou houver atraso em veículos que usam todas (teto: r_max)
+    horizonte_dinamico: bool = False
+    # Big-M por arco e por veículo (limites reais de carga, itens longos, pessoas e horários) em vez
+    # das constantes globais Mtime/Mload
+    big_m_por_arco: bool = True
+    # Carga ao longo da viagem: "big_m" (carga por nó, balanço em pares de inequações por arco) ou
+    # "fluxo" (fluxo de carga nos arcos limitado por capacidade x arco e conservado em cada nó)
+    formulacao_carga: str = "big_m"
+    # Entregas no mesmo Local e com o mesmo prazo viram um só nó de visita no MIP (quantidade, tempo de
+    # serviço e atraso por item preservados; a visita não se repete na mesma viagem); menos nós e arcos
+    agrupar_locais: bool = False
+    msg: bool = True
+
 
 @dataclass
 class ServiceNode:
@@ -37,17 +162,402 @@ class ServiceNode:
     original_index: int | None = None
 
 
-def _distance_time_matrices(coords: List[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+@contextmanager
+def _sqlite(path: str) -> Iterator[sqlite3.Connection]:
+    # Uma conexão por operação: o Streamlit executa o script em threads diferentes
+    con = sqlite3.connect(path, timeout=30)
+    try:
+        with con:
+            yield con
+    finally:
+        con.close()
+
+
+class DistanceCache:
+    """
+    Cache persistente de distâncias em SQLite, chaveado por pares de coordenadas arredondadas.
+    Mantém no máximo `max_entries` pares, descartando os usados há mais tempo (LRU).
+    """
+
+    def __init__(self, path: str = DISTANCE_CACHE_PATH, max_entries: int = DISTANCE_CACHE_MAX_ENTRIES, decimals: int = DISTANCE_CACHE_DECIMALS):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.scale = 10 ** int(decimals)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS distancias ("
+                " provider TEXT NOT NULL, lat1 INTEGER NOT NULL, lon1 INTEGER NOT NULL,"
+                " lat2 INTEGER NOT NULL, lon2 INTEGER NOT NULL, km REAL NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (provider, lat1, lon1, lat2, lon2))"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_distancias_lru ON distancias (last_used)")
+
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        return _sqlite(self.path)
+
+    def _keys(self, pares: List[Tuple[Tuple[float, float], Tuple[float, float]]], simetrico: bool) -> List[Tuple[int, int, int, int]]:
+        keys = []
+        for a, b in pares:
+            ka = (int(round(a[0] * self.scale)), int(round(a[1] * self.scale)))
+            kb = (int(round(b[0] * self.scale)), int(round(b[1] * self.scale)))
+            if simetrico and kb < ka:
+                ka, kb = kb, ka
+            keys.append(ka + kb)
+        return keys
+
+    def get_many(self, provider: str, pares: List[Tuple[Tuple[float, float], Tuple[float, float]]], simetrico: bool = True) -> np.ndarray:
+        """Retorna as distâncias conhecidas (km) na ordem de `pares`; NaN onde não há registro."""
+        out = np.full(len(pares), np.nan)
+        if not pares:
+            return out
+        keys = self._keys(pares, simetrico)
+        with self._connect() as con:
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS req (pos INTEGER, lat1 INTEGER, lon1 INTEGER, lat2 INTEGER, lon2 INTEGER)")
+            con.execute("DELETE FROM req")
+            con.executemany("INSERT INTO req VALUES (?, ?, ?, ?, ?)", [(pos,) + key for pos, key in enumerate(keys)])
+            rows = con.execute(
+                "SELECT req.pos, d.km FROM req JOIN distancias d"
+                " ON d.provider = ? AND d.lat1 = req.lat1 AND d.lon1 = req.lon1 AND d.lat2 = req.lat2 AND d.lon2 = req.lon2",
+                (provider,),
+            ).fetchall()
+            if rows:
+                con.execute(
+                    "UPDATE distancias SET last_used = ? WHERE provider = ? AND (lat1, lon1, lat2, lon2) IN"
+                    " (SELECT lat1, lon1, lat2, lon2 FROM req)",
+                    (time.time(), provider),
+                )
+            con.execute("DROP TABLE req")
+        for pos, km in rows:
+            out[pos] = km
+        n_hits = int(np.count_nonzero(~np.isnan(out)))
+        self.hits += n_hits
+        self.misses += len(pares) - n_hits
+        return out
+
+    def put_many(self, provider: str, pares: List[Tuple[Tuple[float, float], Tuple[float, float]]], km: np.ndarray, simetrico: bool = True) -> None:
+        if not pares:
+            return
+        keys = self._keys(pares, simetrico)
+        agora = time.time()
+        with self._connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO distancias VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(provider,) + key + (float(d), agora) for key, d in zip(keys, km)],
+            )
+            excesso = con.execute("SELECT COUNT(*) FROM distancias").fetchone()[0] - self.max_entries
+            if excesso > 0:
+                con.execute(
+                    "DELETE FROM distancias WHERE rowid IN (SELECT rowid FROM distancias ORDER BY last_used LIMIT ?)",
+                    (excesso,),
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total) if total else None}
+
+
+_distance_cache: DistanceCache | None = None
+
+
+def _get_distance_cache() -> DistanceCache | None:
+    global _distance_cache
+    if not USAR_CACHE_DISTANCIAS:
+        return None
+    if _distance_cache is None or _distance_cache.path != DISTANCE_CACHE_PATH:
+        try:
+            _distance_cache = DistanceCache(DISTANCE_CACHE_PATH)
+        except (OSError, sqlite3.Error) as exc:
+            # Sistema de arquivos somente leitura (ex.: nuvem): segue sem cache
+            print("CACHE DE DISTÂNCIAS INDISPONÍVEL:", exc)
+            return None
+    return _distance_cache
+
+
+class ResultCache:
+    """
+    Cache persistente de resultados do solver em SQLite, chaveado pela impressão digital das entradas
+    (`impressao_digital`). Guarda o dicionário de resultado em pickle comprimido e mantém no máximo
+    `max_entries` resultados, descartando os usados há mais tempo (LRU).
+    """
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = int(max_entries)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _sqlite(self.path) as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS resultados ("
+                " chave TEXT PRIMARY KEY, dados BLOB NOT NULL, criado_em REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_resultados_lru ON resultados (last_used)")
+
+    def get(self, chave: str) -> Tuple[Dict[str, Any], float] | None:
+        """Resultado guardado e o instante em que foi salvo; None se a chave não estiver no cache."""
+        with _sqlite(self.path) as con:
+            row = con.execute("SELECT dados, criado_em FROM resultados WHERE chave = ?", (chave,)).fetchone()
+            if row is None:
+                return None
+            con.execute("UPDATE resultados SET last_used = ? WHERE chave = ?", (time.time(), chave))
+        return pickle.loads(zlib.decompress(row[0])), row[1]
+
+    def put(self, chave: str, resultado: Dict[str, Any]) -> None:
+        dados = zlib.compress(pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        agora = time.time()
+        with _sqlite(self.path) as con:
+            con.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?)", (chave, dados, agora, agora))
+            excesso = con.execute("SELECT COUNT(*) FROM resultados").fetchone()[0] - self.max_entries
+            if excesso > 0:
+                con.execute(
+                    "DELETE FROM resultados WHERE chave IN (SELECT chave FROM resultados ORDER BY last_used LIMIT ?)",
+                    (excesso,),
+                )
+
+
+_result_cache: ResultCache | None = None
+
+# Opções que não mudam o resultado (callbacks, saída do log) ou que controlam o próprio cache
+_OPCOES_FORA_DA_CHAVE = {"progresso", "ao_incumbente", "msg", "usar_cache"}
+
+
+def _get_result_cache() -> ResultCache | None:
+    global _result_cache
+    if not USAR_CACHE_RESULTADOS:
+        return None
+    if _result_cache is None or _result_cache.path != RESULT_CACHE_PATH:
+        try:
+            _result_cache = ResultCache(RESULT_CACHE_PATH)
+        except (OSError, sqlite3.Error) as exc:
+            print("CACHE DE RESULTADOS INDISPONÍVEL:", exc)
+            return None
+    return _result_cache
+
+
+def _df_canonico(df: pd.DataFrame) -> str:
+    # colunas em ordem fixa; a ordem das linhas é mantida (define a numeração dos nós)
+    df = df.reset_index(drop=True)
+    df = df[sorted(df.columns, key=str)]
+    return df.to_json(orient="split", double_precision=10, date_format="iso", default_handler=str)
+
+
+def impressao_digital(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    final_destinos_nao_retornam=None,
+    opcoes: OpcoesSolver | None = None,
+) -> str:
+    """Hash SHA-256 canônico das entradas de `executar_solver` (dados, opções e parâmetros do modelo)."""
+    opcoes = opcoes or OpcoesSolver()
+    h = hashlib.sha256()
+    # distâncias pelo nome do provedor (malha viária: assinatura do arquivo, não o caminho)
+    parametros = [
+        VERSAO_CACHE_RESULTADOS, CD_COORDS, VELOCIDADE_MEDIA_KMH, FATOR_DESVIO_ROTA, _get_distance_provider().name,
+        PENALIDADE_ATRASO, LIMITE_LONGOS_CAMINHONETE, SLOTS_POR_PESSOA, MAX_PESSOAS_SIMULTANEAS,
+    ]
+    h.update(json.dumps(parametros, default=str).encode())
+    for df in (df_veiculos_selecionados, df_planejamento, df_itens):
+        h.update(_df_canonico(df).encode())
+    h.update(json.dumps(final_destinos_nao_retornam or {}, sort_keys=True, default=str).encode())
+    valores = {f.name: getattr(opcoes, f.name) for f in fields(opcoes) if f.name not in _OPCOES_FORA_DA_CHAVE}
+    h.update(json.dumps(valores, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def resultado_em_cache(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    final_destinos_nao_retornam=None,
+    opcoes: OpcoesSolver | None = None,
+) -> Dict[str, Any] | None:
+    """Resultado de uma execução anterior com as mesmas entradas, marcado com `cache.hit`; None se não houver."""
+    opcoes = opcoes or OpcoesSolver()
+    cache = _get_result_cache() if opcoes.usar_cache else None
+    if cache is None:
+        return None
+    chave = impressao_digital(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam, opcoes)
+    try:
+        encontrado = cache.get(chave)
+    except (sqlite3.Error, pickle.UnpicklingError, zlib.error, EOFError, AttributeError, ImportError) as exc:
+        # entrada corrompida ou de uma versão incompatível do código: trata como ausência
+        print("CACHE DE RESULTADOS: entrada ilegível:", exc)
+        return None
+    if encontrado is None:
+        return None
+    resultado, criado_em = encontrado
+    print(f"RESULTADO EM CACHE: {chave[:12]} (salvo em {time.strftime('%d/%m/%Y %H:%M', time.localtime(criado_em))})")
+    return {**resultado, "cache": {"hit": True, "chave": chave, "criado_em": criado_em}}
+
+
+def _vincenty_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    # Fórmula inversa de Vincenty no elipsoide WGS-84, vetorizada sobre os pares
+    a = WGS84_A_KM
+    f = WGS84_F
+    b = a * (1.0 - f)
+
+    U1 = np.arctan((1.0 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1.0 - f) * np.tan(np.radians(lat2)))
+    L = np.radians(lon2 - lon1)
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    sin_sigma = cos_sigma = sigma = cos2_alpha = cos_2sigma_m = np.zeros_like(L)
+    for _ in range(VINCENTY_MAX_ITER):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sin_alpha = np.where(sin_sigma > 0, cosU1 * cosU2 * sin_lam / sin_sigma, 0.0)
+            cos2_alpha = 1.0 - sin_alpha ** 2
+            # pares sobre o equador têm cos2_alpha = 0
+            cos_2sigma_m = np.where(cos2_alpha > 0, cos_sigma - 2.0 * sinU1 * sinU2 / cos2_alpha, 0.0)
+        C = f / 16.0 * cos2_alpha * (4.0 + f * (4.0 - 3.0 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1.0 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1.0 + 2.0 * cos_2sigma_m ** 2))
+        )
+        if np.all(np.abs(lam - lam_prev) < 1e-12):
+            break
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1.0 + u2 / 16384.0 * (4096.0 + u2 * (-768.0 + u2 * (320.0 - 175.0 * u2)))
+    B = u2 / 1024.0 * (256.0 + u2 * (-128.0 + u2 * (74.0 - 47.0 * u2)))
+    delta_sigma = B * sin_sigma * (
+        cos_2sigma_m + B / 4.0 * (
+            cos_sigma * (-1.0 + 2.0 * cos_2sigma_m ** 2)
+            - B / 6.0 * cos_2sigma_m * (-3.0 + 4.0 * sin_sigma ** 2) * (-3.0 + 4.0 * cos_2sigma_m ** 2)
+        )
+    )
+    return b * A * (sigma - delta_sigma)
+
+
+class DistanceProvider:
+    """
+    Interface dos provedores de distância usados na montagem das matrizes.
+    `pair_km` recebe arrays (P, 2) de origens e destinos (lat, lon) e devolve P distâncias em km.
+    """
+
+    name = "base"
+    symmetric = True
+
+    def pair_km(self, origens: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class GeodesicProvider(DistanceProvider):
+    """Distância geodésica (Vincenty/WGS-84) multiplicada pelo fator de desvio rodoviário."""
+
+    symmetric = True
+
+    def __init__(self, fator_desvio: float = FATOR_DESVIO_ROTA):
+        self.fator_desvio = float(fator_desvio)
+        self.name = f"vincenty_x{self.fator_desvio:g}"
+
+    def pair_km(self, origens: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+        return _vincenty_km(origens[:, 0], origens[:, 1], destinos[:, 0], destinos[:, 1]) * self.fator_desvio
+
+
+class RoadNetworkProvider(DistanceProvider):
+    """
+    Menor caminho sobre a malha viária de um extrato OSM local (.osm.pbf ou nodes.csv/edges.csv).
+    O grafo é convertido para CSR uma vez e reaproveitado do disco nas execuções seguintes.
+    """
+
+    symmetric = False  # vias de mão única
+
+    def __init__(self, source: str, cache_dir: str = ROAD_GRAPH_CACHE_DIR):
+        from road_network import RoadGraph
+
+        self.graph = RoadGraph.open(source, cache_dir)
+        self.name = f"road_{self.graph.signature}"
+        self._fallback = GeodesicProvider()
+
+    def pair_km(self, origens: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+        # Agrupa os pares em uma única consulta muitos-para-muitos
+        uo, inv_o = np.unique(origens, axis=0, return_inverse=True)
+        ud, inv_d = np.unique(destinos, axis=0, return_inverse=True)
+        km = self.graph.distance_matrix_km(uo, ud)[inv_o.ravel(), inv_d.ravel()]
+        sem_caminho = ~np.isfinite(km)
+        if sem_caminho.any():
+            print(f"MALHA VIÁRIA: {int(sem_caminho.sum())} pares sem caminho; usando distância geodésica com desvio")
+            km[sem_caminho] = self._fallback.pair_km(origens[sem_caminho], destinos[sem_caminho])
+        return km
+
+
+_distance_provider: DistanceProvider | None = None
+
+
+def _get_distance_provider() -> DistanceProvider:
+    global _distance_provider
+    if _distance_provider is None:
+        if ROAD_GRAPH_PATH:
+            _distance_provider = RoadNetworkProvider(ROAD_GRAPH_PATH)
+        else:
+            _distance_provider = GeodesicProvider()
+    return _distance_provider
+
+
+def _distance_time_matrices(
+    coords: List[Tuple[float, float]],
+    validar: bool | None = None,
+    cache: DistanceCache | None = None,
+    provider: DistanceProvider | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    provider = provider or GeodesicProvider()
     n = len(coords)
     dist = np.zeros((n, n))
-    tempo = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            if i == j:
-                continue
-            d_km = geodesic(coords[i], coords[j]).kilometers * 1.5
-            dist[i, j] = d_km
-            tempo[i, j] = d_km / VELOCIDADE_MEDIA_KMH
+    if n > 1:
+        pts = np.asarray(coords, dtype=float)
+        if provider.symmetric:
+            # Matriz simétrica: calcula só o triângulo superior e espelha
+            iu, ju = np.triu_indices(n, k=1)
+        else:
+            iu, ju = np.nonzero(~np.eye(n, dtype=bool))
+
+        if cache is None:
+            d_km = provider.pair_km(pts[iu], pts[ju])
+        else:
+            # Consulta em lote; só os pares ausentes no cache são calculados e gravados
+            pares = [(coords[i], coords[j]) for i, j in zip(iu, ju)]
+            try:
+                d_km = cache.get_many(provider.name, pares, simetrico=provider.symmetric)
+            except sqlite3.Error as exc:
+                print("FALHA NA LEITURA DO CACHE DE DISTÂNCIAS:", exc)
+                d_km = np.full(len(pares), np.nan)
+            faltantes = np.flatnonzero(np.isnan(d_km))
+            if len(faltantes):
+                d_km[faltantes] = provider.pair_km(pts[iu[faltantes]], pts[ju[faltantes]])
+                try:
+                    cache.put_many(provider.name, [pares[p] for p in faltantes], d_km[faltantes], simetrico=provider.symmetric)
+                except sqlite3.Error as exc:
+                    print("FALHA NA GRAVAÇÃO DO CACHE DE DISTÂNCIAS:", exc)
+
+        if VALIDAR_DISTANCIAS if validar is None else validar:
+            ref_geo = np.array([geodesic(coords[i], coords[j]).kilometers for i, j in zip(iu, ju)])
+            if isinstance(provider, GeodesicProvider):
+                ref_km = ref_geo * provider.fator_desvio
+                erro_abs = np.abs(d_km - ref_km)
+                erro_rel = erro_abs / np.maximum(ref_km, 1e-9)
+                print(f"VALIDAÇÃO DISTÂNCIAS: {len(ref_km)} pares, erro máx {erro_abs.max():.6f} km ({100.0 * erro_rel.max():.6f}%)")
+                if erro_rel.max() > TOLERANCIA_VALIDACAO_DISTANCIA:
+                    raise ValueError(
+                        f"Matriz vetorizada diverge do geodesic: erro relativo máximo {erro_rel.max():.2e} "
+                        f"> {TOLERANCIA_VALIDACAO_DISTANCIA:.0e}"
+                    )
+            else:
+                # Para a malha viária, reporta o desvio observado em relação à estimativa geodésica
+                razao = d_km / np.maximum(ref_geo, 1e-9)
+                print(f"VALIDAÇÃO DISTÂNCIAS ({provider.name}): fator viário/geodésico médio {razao.mean():.3f}, mín {razao.min():.3f}, máx {razao.max():.3f}")
+
+        dist[iu, ju] = d_km
+        if provider.symmetric:
+            dist[ju, iu] = d_km
+    tempo = dist / VELOCIDADE_MEDIA_KMH
     return dist, tempo
 
 
@@ -102,6 +612,57 @@ def _compatibility_map(df_veiculos: pd.DataFrame, df_planejamento: pd.DataFrame,
     return compat
 
 
+def _admissible_arcs(
+    svc_nodes: List[ServiceNode],
+    vehicles: List[str],
+    compat: Dict[Tuple[str, str], int],
+    dist_loc: np.ndarray | None = None,
+    node_loc: np.ndarray | None = None,
+    granular_k: int | None = None,
+) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Arcos (i, j) que podem assumir valor 1 para cada veículo, com o CD como nó 0.
+    Remove auto-arcos, arcos de/para nós com item incompatível com o veículo, dropoff -> pickup
+    do mesmo par, CD -> dropoff e pickup -> CD (a coleta precisa preceder a entrega na mesma viagem).
+
+    Com `granular_k`, cada nó mantém só os k sucessores mais próximos (além dos nós no mesmo local,
+    dos arcos do CD e do arco pickup -> dropoff do próprio par).
+    """
+    by_items: Dict[frozenset, List[Tuple[int, int]]] = {}
+    arcs: Dict[str, List[Tuple[int, int]]] = {}
+    for k in vehicles:
+        itens_ok = frozenset(n.item for n in svc_nodes if compat.get((k, n.item), 0) == 1)
+        if itens_ok not in by_items:
+            nodes = [n for n in svc_nodes if n.item in itens_ok]
+            arcs_k = [(0, n.node_id) for n in nodes if n.service_type != "dropoff"]
+            arcs_k += [(n.node_id, 0) for n in nodes if n.service_type != "pickup"]
+
+            vizinhos = None
+            if granular_k is not None and len(nodes) > granular_k + 1:
+                locs = node_loc[[n.node_id for n in nodes]]
+                d = dist_loc[np.ix_(locs, locs)]
+                np.fill_diagonal(d, np.inf)
+                # desempate estável pela ordem dos nós; distância 0 (mesmo local) sempre entra
+                ordem = np.argsort(d, axis=1, kind="stable")[:, :granular_k]
+                vizinhos = np.zeros(d.shape, dtype=bool)
+                np.put_along_axis(vizinhos, ordem, True, axis=1)
+                vizinhos |= d == 0.0
+
+            for a, ni in enumerate(nodes):
+                for b, nj in enumerate(nodes):
+                    if a == b:
+                        continue
+                    if ni.service_type == "dropoff" and nj.service_type == "pickup" and ni.pair_id == nj.pair_id:
+                        continue
+                    par_proprio = ni.service_type == "pickup" and nj.service_type == "dropoff" and ni.pair_id == nj.pair_id
+                    if vizinhos is not None and not vizinhos[a, b] and not par_proprio:
+                        continue
+                    arcs_k.append((ni.node_id, nj.node_id))
+            by_items[itens_ok] = arcs_k
+        arcs[k] = by_items[itens_ok]
+    return arcs
+
+
 def preparar_dados_solver(
     df_veiculos_selecionados: pd.DataFrame,
     df_planejamento: pd.DataFrame,
@@ -293,8 +854,27 @@ def preparar_dados_solver(
                 ))
                 next_id += 1
 
-    coords = [CD_COORDS] + [(n.lat, n.lon) for n in nodes]
-    dist, tempo = _distance_time_matrices(coords)
+    # Matrizes por local distinto (CD + Local/Destino_Coleta); os nós apontam para elas via node_loc
+    location_names = ["CD"]
+    location_coords = [CD_COORDS]
+    loc_index = {"CD": 0}
+    node_loc = np.zeros(len(nodes) + 1, dtype=np.int64)
+    for n in nodes:
+        if n.local not in loc_index:
+            loc_index[n.local] = len(location_names)
+            location_names.append(n.local)
+            location_coords.append((n.lat, n.lon))
+        node_loc[n.node_id] = loc_index[n.local]
+    distance_cache = _get_distance_cache()
+    cache_antes = distance_cache.stats() if distance_cache else None
+    distance_provider = _get_distance_provider()
+    dist_loc, tempo_loc = _distance_time_matrices(location_coords, cache=distance_cache, provider=distance_provider)
+    distance_cache_stats = None
+    if distance_cache:
+        distance_cache_stats = {
+            "hits": distance_cache.hits - cache_antes["hits"],
+            "misses": distance_cache.misses - cache_antes["misses"],
+        }
 
     vehicles = {}
     for _, row in dfv.iterrows():
@@ -307,6 +887,24 @@ def preparar_dados_solver(
             "retorna_cd": int(row["Retorna_CD"]),
         }
 
+    # Tipos de veículo: placas indistinguíveis para o modelo (mesmos parâmetros, dimensões e itens compatíveis)
+    itens_planejados = sorted(dfp["Item"].unique())
+    tipos: Dict[Tuple[Any, ...], List[str]] = {}
+    for _, row in dfv.iterrows():
+        k = row["PLACA"]
+        v = vehicles[k]
+        chave = (
+            v["categoria"], v["cap_slots"], v["custo_km"], v["retorna_cd"],
+            *(float(row[c]) if c in row and pd.notna(row[c]) else None for c in ("Comprimento", "Largura", "Altura")),
+            tuple(item for item in itens_planejados if compat.get((k, item), 0) == 1),
+        )
+        tipos.setdefault(chave, []).append(k)
+    vehicle_types = {}
+    for t, placas in enumerate(tipos.values(), start=1):
+        vehicle_types[f"T{t}"] = sorted(placas, key=str)
+        for k in placas:
+            vehicles[k]["tipo"] = f"T{t}"
+
     total_slots = sum(n.slots_total for n in nodes if n.service_type in ("delivery", "pickup"))
     min_cap = min((v["cap_slots"] for v in vehicles.values()), default=1.0)
     min_cap = max(1.0, float(min_cap))
@@ -321,307 +919,976 @@ def preparar_dados_solver(
         "demand_free": demand_free,
         "stock_by_node": stock_by_node,
         "compat": compat,
-        "dist": dist,
-        "tempo": tempo,
+        "location_names": location_names,
+        "location_coords": location_coords,
+        "node_loc": node_loc,
+        "dist_loc": dist_loc,
+        "tempo_loc": tempo_loc,
+        "distance_provider": distance_provider.name,
+        "distance_cache_stats": distance_cache_stats,
         "r_max": int(r_max),
         "itens_longos": itens_longos,
+        "vehicle_types": vehicle_types,
     }
 
 
-def executar_solver(
-    df_veiculos_selecionados: pd.DataFrame,
-    df_planejamento: pd.DataFrame,
-    df_itens: pd.DataFrame,
-    final_destinos_nao_retornam=None
-) -> Dict[str, Any]:
-    dados = preparar_dados_solver(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam)
+def _agrupar_veiculos(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduz cada tipo de veículo às primeiras placas necessárias: um veículo usado entrega ao menos
+    uma unidade ou atende uma coleta, então não há por que criar mais cópias do tipo do que isso.
+    """
+    svc_nodes: List[ServiceNode] = dados["service_nodes"]
+    n_tarefas = {}
+    for tipo, placas in dados["vehicle_types"].items():
+        k = placas[0]
+        n_tarefas[tipo] = sum(
+            int(round(n.quantity)) if n.service_type == "delivery" else 1
+            for n in svc_nodes
+            if n.service_type != "dropoff" and dados["compat"].get((k, n.item), 0) == 1
+        )
+    tipos = {tipo: placas[:max(1, n_tarefas[tipo])] for tipo, placas in dados["vehicle_types"].items()}
+    mantidas = {k for placas in tipos.values() for k in placas}
+    dados = dict(dados)
+    dados["vehicles"] = {k: v for k, v in dados["vehicles"].items() if k in mantidas}
+    dados["vehicle_types"] = tipos
+    return dados
+
+
+class _MatrixModel:
+    """
+    Modelo MIP montado direto em arrays: cada variável é uma coluna numerada e as restrições
+    são acumuladas em blocos COO, convertidos em CSR por linha no final.
+    """
+
+    def __init__(self, nomes: bool = False):
+        self.nomes = nomes
+        self.n_cols = 0
+        self.n_rows = 0
+        self._col_lb: List[np.ndarray] = []
+        self._col_ub: List[np.ndarray] = []
+        self._col_int: List[np.ndarray] = []
+        self._cost_cols: List[np.ndarray] = []
+        self._cost_vals: List[np.ndarray] = []
+        self._row_lo: List[np.ndarray] = []
+        self._row_hi: List[np.ndarray] = []
+        self._ent_row: List[np.ndarray] = []
+        self._ent_col: List[np.ndarray] = []
+        self._ent_val: List[np.ndarray] = []
+        self.col_names: List[str] = []
+        self.row_names: List[str] = []
+
+    def add_cols(self, n: int, lb: Any = 0.0, ub: Any = np.inf, integer: bool = False, names: List[str] | None = None) -> int:
+        start = self.n_cols
+        self._col_lb.append(np.broadcast_to(np.asarray(lb, dtype=float), (n,)).copy())
+        self._col_ub.append(np.broadcast_to(np.asarray(ub, dtype=float), (n,)).copy())
+        self._col_int.append(np.full(n, integer, dtype=bool))
+        self.n_cols += n
+        if self.nomes:
+            self.col_names.extend(names if names is not None else [f"c{start + p}" for p in range(n)])
+        return start
+
+    def add_cost(self, cols: Any, vals: Any) -> None:
+        cols = np.asarray(cols, dtype=np.int64).ravel()
+        self._cost_cols.append(cols)
+        self._cost_vals.append(np.broadcast_to(np.asarray(vals, dtype=float).ravel(), cols.shape).copy())
+
+    def add_rows(self, cols: Any, vals: Any, lo: Any, hi: Any, names: List[str] | None = None) -> np.ndarray:
+        """Adiciona uma linha por linha de `cols` (linhas x termos); coluna -1 marca termo ausente."""
+        cols = np.asarray(cols, dtype=np.int64)
+        if cols.ndim == 1:
+            cols = cols[:, None]
+        vals = np.broadcast_to(np.asarray(vals, dtype=float), cols.shape)
+        nr = cols.shape[0]
+        rows = self.n_rows + np.arange(nr, dtype=np.int64)
+        mask = (cols >= 0) & (vals != 0)
+        self._ent_row.append(np.broadcast_to(rows[:, None], cols.shape)[mask])
+        self._ent_col.append(cols[mask])
+        self._ent_val.append(vals[mask])
+        self._row_lo.append(np.broadcast_to(np.asarray(lo, dtype=float), (nr,)).copy())
+        self._row_hi.append(np.broadcast_to(np.asarray(hi, dtype=float), (nr,)).copy())
+        self.n_rows += nr
+        if self.nomes:
+            self.row_names.extend(names if names is not None else [f"r{p}" for p in rows])
+        return rows
+
+    def add_terms(self, rows: Any, cols: Any, vals: Any) -> None:
+        """Acrescenta termos a linhas já criadas (ex.: arcos somados no fluxo de entrada/saída dos nós)."""
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        self._ent_row.append(rows)
+        self._ent_col.append(np.asarray(cols, dtype=np.int64).ravel())
+        self._ent_val.append(np.broadcast_to(np.asarray(vals, dtype=float).ravel(), rows.shape).copy())
+
+    def add_row(self, cols: Any, vals: Any, lo: float, hi: float, name: str | None = None) -> int:
+        cols = np.asarray(cols, dtype=np.int64).ravel()
+        vals = np.broadcast_to(np.asarray(vals, dtype=float).ravel(), cols.shape)
+        return int(self.add_rows(cols[None, :], vals[None, :], lo, hi, [name] if name and self.nomes else None)[0])
+
+    def finalize(self) -> Dict[str, Any]:
+        """Arrays prontos para o HiGHS: limites, custos, integralidade e matriz CSR por linha."""
+        def cat(chunks, dtype):
+            return np.concatenate(chunks).astype(dtype, copy=False) if chunks else np.empty(0, dtype=dtype)
+
+        rows = cat(self._ent_row, np.int64)
+        cols = cat(self._ent_col, np.int64)
+        vals = cat(self._ent_val, float)
+        # Soma termos repetidos (mesma linha e coluna) e descarta zeros
+        key = rows * max(self.n_cols, 1) + cols
+        order = np.argsort(key, kind="stable")
+        key, vals = key[order], vals[order]
+        uniq, first = np.unique(key, return_index=True)
+        vals = np.add.reduceat(vals, first) if len(first) else vals
+        keep = vals != 0
+        uniq, vals = uniq[keep], vals[keep]
+        rows = uniq // max(self.n_cols, 1)
+        cols = uniq % max(self.n_cols, 1)
+
+        start = np.zeros(self.n_rows + 1, dtype=np.int64)
+        start[1:] = np.cumsum(np.bincount(rows, minlength=self.n_rows))
+        cost = np.zeros(self.n_cols)
+        if self._cost_cols:
+            np.add.at(cost, cat(self._cost_cols, np.int64), cat(self._cost_vals, float))
+        return {
+            "n_cols": self.n_cols,
+            "n_rows": self.n_rows,
+            "col_cost": cost,
+            "col_lower": cat(self._col_lb, float),
+            "col_upper": cat(self._col_ub, float),
+            "integrality": cat(self._col_int, bool),
+            "row_lower": cat(self._row_lo, float),
+            "row_upper": cat(self._row_hi, float),
+            "a_start": start,
+            "a_index": cols,
+            "a_value": vals,
+            "col_names": self.col_names if self.nomes else None,
+            "row_names": self.row_names if self.nomes else None,
+        }
+
+
+class _VarFamily:
+    """Família de variáveis indexada por (chave, veículo, viagem), com um bloco contíguo de colunas por veículo."""
+
+    def __init__(
+        self,
+        model: _MatrixModel,
+        name: str,
+        keys_by_vehicle: Dict[str, List[Any]],
+        n_trips: int,
+        lb: Any = 0.0,
+        ub: Any = np.inf,
+        integer: bool = False,
+    ):
+        self.name = name
+        self.n_trips = n_trips
+        self.pos: Dict[str, Dict[Any, int]] = {}
+        self.size: Dict[str, int] = {}
+        self.start: Dict[str, int] = {}
+        for k, keys in keys_by_vehicle.items():
+            self.pos[k] = {key: p for p, key in enumerate(keys)}
+            self.size[k] = len(keys)
+            names = None
+            if model.nomes:
+                names = [
+                    "_".join(str(part) for part in (name,) + (key if isinstance(key, tuple) else (key,)) + (k, r + 1) if part is not None)
+                    for r in range(n_trips) for key in keys
+                ]
+            lb_k = lb[k] if isinstance(lb, dict) else lb
+            ub_k = ub[k] if isinstance(ub, dict) else ub
+            self.start[k] = model.add_cols(len(keys) * n_trips, lb_k, ub_k, integer, names)
+
+    def has(self, key: Any, k: str) -> bool:
+        return key in self.pos.get(k, {})
+
+    def col(self, key: Any, k: str, r: int = 0) -> int:
+        """Coluna da variável (key, k, r), com r = índice 0-based da viagem."""
+        return self.start[k] + r * self.size[k] + self.pos[k][key]
+
+    def cols(self, k: str, pos: Any, r: int = 0) -> np.ndarray:
+        return self.start[k] + r * self.size[k] + np.asarray(pos, dtype=np.int64)
+
+    def trips_of(self, key: Any, k: str) -> np.ndarray:
+        return self.start[k] + np.arange(self.n_trips, dtype=np.int64) * self.size[k] + self.pos[k][key]
+
+    def block(self, k: str, r: int) -> np.ndarray:
+        return self.start[k] + r * self.size[k] + np.arange(self.size[k], dtype=np.int64)
+
+
+def _horizonte_modelo(dados: Dict[str, Any]) -> float:
+    """Big-M de tempo do modelo; também é o horizonte máximo de qualquer viagem."""
+    svc_nodes: List[ServiceNode] = dados["service_nodes"]
+    max_deadline = max((n.prazo_horas for n in svc_nodes), default=168.0)
+    max_service_time = max((n.service_time_h for n in svc_nodes), default=2.0)
+    return max_deadline + float(np.max(dados["tempo_loc"])) + max_service_time + 10.0
+
+
+def _dimensoes_carga(
+    dados: Dict[str, Any], nodes_k: Dict[str, List[int]], long_cap: Dict[str, float]
+) -> Tuple[Set[str], Set[str]]:
+    """
+    Veículos que precisam acompanhar itens longos e pessoas a bordo: só aqueles em que o total que
+    podem receber ultrapassa o limite (sem itens longos ou pessoas na instância, nenhum).
+    """
+    node_by_id = {n.node_id: n for n in dados["service_nodes"]}
+    com_longos, com_pessoas = set(), set()
+    for k, nos in nodes_k.items():
+        nds = [node_by_id[n] for n in nos if node_by_id[n].service_type != "dropoff"]
+        if sum(nd.quantity for nd in nds if nd.is_long) > long_cap[k]:
+            com_longos.add(k)
+        if sum(nd.quantity for nd in nds if nd.service_type == "pickup" and str(nd.item).strip().upper() == PESSOAS_ITEM.upper()) > MAX_PESSOAS_SIMULTANEAS:
+            com_pessoas.add(k)
+    return com_longos, com_pessoas
+
+
+def _visitas_por_local(dados: Dict[str, Any]) -> Dict[int, List[int]]:
+    """
+    Entregas no mesmo Local e com o mesmo prazo agrupadas numa visita (chave: menor id do grupo); só grupos
+    com 2+ itens. Os itens vêm em ordem de atendimento: menor tempo de serviço primeiro, que minimiza o
+    atraso somado com prazo comum.
+    """
+    grupos: Dict[Tuple[str, float], List[ServiceNode]] = {}
+    for n in dados["service_nodes"]:
+        if n.service_type == "delivery":
+            grupos.setdefault((n.local, n.prazo_horas), []).append(n)
+    return {
+        min(n.node_id for n in nds): [n.node_id for n in sorted(nds, key=lambda n: (n.service_time_h, n.node_id))]
+        for nds in grupos.values() if len(nds) > 1
+    }
+
 
+def _build_arc_model(dados: Dict[str, Any], arcs: Dict[str, List[Tuple[int, int]]], opcoes: OpcoesSolver) -> Tuple[_MatrixModel, Dict[str, Any]]:
+    """
+    Monta a formulação Hybrid_VRP_PD_ArcBalance sobre o conjunto esparso de arcos, independente do
+    backend. Retorna o modelo matricial e a estrutura (famílias de variáveis e índices) usada na extração.
+    """
     vehicles = list(dados["vehicles"].keys())
     trips = list(range(1, dados["r_max"] + 1))
+    R = len(trips)
     svc_nodes: List[ServiceNode] = dados["service_nodes"]
     node_ids = [n.node_id for n in svc_nodes]
     node_by_id = {n.node_id: n for n in svc_nodes}
     delivery_ids = [n.node_id for n in svc_nodes if n.service_type == "delivery"]
-    pickup_ids = [n.node_id for n in svc_nodes if n.service_type == "pickup"]
-    dropoff_ids = [n.node_id for n in svc_nodes if n.service_type == "dropoff"]
-    all_nodes_with_depot = [0] + node_ids
-    dist = dados["dist"]
-    tempo = dados["tempo"]
-    itens_longos = dados.get("itens_longos", [])
-
-    if not vehicles or not node_ids:
-        return {"status": "Infeasible", "mensagem": "Sem veículos ou sem tarefas para otimizar."}
+    loc = dados["node_loc"]
+    dist = dados["dist_loc"]
+    tempo = dados["tempo_loc"]
+    compat = dados["compat"]
 
     pairs = {p["pair_id"]: p for p in dados["paired_requests"]}
     pair_pick = {n.pair_id: n.node_id for n in svc_nodes if n.service_type == "pickup" and n.pair_id}
     pair_drop = {n.pair_id: n.node_id for n in svc_nodes if n.service_type == "dropoff" and n.pair_id}
 
-    prob = pulp.LpProblem("Hybrid_VRP_PD_ArcBalance", pulp.LpMinimize)
+    nodes_k = {k: [n for n in node_ids if compat.get((k, node_by_id[n].item), 0) == 1] for k in vehicles}
+    deliv_k = {k: [n for n in nodes_k[k] if node_by_id[n].service_type == "delivery"] for k in vehicles}
+    # nós de cada veículo com item próprio (antes do agrupamento em visitas)
+    itens_k = {k: list(nodes_k[k]) for k in vehicles}
+
+    # Visitas: entregas agrupadas num nó de roteamento (id = menor id do grupo); q_deliv continua por item
+    membros = _visitas_por_local(dados) if opcoes.agrupar_locais else {}
+    visita_de = {n: v for v, ids in membros.items() for n in ids}
+    if membros:
+        node_ids = [n for n in node_ids if visita_de.get(n, n) == n]
+        nodes_k = {k: [n for n in node_ids if any(compat.get((k, node_by_id[i].item), 0) == 1 for i in membros.get(n, [n]))] for k in vehicles}
+        arcs = {
+            k: list(dict.fromkeys(
+                (visita_de.get(i, i), visita_de.get(j, j)) for i, j in arcs[k] if visita_de.get(i, i) != visita_de.get(j, j)
+            ))
+            for k in vehicles
+        }
+    pairs_k = {k: [pid for pid, pinfo in pairs.items() if compat.get((k, pinfo["item"]), 0) == 1] for k in vehicles}
+    succ = {k: {i: [] for i in [0] + node_ids} for k in vehicles}
+    pred = {k: {i: [] for i in [0] + node_ids} for k in vehicles}
+    for k in vehicles:
+        for i, j in arcs[k]:
+            succ[k][i].append(j)
+            pred[k][j].append(i)
+
+    m = _MatrixModel(nomes=opcoes.nomes)
+    only = {k: [None] for k in vehicles}
+    cap = {k: dados["vehicles"][k]["cap_slots"] for k in vehicles}
+    long_cap = {
+        k: (LIMITE_LONGOS_CAMINHONETE if dados["vehicles"][k]["categoria"] in CATEGORIAS_LIMITE_LONGOS else np.inf)
+        for k in vehicles
+    }
+    people_cap = {k: float(MAX_PESSOAS_SIMULTANEAS) for k in vehicles}
+    com_longos, com_pessoas = _dimensoes_carga(dados, itens_k, long_cap)
 
     # Roteamento e ativação
-    x = pulp.LpVariable.dicts("x", (all_nodes_with_depot, all_nodes_with_depot, vehicles, trips), 0, 1, cat="Binary")
-    y = pulp.LpVariable.dicts("y", (node_ids, vehicles, trips), 0, 1, cat="Binary")
-    u = pulp.LpVariable.dicts("u", vehicles, 0, 1, cat="Binary")
-    trip_used = pulp.LpVariable.dicts("trip_used", (vehicles, trips), 0, 1, cat="Binary")
+    x = _VarFamily(m, "x", arcs, R, 0, 1, integer=True)
+    y = _VarFamily(m, "y", nodes_k, R, 0, 1, integer=True)
+    u = _VarFamily(m, "u", only, 1, 0, 1, integer=True)
+    trip_used = _VarFamily(m, "trip_used", only, R, 0, 1, integer=True)
 
     # Quantidade entregue nas deliveries (fracionável por viagem, inteira)
-    q_deliv = pulp.LpVariable.dicts("q_deliv", (delivery_ids, vehicles, trips), lowBound=0, cat="Integer")
+    q_deliv = _VarFamily(m, "q_deliv", deliv_k, R, 0, np.inf, integer=True)
 
     # Coletas pareadas ainda atribuídas integralmente
-    pair_assign = pulp.LpVariable.dicts("pair_assign", (list(pairs.keys()), vehicles, trips), 0, 1, cat="Binary")
+    pair_assign = _VarFamily(m, "pair_assign", pairs_k, R, 0, 1, integer=True)
 
     # Tempo
-    T = pulp.LpVariable.dicts("T", (node_ids, vehicles, trips), lowBound=0)
-    late = pulp.LpVariable.dicts("late", (node_ids, vehicles, trips), lowBound=0)
-    trip_start = pulp.LpVariable.dicts("trip_start", (vehicles, trips), lowBound=0)
-    trip_end = pulp.LpVariable.dicts("trip_end", (vehicles, trips), lowBound=0)
-
-    # Carga total em slots
-    load0 = pulp.LpVariable.dicts("load0", (vehicles, trips), lowBound=0)
-    load = pulp.LpVariable.dicts("load", (node_ids, vehicles, trips), lowBound=0)
-
-    # Carga simultânea de itens longos (em unidades)
-    long_load0 = pulp.LpVariable.dicts("long_load0", (vehicles, trips), lowBound=0)
-    long_load = pulp.LpVariable.dicts("long_load", (node_ids, vehicles, trips), lowBound=0)
-
-    # Carga simultânea de pessoas (em unidades)
-    people_load0 = pulp.LpVariable.dicts("people_load0", (vehicles, trips), lowBound=0)
-    people_load = pulp.LpVariable.dicts("people_load", (node_ids, vehicles, trips), lowBound=0)
-
-    # Objetivo
-    prob += (
-        #pulp.lpSum(dados["vehicles"][k]["custo_fixo"] * u[k] for k in vehicles)
-        0
-        + pulp.lpSum(
-            dados["vehicles"][k]["custo_km"] * dist[i][j] * x[i][j][k][r]
-            for i in all_nodes_with_depot
-            for j in all_nodes_with_depot
-            if i != j
-            for k in vehicles
-            for r in trips
-        )
-        + pulp.lpSum(1334.72 * late[n][k][r] for n in node_ids for k in vehicles for r in trips)
-    )
-
-    # Sem auto-arco
-    for i in all_nodes_with_depot:
-        for k in vehicles:
-            for r in trips:
-                prob += x[i][i][k][r] == 0
+    T = _VarFamily(m, "T", nodes_k, R)
+    late = _VarFamily(m, "late", nodes_k, R)
+    # Visitas agrupadas: atraso por item entregue, ligado ao horário da visita (atende = item entregue na viagem)
+    membros_k = {k: [n for n in deliv_k[k] if n in visita_de] for k in vehicles}
+    atende = _VarFamily(m, "atende", membros_k, R, 0, 1, integer=True)
+    late_item = _VarFamily(m, "late_item", membros_k, R)
+    trip_start = _VarFamily(m, "trip_start", only, R)
+    trip_end = _VarFamily(m, "trip_end", only, R)
+
+    # Cargas: slots, itens longos e pessoas (limites de capacidade como limites das variáveis)
+    load0 = _VarFamily(m, "load0", only, R, 0, cap)
+    load = _VarFamily(m, "load", nodes_k, R, 0, cap)
+    # longos e pessoas só nos veículos em que o limite pode ser atingido
+    long_load0 = _VarFamily(m, "long_load0", {k: [None] for k in com_longos}, R, 0, long_cap)
+    long_load = _VarFamily(m, "long_load", {k: nodes_k[k] for k in com_longos}, R, 0, long_cap)
+    people_load0 = _VarFamily(m, "people_load0", {k: [None] for k in com_pessoas}, R, 0, 0)
+    people_load = _VarFamily(m, "people_load", {k: nodes_k[k] for k in com_pessoas}, R, 0, people_cap)
+    if opcoes.formulacao_carga not in ("big_m", "fluxo"):
+        raise ValueError(f"Formulação de carga desconhecida: {opcoes.formulacao_carga!r} (use 'big_m' ou 'fluxo')")
+    fluxo = opcoes.formulacao_carga == "fluxo"
+    if fluxo:
+        # carga a bordo ao percorrer cada arco
+        f_load = _VarFamily(m, "f_load", arcs, R, 0, cap)
+        f_long = _VarFamily(m, "f_long", {k: arcs[k] for k in com_longos}, R, 0, long_cap)
+        f_people = _VarFamily(m, "f_people", {k: arcs[k] for k in com_pessoas}, R, 0, people_cap)
+        fluxos = {"Load": f_load, "LongLoad": f_long, "PeopleLoad": f_people}
+
+    Mtime = _horizonte_modelo(dados)
+    Mload = max(v["cap_slots"] for v in dados["vehicles"].values()) + sum(n.slots_total for n in svc_nodes)
 
-    # Compatibilidade e atendimento das deliveries
+    # Atendimento das deliveries (compatibilidade já implícita nos índices)
     for n in delivery_ids:
-        nd = node_by_id[n]
-        qty_n = int(round(nd.quantity))
-
-        # atender integralmente a demanda do nó ao longo de veículos/viagens
-        prob += pulp.lpSum(q_deliv[n][k][r] for k in vehicles for r in trips) == qty_n, f"Demanda_{n}"
-
-        for k in vehicles:
-            comp = dados["compat"].get((k, nd.item), 0)
-            for r in trips:
-                prob += q_deliv[n][k][r] <= qty_n * y[n][k][r], f"QDelivVisitUB_{n}_{k}_{r}"
-                prob += q_deliv[n][k][r] >= y[n][k][r], f"QDelivVisitLB_{n}_{k}_{r}"
-                prob += y[n][k][r] <= comp, f"CompatDeliv_{n}_{k}_{r}"
+        qty_n = int(round(node_by_id[n].quantity))
+        cols_n = np.concatenate([q_deliv.trips_of(n, k) for k in vehicles if q_deliv.has(n, k)])
+        m.add_row(cols_n, 1.0, qty_n, qty_n, f"Demanda_{n}")
 
     # Coletas pareadas
-    for pid, pinfo in pairs.items():
-        prob += pulp.lpSum(pair_assign[pid][k][r] for k in vehicles for r in trips) == 1, f"PairOnce_{pid}"
-        for k in vehicles:
-            comp = dados["compat"].get((k, pinfo["item"]), 0)
-            for r in trips:
-                prob += pair_assign[pid][k][r] <= comp, f"CompatPair_{pid}_{k}_{r}"
-                prob += y[pair_pick[pid]][k][r] == pair_assign[pid][k][r], f"PairPick_{pid}_{k}_{r}"
-                prob += y[pair_drop[pid]][k][r] == pair_assign[pid][k][r], f"PairDrop_{pid}_{k}_{r}"
-
-    # Ativação veículo/viagem e fluxo
-    for k in vehicles:
-        total_assign_k = (
-            pulp.lpSum(y[n][k][r] for n in node_ids for r in trips)
-        )
-
-        prob += total_assign_k >= u[k], f"VehActLB_{k}"
-        prob += total_assign_k <= len(node_ids) * len(trips) * u[k], f"VehActUB_{k}"
-
-        if trips:
-            prob += trip_used[k][trips[0]] == u[k], f"FirstTripVeh_{k}"
-
-        if len(trips) > 1:
-            for idx_r in range(len(trips) - 1):
-                r = trips[idx_r]
-                r_next = trips[idx_r + 1]
-                prob += trip_used[k][r_next] <= trip_used[k][r], f"TripSeq_{k}_{r}_{r_next}"
-
-        for r in trips:
-            total_assign_trip = pulp.lpSum(y[n][k][r] for n in node_ids)
-            prob += total_assign_trip >= trip_used[k][r], f"TripActLB_{k}_{r}"
-            prob += total_assign_trip <= len(node_ids) * trip_used[k][r], f"TripActUB_{k}_{r}"
-
-            prob += pulp.lpSum(x[0][j][k][r] for j in node_ids) == trip_used[k][r], f"StartTrip_{k}_{r}"
-            prob += pulp.lpSum(x[i][0][k][r] for i in node_ids) == trip_used[k][r], f"EndTrip_{k}_{r}"
-
-            for n in node_ids:
-                prob += pulp.lpSum(x[i][n][k][r] for i in all_nodes_with_depot if i != n) == y[n][k][r], f"InFlow_{n}_{k}_{r}"
-                prob += pulp.lpSum(x[n][j][k][r] for j in all_nodes_with_depot if j != n) == y[n][k][r], f"OutFlow_{n}_{k}_{r}"
-
-    # Tempo
-    max_deadline = max((n.prazo_horas for n in svc_nodes), default=168.0)
-    max_service_time = max((n.service_time_h for n in svc_nodes), default=2.0)
-    Mtime = max_deadline + float(np.max(tempo)) + max_service_time + 10.0
+    for pid in pairs:
+        cols_p = np.concatenate([pair_assign.trips_of(pid, k) for k in vehicles if pair_assign.has(pid, k)])
+        m.add_row(cols_p, 1.0, 1.0, 1.0, f"PairOnce_{pid}")
+
+    # Placas do mesmo tipo entram em uso na ordem: u[k_(i+1)] <= u[k_i]
+    if opcoes.agrupar_veiculos_identicos:
+        for tipo, placas in dados.get("vehicle_types", {}).items():
+            placas = [k for k in placas if k in u.pos]
+            for k_ant, k_prox in zip(placas, placas[1:]):
+                m.add_row([u.col(None, k_prox), u.col(None, k_ant)], [1.0, -1.0], -np.inf, 0.0, f"OrderedUse_{tipo}_{k_prox}")
+
+    # Placas do mesmo tipo em ordem não crescente de visitas
+    if opcoes.simetria_veiculos:
+        for tipo, placas in dados.get("vehicle_types", {}).items():
+            placas = [k for k in placas if k in y.pos]
+            for k_ant, k_prox in zip(placas, placas[1:]):
+                y_ant = np.concatenate([y.block(k_ant, r) for r in range(R)])
+                y_prox = np.concatenate([y.block(k_prox, r) for r in range(R)])
+                m.add_row(
+                    np.concatenate([y_ant, y_prox]), np.concatenate([np.ones(len(y_ant)), -np.ones(len(y_prox))]),
+                    0.0, np.inf, f"LexVisitas_{tipo}_{k_prox}",
+                )
 
     for k in vehicles:
-        for r in trips:
-            prob += trip_start[k][r] <= Mtime * trip_used[k][r], f"TripStartAct_{k}_{r}"
-            prob += trip_end[k][r] <= Mtime * trip_used[k][r], f"TripEndAct_{k}_{r}"
-            prob += trip_end[k][r] >= trip_start[k][r], f"TripOrder_{k}_{r}"
-
-        if trips:
-            prob += trip_start[k][trips[0]] == 0, f"FirstTripZero_{k}"
-
-        for idx_r in range(len(trips) - 1):
-            r = trips[idx_r]
-            r_next = trips[idx_r + 1]
-            prob += trip_start[k][r_next] >= trip_end[k][r] - Mtime * (2 - trip_used[k][r] - trip_used[k][r_next]), f"TripChain_{k}_{r}_{r_next}"
-
-        for r in trips:
-            for j in node_ids:
-                prob += T[j][k][r] >= trip_start[k][r] + tempo[0][j] - Mtime * (1 - x[0][j][k][r]), f"FirstNodeTime_{j}_{k}_{r}"
-
-            for i in node_ids:
-                ni = node_by_id[i]
-                for j in node_ids:
-                    if i == j:
-                        continue
-                    travel_ij = tempo[i][j]
-                    if node_by_id[i].local == node_by_id[j].local:
-                        travel_ij = 0.0
-                    prob += T[j][k][r] >= T[i][k][r] + ni.service_time_h + travel_ij - Mtime * (1 - x[i][j][k][r]), f"ArcTime_{i}_{j}_{k}_{r}"
-
-            for i in node_ids:
-                ni = node_by_id[i]
-                prob += trip_end[k][r] >= T[i][k][r] + ni.service_time_h + tempo[i][0] - Mtime * (1 - x[i][0][k][r]), f"ReturnTime_{i}_{k}_{r}"
+        custo_km = dados["vehicles"][k]["custo_km"]
+        nk = len(nodes_k[k])
+        pos_n = y.pos[k]
+        a_i = np.array([i for i, _ in arcs[k]], dtype=np.int64)
+        a_j = np.array([j for _, j in arcs[k]], dtype=np.int64)
+        a_pos = np.arange(len(a_i), dtype=np.int64)
+        inner = (a_i != 0) & (a_j != 0)
+        from_depot = a_i == 0
+        to_depot = a_j == 0
+        pi_in = np.array([pos_n[i] for i in a_i[inner]], dtype=np.int64)
+        pj_in = np.array([pos_n[j] for j in a_j[inner]], dtype=np.int64)
+        pj_dep = np.array([pos_n[j] for j in a_j[from_depot]], dtype=np.int64)
+        pi_dep = np.array([pos_n[i] for i in a_i[to_depot]], dtype=np.int64)
+        arc_cost = custo_km * dist[loc[a_i], loc[a_j]]
+
+        # Dados por nó do veículo (na ordem de nodes_k[k]); numa visita, os itens compatíveis com o veículo
+        nds = [node_by_id[n] for n in nodes_k[k]]
+        deliv_set = set(deliv_k[k])
+        itens_no = [[node_by_id[i] for i in membros[n] if i in deliv_set] if n in membros else [node_by_id[n]] for n in nodes_k[k]]
+        # Serviço: numa visita agrupada é a soma dos itens entregues (atende), um depois do outro;
+        # serv_fixo é a parte constante e serv_min/serv_max limitam a parte variável
+        agrupada = np.array([n in membros for n in nodes_k[k]], dtype=bool)
+        serv_min = np.array([min(it.service_time_h for it in its) for its in itens_no])
+        serv_max = np.array([sum(it.service_time_h for it in its) for its in itens_no])
+        serv_fixo = np.where(agrupada, 0.0, serv_max)
+        prazo = np.array([nd.prazo_horas for nd in nds])
+        node_locs = loc[np.array(nodes_k[k], dtype=np.int64)] if nk else np.empty(0, dtype=np.int64)
+        is_deliv = np.array([nd.service_type == "delivery" for nd in nds], dtype=bool)
+        # Variação de carga do nó, uma coluna por item (delivery usa q_deliv, pickup/dropoff usa pair_assign):
+        # matrizes nós x itens, com dpos = -1 e deltas 0 nas posições sem item
+        w = max((len(its) for its in itens_no), default=1)
+        dpos = np.full((nk, w), -1, dtype=np.int64)
+        d_slots, d_long, d_people, d_max = (np.zeros((nk, w)) for _ in range(4))
+        for p, its in enumerate(itens_no):
+            for c, it in enumerate(its):
+                sinal = 1.0 if it.service_type == "pickup" else -1.0
+                dpos[p, c] = q_deliv.pos[k][it.node_id] if it.service_type == "delivery" else pair_assign.pos[k][it.pair_id]
+                d_slots[p, c] = sinal * (it.slots_unit if it.service_type == "delivery" else it.slots_total)
+                d_long[p, c] = sinal * ((1.0 if it.service_type == "delivery" else it.quantity) if it.is_long else 0.0)
+                if it.service_type != "delivery" and str(it.item).strip().upper() == PESSOAS_ITEM.upper():
+                    d_people[p, c] = sinal * it.quantity
+                d_max[p, c] = float(int(round(it.quantity))) if it.service_type == "delivery" else 1.0
+        tem_item = dpos >= 0
+        qty_membro = np.array([int(round(node_by_id[n].quantity)) for n in membros_k[k]], dtype=float)
+        pv_membro = np.array([pos_n[visita_de[n]] for n in membros_k[k]], dtype=np.int64)
+        # atende e tempo de serviço de cada item da visita (nós x itens), e dos itens atendidos antes de cada membro
+        apos = np.full((nk, w), -1, dtype=np.int64)
+        aserv = np.zeros((nk, w))
+        antes_pos = np.full((len(membros_k[k]), w), -1, dtype=np.int64)
+        antes_serv = np.zeros((len(membros_k[k]), w))
+        for p, its in enumerate(itens_no):
+            if not agrupada[p]:
+                continue
+            for c, it in enumerate(its):
+                apos[p, c] = atende.pos[k][it.node_id]
+                aserv[p, c] = it.service_time_h
+                antes_pos[apos[p, c], :c] = apos[p, :c]
+                antes_serv[apos[p, c], :c] = aserv[p, :c]
+        slots_unit_deliv = np.array([node_by_id[n].slots_unit for n in deliv_k[k]])
+        long_deliv = np.array([1.0 if node_by_id[n].is_long else 0.0 for n in deliv_k[k]])
+
+        # Big-M de tempo: T_i <= h_no[i], pois ainda é preciso atender i e voltar ao CD até Mtime
+        # (a primeira parada de uma viagem usada começa no mínimo uma ida e volta antes do fim)
+        if opcoes.big_m_por_arco and nk:
+            h_no = Mtime - serv_min - tempo[node_locs, 0]
+            h_inicio = Mtime - float((tempo[0, node_locs] + serv_min + tempo[node_locs, 0]).min())
+        else:
+            h_no = np.full(nk, Mtime)
+            h_inicio = Mtime
+        t_in = tempo[node_locs[pi_in], node_locs[pj_in]]
+        folga = serv_max - serv_min
+        M_arco = h_no[pi_in] + serv_max[pi_in] + t_in if opcoes.big_m_por_arco else Mtime + folga[pi_in]
+        M_retorno = Mtime + folga[pi_dep]
+        M_primeiro = h_inicio + tempo[0, node_locs[pj_dep]] if opcoes.big_m_por_arco else np.full(len(pj_dep), Mtime)
+        # nó não visitado tem T = 0, então o atraso dispensa big-M
+        M_atraso = np.zeros(nk) if opcoes.big_m_por_arco else np.full(nk, Mtime)
+        # o item pode não ser entregue numa visita feita: aí o atraso dele na visita não vale
+        M_item = antes_serv.sum(axis=1) + (np.maximum(h_no - prazo, 0.0)[pv_membro] if opcoes.big_m_por_arco else Mtime)
+
+        # Big-M de carga: variação possível de L_j - L_i - delta_j * d_j quando o arco não é usado,
+        # a partir do limite da carga (capacidade, longos, pessoas) e da maior variação do nó
+        dimensoes = [("Load", load0, load, d_slots, cap[k], cap[k], Mload)]
+        if k in com_longos:
+            dimensoes.append(("LongLoad", long_load0, long_load, d_long, long_cap[k], long_cap[k], Mtime))
+        if k in com_pessoas:
+            dimensoes.append(("PeopleLoad", people_load0, people_load, d_people, people_cap[k], 0.0, Mtime))
+        limites_carga = {}
+        limites_fluxo = {}
+        if fluxo:
+            # posição da origem/destino de cada arco entre os nós do veículo (nk = CD)
+            pi_a = np.array([pos_n[i] if i else nk for i in a_i], dtype=np.int64)
+            pj_a = np.array([pos_n[j] if j else nk for j in a_j], dtype=np.int64)
+        for rotulo, _, _, delta, U, U0, M_global in dimensoes:
+            if fluxo:
+                # arco i -> j leva ao menos o que j descarrega ou o que i acabou de carregar, e no máximo
+                # a capacidade menos o que j carrega ou o que i descarregou (visitar exige uma unidade de algum item)
+                sobe_min = np.append(np.where(tem_item, np.maximum(delta, 0.0), np.inf).min(axis=1, initial=np.inf), 0.0)
+                desce_min = np.append(np.where(tem_item, np.maximum(-delta, 0.0), np.inf).min(axis=1, initial=np.inf), 0.0)
+                limites_fluxo[rotulo] = (
+                    np.minimum(np.maximum(desce_min[pj_a], sobe_min[pi_a]), U),
+                    np.maximum(U - np.maximum(sobe_min[pj_a], desce_min[pi_a]), 0.0),
+                )
+                continue
+            if not opcoes.big_m_por_arco:
+                limites_carga[rotulo] = tuple(np.full(len(a), M_global) for a in (pj_dep, pj_dep, pj_in, pj_in))
+                continue
+            sobe = np.minimum(np.maximum(delta * d_max, 0.0).sum(axis=1), U)
+            desce = np.minimum(np.maximum(-delta * d_max, 0.0).sum(axis=1), U)
+            limites_carga[rotulo] = (U0 + sobe[pj_dep], U + desce[pj_dep], U + sobe[pj_in], U + desce[pj_in])
+
+        # Ativação do veículo
+        y_all = np.concatenate([y.block(k, r) for r in range(R)]) if nk else np.empty(0, dtype=np.int64)
+        m.add_row(np.append(y_all, u.col(None, k)), np.append(np.ones(len(y_all)), -1.0), 0.0, np.inf, f"VehActLB_{k}")
+        m.add_row(np.append(y_all, u.col(None, k)), np.append(np.ones(len(y_all)), -nk * R), -np.inf, 0.0, f"VehActUB_{k}")
+        if R:
+            m.add_row([trip_used.col(None, k, 0), u.col(None, k)], [1.0, -1.0], 0.0, 0.0, f"FirstTripVeh_{k}")
+            # primeira viagem começa em t = 0
+            m.add_row([trip_start.col(None, k, 0)], [1.0], 0.0, 0.0, f"FirstTripZero_{k}")
+
+        for r in range(R):
+            tu = trip_used.col(None, k, r)
+            ts = trip_start.col(None, k, r)
+            te = trip_end.col(None, k, r)
+            x_r = x.block(k, r)
+            y_r = y.block(k, r)
+            T_r = T.block(k, r)
+            dcol_r = np.where(
+                tem_item, np.where(is_deliv[:, None], q_deliv.start[k] + r * q_deliv.size[k], pair_assign.start[k] + r * pair_assign.size[k]) + dpos, -1
+            )
 
-            for n in node_ids:
-                nd = node_by_id[n]
-                prob += late[n][k][r] >= T[n][k][r] - nd.prazo_horas - Mtime * (1 - y[n][k][r]), f"Late_{n}_{k}_{r}"
-                prob += T[n][k][r] <= Mtime * y[n][k][r], f"TimeAct_{n}_{k}_{r}"
+            # Objetivo: custo por km rodado e penalidade de atraso (numa visita agrupada, por item entregue)
+            m.add_cost(x_r, arc_cost)
+            m.add_cost(late.block(k, r), np.where(agrupada, 0.0, PENALIDADE_ATRASO))
+            m.add_cost(late_item.block(k, r), PENALIDADE_ATRASO)
+
+            # Sequência e ativação da viagem
+            if r + 1 < R:
+                tu_next = trip_used.col(None, k, r + 1)
+                m.add_row([tu_next, tu], [1.0, -1.0], -np.inf, 0.0, f"TripSeq_{k}_{r + 1}_{r + 2}")
+                if opcoes.simetria_viagens and nk:
+                    # nó n na viagem r+1 exige algum nó de índice menor ou igual na viagem r, ou seja,
+                    # min(viagem r) <= min(viagem r+1); empate permite fracionar uma entrega em viagens seguidas
+                    tri = np.where(np.tri(nk, nk, 0, dtype=bool), np.broadcast_to(y_r, (nk, nk)), -1)
+                    m.add_rows(
+                        np.column_stack([y.block(k, r + 1), tri]),
+                        np.column_stack([np.ones(nk), -np.ones((nk, nk))]),
+                        -np.inf, 0.0,
+                        [f"TripLex_{n}_{k}_{r + 2}" for n in nodes_k[k]] if m.nomes else None,
+                    )
+                m.add_row(
+                    [trip_start.col(None, k, r + 1), te, tu, tu_next], [1.0, -1.0, -Mtime, -Mtime], -2.0 * Mtime, np.inf,
+                    f"TripChain_{k}_{r + 1}_{r + 2}",
+                )
+            m.add_row(np.append(y_r, tu), np.append(np.ones(nk), -1.0), 0.0, np.inf, f"TripActLB_{k}_{r + 1}")
+            m.add_row(np.append(y_r, tu), np.append(np.ones(nk), -nk), -np.inf, 0.0, f"TripActUB_{k}_{r + 1}")
+            m.add_row(np.append(x_r[from_depot], tu), np.append(np.ones(from_depot.sum()), -1.0), 0.0, 0.0, f"StartTrip_{k}_{r + 1}")
+            m.add_row(np.append(x_r[to_depot], tu), np.append(np.ones(to_depot.sum()), -1.0), 0.0, 0.0, f"EndTrip_{k}_{r + 1}")
+            m.add_row([ts, tu], [1.0, -h_inicio], -np.inf, 0.0, f"TripStartAct_{k}_{r + 1}")
+            m.add_row([te, tu], [1.0, -Mtime], -np.inf, 0.0, f"TripEndAct_{k}_{r + 1}")
+            m.add_row([te, ts], [1.0, -1.0], 0.0, np.inf, f"TripOrder_{k}_{r + 1}")
+
+            # Fluxo: cada arco entra no InFlow do destino e no OutFlow da origem
+            in_rows = m.add_rows(y_r, -1.0, 0.0, 0.0, [f"InFlow_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None)
+            out_rows = m.add_rows(y_r, -1.0, 0.0, 0.0, [f"OutFlow_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None)
+            into_node = a_j != 0
+            from_node = a_i != 0
+            m.add_terms(in_rows[np.array([pos_n[j] for j in a_j[into_node]], dtype=np.int64)], x_r[a_pos[into_node]], 1.0)
+            m.add_terms(out_rows[np.array([pos_n[i] for i in a_i[from_node]], dtype=np.int64)], x_r[a_pos[from_node]], 1.0)
+
+            # Tempo: primeiro nó, arcos internos, retorno ao CD, atraso e ativação
+            xd = x_r[from_depot]
+            m.add_rows(
+                np.stack([T_r[pj_dep], np.full(len(xd), ts), xd], axis=1),
+                np.stack([np.ones(len(xd)), -np.ones(len(xd)), -M_primeiro], axis=1),
+                tempo[0, node_locs[pj_dep]] - M_primeiro, np.inf,
+                [f"FirstNodeTime_{j}_{k}_{r + 1}" for j in a_j[from_depot]] if m.nomes else None,
+            )
+            acol_r = np.where(apos >= 0, atende.start[k] + r * atende.size[k] + apos, -1)
+            xi = x_r[inner]
+            m.add_rows(
+                np.column_stack([T_r[pj_in], T_r[pi_in], xi, acol_r[pi_in]]),
+                np.column_stack([np.ones(len(xi)), -np.ones(len(xi)), -M_arco, -aserv[pi_in]]),
+                serv_fixo[pi_in] + t_in - M_arco, np.inf,
+                [f"ArcTime_{i}_{j}_{k}_{r + 1}" for i, j in zip(a_i[inner], a_j[inner])] if m.nomes else None,
+            )
+            xr = x_r[to_depot]
+            m.add_rows(
+                np.column_stack([np.full(len(xr), te), T_r[pi_dep], xr, acol_r[pi_dep]]),
+                np.column_stack([np.ones(len(xr)), -np.ones(len(xr)), -M_retorno, -aserv[pi_dep]]),
+                serv_fixo[pi_dep] + tempo[node_locs[pi_dep], 0] - M_retorno, np.inf,
+                [f"ReturnTime_{i}_{k}_{r + 1}" for i in a_i[to_depot]] if m.nomes else None,
+            )
+            m.add_rows(
+                np.stack([late.block(k, r), T_r, y_r], axis=1),
+                np.stack([np.ones(nk), -np.ones(nk), -M_atraso], axis=1), -prazo - M_atraso, np.inf,
+                [f"Late_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None,
+            )
+            m.add_rows(
+                np.stack([T_r, y_r], axis=1), np.stack([np.ones(nk), -h_no], axis=1), -np.inf, 0.0,
+                [f"TimeAct_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None,
+            )
+            if membros_k[k]:
+                a_r = atende.block(k, r)
+                nm = len(a_r)
+                m.add_rows(
+                    np.stack([q_deliv.cols(k, [q_deliv.pos[k][n] for n in membros_k[k]], r), a_r], axis=1),
+                    np.stack([np.ones(nm), -qty_membro], axis=1), -np.inf, 0.0,
+                    [f"ItemServed_{n}_{k}_{r + 1}" for n in membros_k[k]] if m.nomes else None,
+                )
+                # o item começa depois dos itens atendidos antes dele na visita
+                m.add_rows(
+                    np.column_stack([late_item.block(k, r), T_r[pv_membro], a_r, np.where(antes_pos >= 0, a_r[0] + antes_pos, -1)]),
+                    np.column_stack([np.ones(nm), -np.ones(nm), -M_item, -antes_serv]), -prazo[pv_membro] - M_item, np.inf,
+                    [f"ItemLate_{n}_{k}_{r + 1}" for n in membros_k[k]] if m.nomes else None,
+                )
+
+            # Entregas fracionadas: q <= qty quando o nó é visitado e ao menos uma unidade por visita
+            if deliv_k[k]:
+                q_r = q_deliv.block(k, r)
+                y_d = y.cols(k, [pos_n[visita_de.get(n, n)] for n in deliv_k[k]], r)
+                qty_d = np.array([int(round(node_by_id[n].quantity)) for n in deliv_k[k]], dtype=float)
+                m.add_rows(np.stack([q_r, y_d], axis=1), np.stack([np.ones(len(q_r)), -qty_d], axis=1), -np.inf, 0.0,
+                           [f"QDelivVisitUB_{n}_{k}_{r + 1}" for n in deliv_k[k]] if m.nomes else None)
+                m.add_rows(np.column_stack([y_r[is_deliv], dcol_r[is_deliv]]), np.column_stack([-np.ones(is_deliv.sum()), tem_item[is_deliv]]),
+                           0.0, np.inf, [f"QDelivVisitLB_{n}_{k}_{r + 1}" for n, e in zip(nodes_k[k], is_deliv) if e] if m.nomes else None)
+
+            # Coleta e entrega do par na mesma viagem, com precedência
+            for pid in pairs_k[k]:
+                pa = pair_assign.col(pid, k, r)
+                p, d = pair_pick[pid], pair_drop[pid]
+                m.add_row([y.col(p, k, r), pa], [1.0, -1.0], 0.0, 0.0, f"PairPick_{pid}_{k}_{r + 1}")
+                m.add_row([y.col(d, k, r), pa], [1.0, -1.0], 0.0, 0.0, f"PairDrop_{pid}_{k}_{r + 1}")
+                M_par = h_no[pos_n[p]] + node_by_id[p].service_time_h + tempo[loc[p], loc[d]] if opcoes.big_m_por_arco else Mtime
+                m.add_row(
+                    [T.col(d, k, r), T.col(p, k, r), pa], [1.0, -1.0, -M_par],
+                    node_by_id[p].service_time_h + tempo[loc[p], loc[d]] - M_par, np.inf, f"PairPrec_{pid}_{k}_{r + 1}",
+                )
+
+            # Carga inicial: tudo que será entregue nesta viagem sai do CD
+            q_r = q_deliv.block(k, r)
+            m.add_row(np.append(load0.col(None, k, r), q_r), np.append(1.0, -slots_unit_deliv), 0.0, 0.0, f"Load0_{k}_{r + 1}")
+            if k in com_longos:
+                m.add_row(np.append(long_load0.col(None, k, r), q_r), np.append(1.0, -long_deliv), 0.0, 0.0, f"LongLoad0_{k}_{r + 1}")
+
+            if fluxo:
+                # Fluxo de carga (slots, longos, pessoas): sai do CD com a carga inicial, muda de delta * d
+                # em cada nó e só passa por arcos usados; a carga do nó é o fluxo que sai dele
+                for rotulo, fam0, fam, delta, *_ in dimensoes:
+                    inf_a, sup_a = limites_fluxo[rotulo]
+                    f_r = fluxos[rotulo].block(k, r)
+                    n_a = len(f_r)
+                    m.add_rows(np.stack([f_r, x_r], axis=1), np.stack([np.ones(n_a), -sup_a], axis=1), -np.inf, 0.0,
+                               [f"{rotulo}FlowUB_{i}_{j}_{k}_{r + 1}" for i, j in zip(a_i, a_j)] if m.nomes else None)
+                    com_inf = inf_a > 0
+                    m.add_rows(np.stack([f_r[com_inf], x_r[com_inf]], axis=1), np.stack([np.ones(com_inf.sum()), -inf_a[com_inf]], axis=1), 0.0, np.inf,
+                               [f"{rotulo}FlowLB_{i}_{j}_{k}_{r + 1}" for i, j in zip(a_i[com_inf], a_j[com_inf])] if m.nomes else None)
+                    m.add_row(np.append(f_r[from_depot], fam0.col(None, k, r)), np.append(np.ones(from_depot.sum()), -1.0), 0.0, 0.0,
+                              f"{rotulo}FlowStart_{k}_{r + 1}")
+                    cons_rows = m.add_rows(dcol_r, -delta, 0.0, 0.0,
+                                           [f"{rotulo}FlowCons_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None)
+                    m.add_terms(cons_rows[pi_a[from_node]], f_r[from_node], 1.0)
+                    m.add_terms(cons_rows[pj_a[into_node]], f_r[into_node], -1.0)
+                    node_rows = m.add_rows(fam.block(k, r), -1.0, 0.0, 0.0,
+                                           [f"{rotulo}FlowNode_{n}_{k}_{r + 1}" for n in nodes_k[k]] if m.nomes else None)
+                    m.add_terms(node_rows[pi_a[from_node]], f_r[from_node], 1.0)
+            else:
+                # Balanço de carga (slots, longos, pessoas) a partir do CD e ao longo dos arcos internos
+                for rotulo, fam0, fam, delta, *_ in dimensoes:
+                    M_lb_dep, M_ub_dep, M_lb_in, M_ub_in = limites_carga[rotulo]
+                    L_r = fam.block(k, r)
+                    l0 = fam0.col(None, k, r)
+                    n_dep = len(xd)
+                    cols_dep = np.column_stack([L_r[pj_dep], np.full(n_dep, l0), dcol_r[pj_dep], xd])
+                    vals_dep = np.column_stack([np.ones(n_dep), -np.ones(n_dep), -delta[pj_dep], -M_lb_dep])
+                    m.add_rows(cols_dep, vals_dep, -M_lb_dep, np.inf,
+                               [f"{rotulo}StartLB_{j}_{k}_{r + 1}" for j in a_j[from_depot]] if m.nomes else None)
+                    vals_dep[:, -1] = M_ub_dep
+                    m.add_rows(cols_dep, vals_dep, -np.inf, M_ub_dep,
+                               [f"{rotulo}StartUB_{j}_{k}_{r + 1}" for j in a_j[from_depot]] if m.nomes else None)
+
+                    n_in = len(xi)
+                    cols_in = np.column_stack([L_r[pj_in], L_r[pi_in], dcol_r[pj_in], xi])
+                    vals_in = np.column_stack([np.ones(n_in), -np.ones(n_in), -delta[pj_in], -M_lb_in])
+                    m.add_rows(cols_in, vals_in, -M_lb_in, np.inf,
+                               [f"{rotulo}ArcLB_{i}_{j}_{k}_{r + 1}" for i, j in zip(a_i[inner], a_j[inner])] if m.nomes else None)
+                    vals_in[:, -1] = M_ub_in
+                    m.add_rows(cols_in, vals_in, -np.inf, M_ub_in,
+                               [f"{rotulo}ArcUB_{i}_{j}_{k}_{r + 1}" for i, j in zip(a_i[inner], a_j[inner])] if m.nomes else None)
+
+    estrutura = {
+        "vehicles": vehicles,
+        "trips": trips,
+        "nodes_k": nodes_k,
+        "pairs_k": pairs_k,
+        "succ": succ,
+        "membros": membros,
+        "visita_de": visita_de,
+        "com_longos": sorted(com_longos),
+        "com_pessoas": sorted(com_pessoas),
+        "families": {
+            "x": x, "y": y, "u": u, "trip_used": trip_used, "q_deliv": q_deliv, "pair_assign": pair_assign,
+            "T": T, "late": late, "atende": atende, "late_item": late_item, "trip_start": trip_start, "trip_end": trip_end,
+            "load0": load0, "load": load, "long_load0": long_load0, "long_load": long_load,
+            "people_load0": people_load0, "people_load": people_load,
+            **({"f_load": f_load, "f_long": f_long, "f_people": f_people} if fluxo else {}),
+        },
+    }
+    return m, estrutura
+
+
+def _status_from_highs(h: Any) -> str:
+    """Traduz o status do HiGHS para os rótulos usados pela aplicação (mesmos do PuLP)."""
+    ms = h.getModelStatus()
+    nome = h.modelStatusToString(ms)
+    if nome == "Optimal":
+        return "Optimal"
+    if nome in ("Infeasible", "Primal infeasible or unbounded"):
+        return "Infeasible"
+    if nome == "Unbounded":
+        return "Unbounded"
+    # Limite de tempo/interrupção: há solução apenas se o HiGHS tiver um incumbente
+    info = h.getInfo()
+    if getattr(info, "primal_solution_status", 0) == 2 and math.isfinite(getattr(info, "objective_function_value", math.inf)):
+        return "Feasible"
+    return "Not Solved"
+
+
+def _com_orcamento(opcoes: OpcoesSolver, n_nos: int) -> OpcoesSolver:
+    """Opções com time_limit_s reduzido ao orçamento proporcional ao número de nós de serviço, se houver."""
+    if opcoes.tempo_por_no_s is None:
+        return opcoes
+    return replace(opcoes, time_limit_s=min(opcoes.time_limit_s, opcoes.tempo_base_s + opcoes.tempo_por_no_s * n_nos))
+
+
+def _regra_de_parada(opcoes: OpcoesSolver, objetivo: float | None, limite: float | None, sem_melhora_s: float) -> str | None:
+    """Primeira regra de parada do chamador satisfeita pelo estado do branch-and-bound (None = continuar)."""
+    if objetivo is None:
+        return None
+    gap_pct = _gap_pct(objetivo, limite)
+    if opcoes.parar_gap_pct is not None and gap_pct is not None and gap_pct <= opcoes.parar_gap_pct:
+        return "gap_pct"
+    if opcoes.parar_gap_abs is not None and limite is not None and objetivo - limite <= opcoes.parar_gap_abs:
+        return "gap_abs"
+    if opcoes.parar_objetivo is not None and objetivo <= opcoes.parar_objetivo:
+        return "objetivo_alvo"
+    if opcoes.parar_sem_melhora_s is not None and sem_melhora_s >= opcoes.parar_sem_melhora_s:
+        return "sem_melhora"
+    return None
+
+
+def _motivo_parada(h: Any, acompanhamento: "_Acompanhamento", gap: Dict[str, float | None]) -> str:
+    """Regra que encerrou o MIP: a do chamador, se interrompeu, senão a traduzida do status do HiGHS."""
+    if acompanhamento.motivo is not None:
+        return acompanhamento.motivo
+    nome = h.modelStatusToString(h.getModelStatus())
+    if nome == "Optimal":
+        return "otimo" if not gap["mip_gap"] else "gap_rel"
+    if nome == "Time limit reached":
+        return "tempo_limite"
+    if nome in ("Infeasible", "Primal infeasible or unbounded"):
+        return "inviavel"
+    return "interrompido"
+
+
+def _highs_options(opcoes: OpcoesSolver) -> Dict[str, Any]:
+    return {
+        "output_flag": bool(opcoes.msg),
+        "time_limit": float(opcoes.time_limit_s),
+        "mip_rel_gap": float(opcoes.gap_rel),
+        "threads": int(opcoes.threads),
+        "presolve": "on",
+        "parallel": "on",
+    }
 
-    # Precedência pickup -> dropoff
-    for pid in pairs:
-        p = pair_pick[pid]
-        d = pair_drop[pid]
-        for k in vehicles:
-            for r in trips:
-                travel_pd = tempo[p][d]
-                if node_by_id[p].local == node_by_id[d].local:
-                    travel_pd = 0.0
-                prob += T[d][k][r] >= T[p][k][r] + node_by_id[p].service_time_h + travel_pd - Mtime * (1 - pair_assign[pid][k][r]), f"PairPrec_{pid}_{k}_{r}"
-
-    # Balanço de carga
-    Mload = max(v["cap_slots"] for v in dados["vehicles"].values()) + sum(n.slots_total for n in svc_nodes)
 
-    def delta_slots_expr(n: int, k: str, r: int):
-        nd = node_by_id[n]
-        if nd.service_type == "delivery":
-            return -nd.slots_unit * q_deliv[n][k][r]
-        elif nd.service_type == "pickup":
-            return nd.slots_total * pair_assign[nd.pair_id][k][r]
-        else:  # dropoff
-            return -nd.slots_total * pair_assign[nd.pair_id][k][r]
-
-    def delta_long_expr(n: int, k: str, r: int):
-        nd = node_by_id[n]
-        if not nd.is_long:
-            return 0
-        if nd.service_type == "delivery":
-            return -q_deliv[n][k][r]
-        elif nd.service_type == "pickup":
-            return nd.quantity * pair_assign[nd.pair_id][k][r]
-        else:
-            return -nd.quantity * pair_assign[nd.pair_id][k][r]
-
-    def delta_people_expr(n: int, k: str, r: int):
-        nd = node_by_id[n]
-        if str(nd.item).strip().upper() != PESSOAS_ITEM.upper():
-            return 0
-        if nd.service_type == "delivery":
-            return 0
-        elif nd.service_type == "pickup":
-            return nd.quantity * pair_assign[nd.pair_id][k][r]
+class _HiGHSPulp(pulp.HiGHS):
+    """HiGHS do PuLP com solução inicial: aplicada depois de o PuLP montar o modelo, antes do run()."""
+
+    def __init__(self, lpvars: List[pulp.LpVariable], solucao_inicial: np.ndarray | None = None, acompanhamento=None, **kwargs):
+        super().__init__(**kwargs)
+        self.lpvars = lpvars
+        self.solucao_inicial = solucao_inicial
+        self.acompanhamento = acompanhamento
+
+    def callSolver(self, lp):
+        if self.acompanhamento is not None:
+            self.acompanhamento.assinar(lp.solverModel, np.array([v.index for v in self.lpvars], dtype=np.int64))
+        if self.solucao_inicial is not None:
+            # o PuLP ordena as colunas pelo nome; var.index é a posição de cada variável no HiGHS
+            pares = [(v.index, self.solucao_inicial[p]) for p, v in enumerate(self.lpvars) if getattr(v, "index", None) is not None]
+            idx = np.array([i for i, _ in pares], dtype=np.int32)
+            val = np.array([x for _, x in pares], dtype=float)
+            lp.solverModel.setSolution(len(idx), idx, val)
+        super().callSolver(lp)
+
+
+def _solve_pulp(
+    arrays: Dict[str, Any],
+    opcoes: OpcoesSolver,
+    solucao_inicial: np.ndarray | None = None,
+    acompanhamento: "_Acompanhamento | None" = None,
+) -> Tuple[str, np.ndarray | None, Any]:
+    """Resolve o modelo matricial via PuLP (referência)."""
+    prob = pulp.LpProblem("Hybrid_VRP_PD_ArcBalance", pulp.LpMinimize)
+    names = arrays["col_names"] or [f"c{p}" for p in range(arrays["n_cols"])]
+    lpvars = [
+        pulp.LpVariable(
+            names[p],
+            None if not math.isfinite(lb) else lb,
+            None if not math.isfinite(ub) else ub,
+            cat="Integer" if integer else "Continuous",
+        )
+        for p, (lb, ub, integer) in enumerate(zip(arrays["col_lower"], arrays["col_upper"], arrays["integrality"]))
+    ]
+    cost = arrays["col_cost"]
+    prob += pulp.LpAffineExpression([(lpvars[p], float(cost[p])) for p in np.flatnonzero(cost)])
+
+    start, index, value = arrays["a_start"], arrays["a_index"], arrays["a_value"]
+    row_names = arrays["row_names"]
+    for rix in range(arrays["n_rows"]):
+        expr = pulp.LpAffineExpression([(lpvars[c], float(v)) for c, v in zip(index[start[rix]:start[rix + 1]], value[start[rix]:start[rix + 1]])])
+        lo, hi = float(arrays["row_lower"][rix]), float(arrays["row_upper"][rix])
+        name = row_names[rix] if row_names else None
+        if lo == hi:
+            prob += pulp.LpConstraint(expr, pulp.LpConstraintEQ, rhs=lo, name=name)
         else:
-            return -nd.quantity * pair_assign[nd.pair_id][k][r]
-
-    for k in vehicles:
-        cap = dados["vehicles"][k]["cap_slots"]
-        categoria_k = dados["vehicles"][k]["categoria"]
-
-        for r in trips:
-            # carga inicial: tudo que será entregue nesta viagem sai do CD
-            prob += load0[k][r] == pulp.lpSum(
-                node_by_id[n].slots_unit * q_deliv[n][k][r]
-                for n in delivery_ids
-            ), f"Load0_{k}_{r}"
-            prob += load0[k][r] <= cap, f"Load0Cap_{k}_{r}"
-
-            prob += long_load0[k][r] == pulp.lpSum(
-                q_deliv[n][k][r]
-                for n in delivery_ids
-                if node_by_id[n].is_long
-            ), f"LongLoad0_{k}_{r}"
-            prob += people_load0[k][r] == 0, f"PeopleLoad0_{k}_{r}"
-
-            for j in node_ids:
-                prob += load[j][k][r] >= load0[k][r] + delta_slots_expr(j, k, r) - Mload * (1 - x[0][j][k][r]), f"LoadStartLB_{j}_{k}_{r}"
-                prob += load[j][k][r] <= load0[k][r] + delta_slots_expr(j, k, r) + Mload * (1 - x[0][j][k][r]), f"LoadStartUB_{j}_{k}_{r}"
-
-                prob += long_load[j][k][r] >= long_load0[k][r] + delta_long_expr(j, k, r) - Mtime * (1 - x[0][j][k][r]), f"LongLoadStartLB_{j}_{k}_{r}"
-                prob += long_load[j][k][r] <= long_load0[k][r] + delta_long_expr(j, k, r) + Mtime * (1 - x[0][j][k][r]), f"LongLoadStartUB_{j}_{k}_{r}"
-                prob += people_load[j][k][r] >= people_load0[k][r] + delta_people_expr(j, k, r) - Mtime * (1 - x[0][j][k][r]), f"PeopleLoadStartLB_{j}_{k}_{r}"
-                prob += people_load[j][k][r] <= people_load0[k][r] + delta_people_expr(j, k, r) + Mtime * (1 - x[0][j][k][r]), f"PeopleLoadStartUB_{j}_{k}_{r}"
-
-            for i in node_ids:
-                for j in node_ids:
-                    if i == j:
-                        continue
-                    prob += load[j][k][r] >= load[i][k][r] + delta_slots_expr(j, k, r) - Mload * (1 - x[i][j][k][r]), f"LoadArcLB_{i}_{j}_{k}_{r}"
-                    prob += load[j][k][r] <= load[i][k][r] + delta_slots_expr(j, k, r) + Mload * (1 - x[i][j][k][r]), f"LoadArcUB_{i}_{j}_{k}_{r}"
-
-                    prob += long_load[j][k][r] >= long_load[i][k][r] + delta_long_expr(j, k, r) - Mtime * (1 - x[i][j][k][r]), f"LongLoadArcLB_{i}_{j}_{k}_{r}"
-                    prob += long_load[j][k][r] <= long_load[i][k][r] + delta_long_expr(j, k, r) + Mtime * (1 - x[i][j][k][r]), f"LongLoadArcUB_{i}_{j}_{k}_{r}"
-                    prob += people_load[j][k][r] >= people_load[i][k][r] + delta_people_expr(j, k, r) - Mtime * (1 - x[i][j][k][r]), f"PeopleLoadArcLB_{i}_{j}_{k}_{r}"
-                    prob += people_load[j][k][r] <= people_load[i][k][r] + delta_people_expr(j, k, r) + Mtime * (1 - x[i][j][k][r]), f"PeopleLoadArcUB_{i}_{j}_{k}_{r}"
-
-            for n in node_ids:
-                prob += load[n][k][r] <= cap, f"LoadCap_{n}_{k}_{r}"
-                prob += load[n][k][r] >= 0, f"LoadNonNeg_{n}_{k}_{r}"
-                prob += long_load[n][k][r] >= 0, f"LongLoadNonNeg_{n}_{k}_{r}"
-                prob += people_load[n][k][r] >= 0, f"PeopleLoadNonNeg_{n}_{k}_{r}"
-                prob += people_load[n][k][r] <= MAX_PESSOAS_SIMULTANEAS, f"PeopleCap_{n}_{k}_{r}"
-
-            # Restrição de longos apenas para CAMINHONETE/PICKUP
-            if categoria_k in ["CAMINHONETE", "PICKUP"]:
-                prob += long_load0[k][r] <= 4, f"LongCap0_{k}_{r}"
-                for n in node_ids:
-                    prob += long_load[n][k][r] <= 4, f"LongCap_{n}_{k}_{r}"
-
-    solver = pulp.HiGHS(
-        msg=True,
-        timeLimit=1800,
-        gapRel=0.0005,
-        threads=0,
-        presolve="on",
-        parallel="on",
+            if math.isfinite(lo):
+                prob += pulp.LpConstraint(expr, pulp.LpConstraintGE, rhs=lo, name=name if not math.isfinite(hi) else f"{name}_lo" if name else None)
+            if math.isfinite(hi):
+                prob += pulp.LpConstraint(expr, pulp.LpConstraintLE, rhs=hi, name=name if not math.isfinite(lo) else f"{name}_hi" if name else None)
+
+    hopts = _highs_options(opcoes)
+    solver = _HiGHSPulp(
+        lpvars,
+        solucao_inicial,
+        acompanhamento,
+        msg=hopts.pop("output_flag"),
+        timeLimit=hopts.pop("time_limit"),
+        gapRel=hopts.pop("mip_rel_gap"),
+        threads=hopts.pop("threads"),
+        **hopts,
     )
     prob.solve(solver)
-    status = pulp.LpStatus[prob.status]
+    h = prob.solverModel
+    status = _status_from_highs(h)
+    if status not in {"Optimal", "Feasible"}:
+        return status, None, h
+    col_value = np.array([v.varValue if v.varValue is not None else 0.0 for v in lpvars])
+    return status, col_value, h
+
+
+def _finito(valor: float) -> float | None:
+    # o HiGHS usa +-inf (ou 1e30+) enquanto não há incumbente/limite
+    return float(valor) if math.isfinite(valor) and abs(valor) < 1e29 else None
+
+
+def _gap_pct(objetivo: float | None, limite: float | None) -> float | None:
+    if objetivo is None or limite is None:
+        return None
+    return 100.0 * max(0.0, objetivo - limite) / max(abs(objetivo), 1e-9)
+
+
+class _Acompanhamento:
+    """
+    Callbacks do MIP no HiGHS: registra cada incumbente (tempo, objetivo, limite, gap, nós), repassa o
+    progresso e o plano decodificado aos chamadores e interrompe pelas regras de parada de `OpcoesSolver`.
+    """
+
+    def __init__(
+        self,
+        opcoes: OpcoesSolver,
+        decodificar: Callable[[np.ndarray], Dict[str, Any]] | None = None,
+        intervalo_s: float = 1.0,
+        referencia: Tuple[float, float] | None = None,
+    ):
+        self.opcoes = opcoes
+        self.decodificar = decodificar
+        self.intervalo_s = intervalo_s
+        self.historico: List[Dict[str, Any]] = []
+        self.plano: Dict[str, Any] | None = None
+        self.motivo: str | None = None
+        # limite dual ao fim do nó raiz (depois dos cortes), para comparar formulações
+        self.limite_raiz: float | None = None
+        # melhor objetivo de rodadas anteriores e instante (perf_counter) em que foi achado: a janela
+        # de parar_sem_melhora_s continua dele e só um incumbente melhor a reinicia
+        self.referencia = referencia
+        self._idade_referencia = 0.0 if referencia is None else time.perf_counter() - referencia[1]
+        self._ordem: np.ndarray | None = None
+        self._ultimo_progresso = -math.inf
+
+    def assinar(self, h: Any, ordem: np.ndarray | None = None) -> None:
+        # ordem: posição no HiGHS de cada coluna do modelo (o PuLP reordena as colunas pelo nome)
+        self._ordem = ordem
+        h.cbMipImprovingSolution.subscribe(self._ao_melhorar)
+        h.cbMipInterrupt.subscribe(self._ao_interromper)
+
+    @property
+    def melhorado_em(self) -> float | None:
+        ref = self.referencia
+        if self.historico and (ref is None or self.historico[-1]["objetivo"] < ref[0] - 1e-6 * max(1.0, abs(ref[0]))):
+            return self.historico[-1]["tempo_s"]
+        return None if ref is None else -self._idade_referencia
+
+    def _ao_melhorar(self, e) -> None:
+        d = e.data_out
+        objetivo = _finito(d.objective_function_value)
+        # o HiGHS também avisa soluções de mesmo custo encontradas por outras heurísticas
+        if objetivo is None or (self.historico and objetivo >= self.historico[-1]["objetivo"] - 1e-6 * max(1.0, abs(objetivo))):
+            return
+        limite = _finito(d.mip_dual_bound)
+        ponto = {
+            "tempo_s": round(float(d.running_time), 3),
+            "objetivo": objetivo,
+            "limite": limite,
+            "gap_pct": _gap_pct(objetivo, limite),
+            "nos": int(d.mip_node_count),
+        }
+        self.historico.append(ponto)
+        if self.opcoes.ao_incumbente is not None and self.decodificar is not None:
+            x = np.asarray(d.mip_solution, dtype=float)
+            self.plano = self.decodificar(x if self._ordem is None else x[self._ordem])
+            self.opcoes.ao_incumbente(ponto, self.plano)
+
+    def _ao_interromper(self, e) -> None:
+        d = e.data_out
+        objetivo, limite = _finito(d.mip_primal_bound), _finito(d.mip_dual_bound)
+        if d.mip_node_count == 0 and limite is not None:
+            self.limite_raiz = limite
+        if self.opcoes.progresso is not None and d.running_time - self._ultimo_progresso >= self.intervalo_s:
+            self._ultimo_progresso = d.running_time
+            self.opcoes.progresso({
+                "tempo_s": float(d.running_time),
+                "objetivo": objetivo,
+                "limite": limite,
+                "gap_pct": _gap_pct(objetivo, limite),
+            })
+        sem_melhora_s = d.running_time - self.melhorado_em if self.melhorado_em is not None else 0.0
+        motivo = _regra_de_parada(self.opcoes, objetivo, limite, sem_melhora_s)
+        if motivo is not None:
+            self.motivo = self.motivo or motivo
+            e.data_in.user_interrupt = True
+
+
+def _highs_do_modelo(
+    arrays: Dict[str, Any],
+    opcoes: OpcoesSolver,
+    solucao_inicial: np.ndarray | None = None,
+    extras: Dict[str, Any] | None = None,
+) -> Any:
+    """Instância do HiGHS com o modelo matricial carregado (passModel), as opções e a solução inicial."""
+    import highspy
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = int(arrays["n_cols"])
+    lp.num_row_ = int(arrays["n_rows"])
+    lp.col_cost_ = arrays["col_cost"]
+    lp.col_lower_ = np.where(np.isfinite(arrays["col_lower"]), arrays["col_lower"], -highspy.kHighsInf)
+    lp.col_upper_ = np.where(np.isfinite(arrays["col_upper"]), arrays["col_upper"], highspy.kHighsInf)
+    lp.row_lower_ = np.where(np.isfinite(arrays["row_lower"]), arrays["row_lower"], -highspy.kHighsInf)
+    lp.row_upper_ = np.where(np.isfinite(arrays["row_upper"]), arrays["row_upper"], highspy.kHighsInf)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = int(arrays["n_cols"])
+    lp.a_matrix_.num_row_ = int(arrays["n_rows"])
+    lp.a_matrix_.start_ = arrays["a_start"].astype(np.int32)
+    lp.a_matrix_.index_ = arrays["a_index"].astype(np.int32)
+    lp.a_matrix_.value_ = arrays["a_value"]
+    lp.integrality_ = [highspy.HighsVarType.kInteger if i else highspy.HighsVarType.kContinuous for i in arrays["integrality"]]
+    if arrays["col_names"]:
+        lp.col_names_ = arrays["col_names"]
+        lp.row_names_ = arrays["row_names"]
+
+    h = highspy.Highs()
+    for chave, valor in {**_highs_options(opcoes), **(extras or {})}.items():
+        h.setOptionValue(chave, valor)
+    h.passModel(lp)
+    if solucao_inicial is not None:
+        h.setSolution(int(arrays["n_cols"]), np.arange(arrays["n_cols"], dtype=np.int32), solucao_inicial)
+    return h
+
+
+def _solve_highspy(
+    arrays: Dict[str, Any],
+    opcoes: OpcoesSolver,
+    solucao_inicial: np.ndarray | None = None,
+    acompanhamento: _Acompanhamento | None = None,
+) -> Tuple[str, np.ndarray | None, Any]:
+    """Resolve o modelo matricial passando os arrays direto ao HiGHS (passModel), sem objetos do PuLP."""
+    h = _highs_do_modelo(arrays, opcoes, solucao_inicial)
+    if acompanhamento is not None:
+        acompanhamento.assinar(h)
+    h.run()
+    status = _status_from_highs(h)
+    if status not in {"Optimal", "Feasible"}:
+        return status, None, h
+    return status, np.asarray(h.getSolution().col_value, dtype=float), h
+
 
+def _gap_info(h: Any) -> Dict[str, float | None]:
     mip_gap = None
     mip_gap_pct = None
     best_objective = None
     best_bound = None
 
     try:
-        info = prob.solverModel.getInfo()
+        info = h.getInfo()
         if hasattr(info, "objective_function_value"):
             best_objective = float(info.objective_function_value)
         if hasattr(info, "mip_dual_bound"):
@@ -636,115 +1903,310 @@ def executar_solver(
                 mip_gap_pct = 0.0
     except Exception:
         pass
+    return {"mip_gap": mip_gap, "mip_gap_pct": mip_gap_pct, "best_objective": best_objective, "best_bound": best_bound}
+
+
+def _violacoes(arrays: Dict[str, Any], sol: np.ndarray, tol: float = 1e-6) -> List[str]:
+    """Restrições e limites de coluna violados por uma solução (nomes quando o modelo os tem)."""
+    linhas = np.repeat(np.arange(arrays["n_rows"]), np.diff(arrays["a_start"]))
+    atividade = np.bincount(linhas, weights=arrays["a_value"] * sol[arrays["a_index"]], minlength=arrays["n_rows"])
+    escala = tol * np.maximum(1.0, np.abs(atividade))
+    ruins = np.flatnonzero((atividade < arrays["row_lower"] - escala) | (atividade > arrays["row_upper"] + escala))
+    fora = np.flatnonzero((sol < arrays["col_lower"] - tol) | (sol > arrays["col_upper"] + tol))
+    nomes_l, nomes_c = arrays["row_names"], arrays["col_names"]
+    return (
+        [nomes_l[i] if nomes_l else f"linha {i}" for i in ruins]
+        + [nomes_c[j] if nomes_c else f"coluna {j}" for j in fora]
+    )
 
-    print("STATUS SOLVER:", status)
-    print("R_MAX:", dados["r_max"])
-    print("NÚMERO DE NÓS DE SERVIÇO:", len(svc_nodes))
-    print("DELIVERIES:", len(delivery_ids), "PICKUPS:", len(pickup_ids), "DROPOFFS:", len(dropoff_ids))
-    print("ITENS LONGOS IDENTIFICADOS:", itens_longos)
-    print("MIP GAP (%):", mip_gap_pct)
-
-    items_instancia = sorted(set(n.item for n in svc_nodes))
-    for k in vehicles:
-        compat_items = [item for item in items_instancia if dados["compat"].get((k, item), 0) == 1]
-        print(f"VEÍCULO {k} COMPATÍVEL COM: {compat_items}")
-        print(f"VEÍCULO {k} - u =", pulp.value(u[k]))
-        for r in trips:
-            print(
-                f"  viagem {r}: trip_used={pulp.value(trip_used[k][r])}, "
-                f"trip_start={pulp.value(trip_start[k][r])}, "
-                f"trip_end={pulp.value(trip_end[k][r])}"
-            )
-
-    if status not in {"Optimal", "Feasible"}:
-        return {
-            "status": status,
-            "mensagem": "O solver não encontrou solução viável para a formulação atual.",
-        }
-
-    # Extração das rotas
-    route_tables = []
-    route_map_rows = []
-    total_dist = 0.0
-    total_cost = pulp.value(prob.objective) or 0.0
 
-    for k in vehicles:
-        for r in trips:
-            if (pulp.value(trip_used[k][r]) or 0.0) < 0.5:
+def _solucao_do_plano(dados: Dict[str, Any], estrutura: Dict[str, Any], plano: Dict[str, Any], n_cols: int) -> np.ndarray | None:
+    """
+    Valores de todas as colunas do modelo de arcos correspondentes a um plano neutro (inverso de
+    `_extrair_plano`). Retorna None se o plano usar um arco fora do conjunto admissível.
+    """
+    f = estrutura["families"]
+    visita_de = estrutura["visita_de"]
+    membros = estrutura["membros"]
+    node_by_id = {n.node_id: n for n in dados["service_nodes"]}
+    loc = dados["node_loc"]
+    tempo = dados["tempo_loc"]
+    sol = np.zeros(n_cols)
+    fim_anterior: Dict[str, float] = {}
+    for viagem in plano["viagens"]:
+        k = viagem["vehicle"]
+        r = viagem["trip"] - 1
+        if k not in f["u"].pos or r >= len(estrutura["trips"]):
+            return None
+        sol[f["u"].col(None, k)] = 1.0
+        sol[f["trip_used"].col(None, k, r)] = 1.0
+
+        # itens da mesma visita viram uma parada só, na posição do primeiro (horário e atraso dele);
+        # só entregas são agrupadas, então antecipar as descargas nunca aumenta a carga adiante
+        campos = ("load", "long_load", "people_load")
+        antes = {c: 0.0 for c in campos}
+        load0 = 0.0
+        long_load0 = 0.0
+        for stop in viagem["stops"]:
+            nd = node_by_id[stop["node"]]
+            if nd.service_type == "delivery":
+                load0 += nd.slots_unit * stop["qty"]
+                long_load0 += stop["qty"] if nd.is_long else 0.0
+        antes["load"], antes["long_load"] = load0, long_load0
+        paradas: Dict[int, List[Dict[str, Any]]] = {}
+        variacao: Dict[int, Dict[str, float]] = {}
+        for stop in viagem["stops"]:
+            v = visita_de.get(stop["node"], stop["node"])
+            paradas.setdefault(v, []).append(stop)
+            var = variacao.setdefault(v, {c: 0.0 for c in campos})
+            for c in campos:
+                atual = float(stop[c] or 0.0)
+                var[c] += atual - antes[c]
+                antes[c] = atual
+
+        nos = [0] + list(paradas) + [0]
+        for i, j in zip(nos, nos[1:]):
+            if not f["x"].has((i, j), k):
+                return None
+            sol[f["x"].col((i, j), k, r)] = 1.0
+
+        # horários refeitos em sequência: juntar itens numa visita soma os serviços dela, o que pode
+        # atrasar as paradas seguintes do plano (que nunca ficam mais cedo que o horário dele)
+        inicio = max(viagem["start"], fim_anterior.get(k, 0.0))
+        sol[f["trip_start"].col(None, k, r)] = inicio
+        agora, anterior = inicio, 0
+        cargas = {"load": [load0], "long_load": [long_load0], "people_load": [0.0]}
+        for v, stops in paradas.items():
+            for c in campos:
+                cargas[c].append(cargas[c][-1] + variacao[v][c])
+            nd_v = node_by_id[v]
+            T_v = max(stops[0]["T"], agora + tempo[loc[anterior], loc[v]])
+            sol[f["y"].col(v, k, r)] = 1.0
+            sol[f["T"].col(v, k, r)] = T_v
+            sol[f["late"].col(v, k, r)] = max(0.0, T_v - nd_v.prazo_horas)
+            if v in membros:
+                # itens entregues na ordem da visita, cada um depois do serviço dos anteriores
+                entregues = {st["node"] for st in stops if st["qty"] > 0}
+                agora = T_v
+                for i in membros[v]:
+                    if i in entregues and f["atende"].has(i, k):
+                        sol[f["atende"].col(i, k, r)] = 1.0
+                        sol[f["late_item"].col(i, k, r)] = max(0.0, agora - node_by_id[i].prazo_horas)
+                        agora += node_by_id[i].service_time_h
+            else:
+                agora = T_v + nd_v.service_time_h
+            anterior = v
+            sol[f["load"].col(v, k, r)] = cargas["load"][-1]
+            # longos e pessoas existem só nos veículos em que o limite pode ser atingido
+            for fam in ("long_load", "people_load"):
+                if f[fam].has(v, k):
+                    sol[f[fam].col(v, k, r)] = cargas[fam][-1]
+            for stop in stops:
+                nd = node_by_id[stop["node"]]
+                if nd.service_type == "delivery":
+                    sol[f["q_deliv"].col(nd.node_id, k, r)] = stop["qty"]
+                elif nd.service_type == "pickup":
+                    sol[f["pair_assign"].col(nd.pair_id, k, r)] = 1.0
+        fim_anterior[k] = max(viagem["end"], agora + tempo[loc[anterior], loc[0]])
+        sol[f["trip_end"].col(None, k, r)] = fim_anterior[k]
+        sol[f["load0"].col(None, k, r)] = load0
+        if f["long_load0"].has(None, k):
+            sol[f["long_load0"].col(None, k, r)] = long_load0
+        if "f_load" in f:
+            # formulação de fluxo: cada arco leva a carga de depois da parada de origem
+            for fam, campo in (("f_load", "load"), ("f_long", "long_load"), ("f_people", "people_load")):
+                if k not in f[fam].pos:
+                    continue
+                for (i, j), carga in zip(zip(nos, nos[1:]), cargas[campo]):
+                    sol[f[fam].col((i, j), k, r)] = carga
+    return sol
+
+
+def _completar_cargas(node_by_id: Dict[int, ServiceNode], stops: List[Dict[str, Any]]) -> None:
+    """Itens longos e pessoas a bordo depois de cada parada, nas dimensões que o modelo não acompanhou no veículo."""
+    longos = sum(float(st["qty"]) for st in stops if node_by_id[st["node"]].service_type == "delivery" and node_by_id[st["node"]].is_long)
+    pessoas = 0.0
+    for st in stops:
+        nd = node_by_id[st["node"]]
+        sinal = 1.0 if nd.service_type == "pickup" else -1.0
+        if nd.is_long:
+            longos += sinal * st["qty"]
+        if nd.service_type != "delivery" and str(nd.item).strip().upper() == PESSOAS_ITEM.upper():
+            pessoas += sinal * st["qty"]
+        if st["long_load"] is None:
+            st["long_load"] = longos
+        if st["people_load"] is None:
+            st["people_load"] = pessoas
+
+
+def _extrair_plano(dados: Dict[str, Any], estrutura: Dict[str, Any], col_value: np.ndarray) -> Dict[str, Any]:
+    """
+    Converte a solução do modelo de arcos no plano neutro usado por todos os motores:
+    viagens por veículo com a sequência de paradas e os valores de tempo e carga de cada parada.
+    """
+    f = estrutura["families"]
+    succ = estrutura["succ"]
+    node_by_id = {n.node_id: n for n in dados["service_nodes"]}
+
+    def val(fam: _VarFamily, key: Any, k: str, r: int) -> float:
+        return float(col_value[fam.col(key, k, r)])
+
+    viagens = []
+    for k in estrutura["vehicles"]:
+        for r_idx, r in enumerate(estrutura["trips"]):
+            if val(f["trip_used"], None, k, r_idx) < 0.5:
                 continue
 
             curr = 0
-            seq = 1
-            rows = []
+            stops = []
             visited = set()
-            trip_dist = 0.0
-
             while True:
-                next_nodes = [j for j in node_ids if j not in visited and (pulp.value(x[curr][j][k][r]) or 0.0) > 0.5]
+                next_nodes = [j for j in succ[k][curr] if j != 0 and j not in visited and val(f["x"], (curr, j), k, r_idx) > 0.5]
                 if not next_nodes:
-                    if curr != 0 and (pulp.value(x[curr][0][k][r]) or 0.0) > 0.5:
-                        trip_dist += dist[curr][0]
                     break
 
                 j = next_nodes[0]
                 visited.add(j)
-                trip_dist += dist[curr][j]
                 nd = node_by_id[j]
-
-                if nd.service_type == "delivery":
-                    qty_visit = int(round(pulp.value(q_deliv[j][k][r]) or 0.0))
+                agrupada = j in estrutura["membros"]
+                if agrupada:
+                    # visita agrupada: uma parada por item entregue, no mesmo horário, descarregando em sequência
+                    itens = [
+                        (node_by_id[i], int(round(val(f["q_deliv"], i, k, r_idx))))
+                        for i in estrutura["membros"][j] if f["q_deliv"].has(i, k)
+                    ]
+                    itens = [(it, q) for it, q in itens if q > 0]
                 else:
-                    qty_visit = int(round(nd.quantity))
-
-                rows.append({
-                    "Sequência": seq,
-                    "Veículo": k,
-                    "Viagem": r,
-                    "Local": nd.local,
-                    "Operação": nd.service_type,
-                    "Item": nd.item,
-                    "Código": nd.codigo,
-                    "Quantidade": qty_visit,
-                    "Slots": round(float(nd.slots_unit * qty_visit) if nd.service_type == "delivery" else float(nd.slots_total), 2),
-                    "Hora Modelo": round(float(pulp.value(T[j][k][r]) or 0.0), 2),
-                    "Atraso (h)": round(float(pulp.value(late[j][k][r]) or 0.0), 2),
-                    "Carga após serviço (slots)": round(float(pulp.value(load[j][k][r]) or 0.0), 2),
-                    "Carga itens longos": round(float(pulp.value(long_load[j][k][r]) or 0.0), 2),
-                    "Carga pessoas": round(float(pulp.value(people_load[j][k][r]) or 0.0), 2),
-                })
-
-                route_map_rows.append({
-                    "Veículo": k,
-                    "Viagem": r,
-                    "Sequência": seq,
-                    "Local": nd.local,
-                    "Latitude": nd.lat,
-                    "Longitude": nd.lon,
-                    "Operação": nd.service_type,
-                    "Item": nd.item,
-                })
-
+                    itens = [(nd, int(round(val(f["q_deliv"], j, k, r_idx))) if nd.service_type == "delivery" else int(round(nd.quantity)))]
+                carga = val(f["load"], j, k, r_idx) + (sum(it.slots_unit * q for it, q in itens) if agrupada else 0.0)
+                longos = None
+                if f["long_load"].has(j, k):
+                    longos = val(f["long_load"], j, k, r_idx) + (sum(q for it, q in itens if it.is_long) if agrupada else 0.0)
+                inicio = val(f["T"], j, k, r_idx)
+                for it, q in itens:
+                    if agrupada:
+                        carga -= it.slots_unit * q
+                        longos = None if longos is None else longos - (q if it.is_long else 0.0)
+                    stops.append({
+                        "node": it.node_id,
+                        "qty": q,
+                        "T": inicio,
+                        "late": val(f["late_item"], it.node_id, k, r_idx) if agrupada else val(f["late"], j, k, r_idx),
+                        "load": carga,
+                        "long_load": longos,
+                        "people_load": val(f["people_load"], j, k, r_idx) if f["people_load"].has(j, k) else None,
+                    })
+                    # na visita agrupada, o próximo item começa depois do serviço deste
+                    inicio += it.service_time_h if agrupada else 0.0
                 curr = j
-                seq += 1
 
-            total_dist += trip_dist
-            if rows:
-                route_tables.append({
+            if stops:
+                _completar_cargas(node_by_id, stops)
+                viagens.append({
                     "vehicle": k,
                     "trip": r,
-                    "distance_km": round(trip_dist, 2),
-                    "trip_start_h": round(float(pulp.value(trip_start[k][r]) or 0.0), 2),
-                    "trip_end_h": round(float(pulp.value(trip_end[k][r]) or 0.0), 2),
-                    "data": pd.DataFrame(rows),
+                    "start": val(f["trip_start"], None, k, r_idx),
+                    "end": val(f["trip_end"], None, k, r_idx),
+                    "stops": stops,
                 })
+    return {"viagens": viagens}
+
+
+def _assinaturas_tarefas(dados: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    Identidade de cada tarefa (delivery ou coleta) que não depende da posição da linha em
+    df_planejamento, ao contrário do id do nó. Repetições da mesma assinatura são numeradas na ordem dos nós.
+    """
+    nodes: List[ServiceNode] = sorted(dados["service_nodes"], key=lambda n: n.node_id)
+    drop_by_pair = {n.pair_id: n for n in nodes if n.service_type == "dropoff"}
+    ocorrencias: Dict[Tuple, int] = {}
+    assinaturas = {}
+    for n in nodes:
+        if n.service_type == "dropoff":
+            continue
+        drop = drop_by_pair.get(n.pair_id) if n.service_type == "pickup" else None
+        base = (n.service_type, n.local, n.item, n.codigo, n.prazo_horas, drop.local if drop else None)
+        ocorrencias[base] = ocorrencias.get(base, 0) + 1
+        assinaturas[n.node_id] = {
+            "chave": base + (ocorrencias[base],),
+            "quantidade": n.quantity,
+            "dropoff": drop.node_id if drop else None,
+        }
+    return assinaturas
+
+
+def _montar_resultado(dados: Dict[str, Any], plano: Dict[str, Any], status: str, objective_value: float, gap: Dict[str, float | None]) -> Dict[str, Any]:
+    """Monta as tabelas de rotas, coletas, demandas, o mapa e o resumo a partir do plano neutro."""
+    node_by_id = {n.node_id: n for n in dados["service_nodes"]}
+    loc = dados["node_loc"]
+    dist = dados["dist_loc"]
+    pairs = {p["pair_id"]: p for p in dados["paired_requests"]}
+
+    route_tables = []
+    route_map_rows = []
+    total_dist = 0.0
+    pair_assigned: Dict[str, Tuple[str, int]] = {}
+
+    for viagem in plano["viagens"]:
+        k = viagem["vehicle"]
+        r = viagem["trip"]
+        curr = 0
+        rows = []
+        trip_dist = 0.0
+
+        for seq, stop in enumerate(viagem["stops"], start=1):
+            j = stop["node"]
+            trip_dist += dist[loc[curr], loc[j]]
+            nd = node_by_id[j]
+            qty_visit = stop["qty"]
+            if nd.service_type == "pickup":
+                pair_assigned[nd.pair_id] = (k, r)
+
+            rows.append({
+                "Sequência": seq,
+                "Veículo": k,
+                "Viagem": r,
+                "Local": nd.local,
+                "Operação": nd.service_type,
+                "Item": nd.item,
+                "Código": nd.codigo,
+                "Quantidade": qty_visit,
+                "Slots": round(float(nd.slots_unit * qty_visit) if nd.service_type == "delivery" else float(nd.slots_total), 2),
+                "Hora Modelo": round(float(stop["T"]), 2),
+                "Atraso (h)": round(float(stop["late"]), 2),
+                "Carga após serviço (slots)": round(float(stop["load"]), 2),
+                "Carga itens longos": round(float(stop["long_load"]), 2),
+                "Carga pessoas": round(float(stop["people_load"]), 2),
+            })
+
+            route_map_rows.append({
+                "Veículo": k,
+                "Viagem": r,
+                "Sequência": seq,
+                "Local": nd.local,
+                "Latitude": nd.lat,
+                "Longitude": nd.lon,
+                "Operação": nd.service_type,
+                "Item": nd.item,
+            })
+            curr = j
+
+        if curr != 0:
+            trip_dist += dist[loc[curr], 0]
+        total_dist += trip_dist
+        if rows:
+            route_tables.append({
+                "vehicle": k,
+                "trip": r,
+                "distance_km": round(float(trip_dist), 2),
+                "trip_start_h": round(float(viagem["start"]), 2),
+                "trip_end_h": round(float(viagem["end"]), 2),
+                "data": pd.DataFrame(rows),
+            })
 
     pair_rows = []
     for pid, info in pairs.items():
-        assigned = None
-        for k in vehicles:
-            for r in trips:
-                if (pulp.value(pair_assign[pid][k][r]) or 0.0) > 0.5:
-                    assigned = (k, r)
+        assigned = pair_assigned.get(pid)
         pair_rows.append({
             "Coleta": pid,
             "Origem": info["origem"],
@@ -786,28 +2248,417 @@ def executar_solver(
     map_buffer.seek(0)
     plt.close(fig)
 
+    mip_gap = gap.get("mip_gap")
+    mip_gap_pct = gap.get("mip_gap_pct")
+    best_objective = gap.get("best_objective")
+    best_bound = gap.get("best_bound")
     gap_otimo = (mip_gap_pct is not None) and (mip_gap_pct < 1.0)
     gap_deve_reportar = (mip_gap_pct is not None) and (mip_gap_pct >= 1.0)
 
     return {
         "status": status,
-        "objective_value": round(total_cost, 2),
+        "objective_value": round(float(objective_value), 2),
         "mip_gap": None if mip_gap is None else round(mip_gap, 6),
         "mip_gap_pct": None if mip_gap_pct is None else round(mip_gap_pct, 2),
         "best_objective": None if best_objective is None else round(best_objective, 2),
         "best_bound": None if best_bound is None else round(best_bound, 2),
         "route_tables": route_tables,
         "routes_map_bytes": map_buffer.getvalue(),
+        # plano neutro e identidade das tarefas: base da reotimização incremental
+        "plano": plano,
+        "assinaturas_tarefas": _assinaturas_tarefas(dados),
         "pairs_table": pd.DataFrame(pair_rows),
         "demands_table": pd.DataFrame(demand_rows),
         "summary": {
-            "veiculos_utilizados": int(sum(1 for k in vehicles if any((pulp.value(trip_used[k][r]) or 0) > 0.5 for r in trips))),
-            "viagens_utilizadas": int(sum(1 for k in vehicles for r in trips if (pulp.value(trip_used[k][r]) or 0) > 0.5)),
-            "distancia_total_km": round(total_dist, 2),
+            "veiculos_utilizados": len({v["vehicle"] for v in plano["viagens"]}),
+            "viagens_utilizadas": len(plano["viagens"]),
+            "distancia_total_km": round(float(total_dist), 2),
             "gap_otimo": gap_otimo,
             "gap_deve_reportar": gap_deve_reportar,
         },
     }
 
 
+def _otimizar_modelo_arcos(
+    dados: Dict[str, Any],
+    arcs: Dict[str, List[Tuple[int, int]]],
+    opcoes: OpcoesSolver,
+    plano_inicial: Dict[str, Any] | None = None,
+    referencia: Tuple[float, float] | None = None,
+) -> Dict[str, Any]:
+    """
+    Monta e resolve o MIP; devolve o plano neutro e as métricas do solver (sem tabelas nem mapa).
+    `plano_inicial` (p. ex. de uma rodada anterior) disputa o warm start com o plano construtivo;
+    `referencia` (objetivo, instante) é o melhor incumbente anterior, para a janela sem melhora.
+    """
+    svc_nodes: List[ServiceNode] = dados["service_nodes"]
+    itens_longos = dados.get("itens_longos", [])
+
+    opcoes = _com_orcamento(opcoes, len(svc_nodes))
+    t0 = time.perf_counter()
+    model, estrutura = _build_arc_model(dados, arcs, opcoes)
+    arrays = model.finalize()
+    t_build = time.perf_counter() - t0
+    print(f"MODELO ({opcoes.backend}): {arrays['n_cols']} variáveis, {arrays['n_rows']} restrições, {len(arrays['a_value'])} não nulos, montado em {t_build:.2f}s")
+    print("CARGA ACOMPANHADA: itens longos em", estrutura["com_longos"] or "nenhum veículo", "| pessoas em", estrutura["com_pessoas"] or "nenhum veículo")
+    if estrutura["membros"]:
+        print(f"VISITAS AGRUPADAS: {len(estrutura['visita_de'])} entregas em {len(estrutura['membros'])} visitas")
+
+    solucao_inicial = None
+    custo_inicial = None
+    if opcoes.warm_start:
+        from heuristicas import plano_construtivo
+
+        t0 = time.perf_counter()
+        planos = [
+            plano_construtivo(dados, horizonte=_horizonte_modelo(dados), viagens_ordenadas=opcoes.simetria_viagens, visita_de=estrutura["visita_de"]),
+            plano_inicial,
+        ]
+        for plano_ini in planos:
+            sol = _solucao_do_plano(dados, estrutura, plano_ini, arrays["n_cols"]) if plano_ini is not None else None
+            # o HiGHS descarta em silêncio uma solução inicial inviável (p. ex. fora da ordem de simetria)
+            violadas = _violacoes(arrays, sol) if sol is not None else []
+            if violadas:
+                print(f"WARM START DESCARTADO: {len(violadas)} restrições violadas (ex.: {violadas[0]})")
+                continue
+            if sol is not None and (custo_inicial is None or float(arrays["col_cost"] @ sol) < custo_inicial):
+                solucao_inicial, custo_inicial = sol, float(arrays["col_cost"] @ sol)
+        print(f"WARM START: custo = {custo_inicial} ({time.perf_counter() - t0:.2f}s)")
+
+    acompanhamento = _Acompanhamento(opcoes, lambda x: _extrair_plano(dados, estrutura, x), referencia=referencia)
+    if opcoes.portfolio > 1:
+        from portfolio import resolver_portfolio
+
+        status, col_value, gap, corridas = resolver_portfolio(arrays, opcoes, solucao_inicial, acompanhamento)
+    elif opcoes.backend == "highspy":
+        status, col_value, h = _solve_highspy(arrays, opcoes, solucao_inicial, acompanhamento)
+    elif opcoes.backend == "pulp":
+        status, col_value, h = _solve_pulp(arrays, opcoes, solucao_inicial, acompanhamento)
+    else:
+        raise ValueError(f"Backend desconhecido: {opcoes.backend!r} (use 'pulp' ou 'highspy')")
+    if opcoes.portfolio <= 1:
+        gap = _gap_info(h)
+        acompanhamento.motivo = _motivo_parada(h, acompanhamento, gap)
+        corridas = None
+
+    vehicles = estrutura["vehicles"]
+    trips = estrutura["trips"]
+    f = estrutura["families"]
+    print("STATUS SOLVER:", status)
+    print("R_MAX:", dados["r_max"])
+    print("NÚMERO DE NÓS DE SERVIÇO:", len(svc_nodes))
+    print(
+        "DELIVERIES:", sum(1 for n in svc_nodes if n.service_type == "delivery"),
+        "PICKUPS:", sum(1 for n in svc_nodes if n.service_type == "pickup"),
+        "DROPOFFS:", sum(1 for n in svc_nodes if n.service_type == "dropoff"),
+    )
+    print("ITENS LONGOS IDENTIFICADOS:", itens_longos)
+    print("DISTÂNCIAS:", dados["distance_provider"], "| CACHE:", dados["distance_cache_stats"])
+    print("MIP GAP (%):", gap["mip_gap_pct"], "| PARADA:", acompanhamento.motivo, f"(orçamento {opcoes.time_limit_s:.0f}s)")
+
+    items_instancia = sorted(set(n.item for n in svc_nodes))
+    for k in vehicles:
+        compat_items = [item for item in items_instancia if dados["compat"].get((k, item), 0) == 1]
+        print(f"VEÍCULO {k} COMPATÍVEL COM: {compat_items}")
+        if col_value is None:
+            continue
+        print(f"VEÍCULO {k} - u =", col_value[f["u"].col(None, k)])
+        for r_idx, r in enumerate(trips):
+            print(
+                f"  viagem {r}: trip_used={col_value[f['trip_used'].col(None, k, r_idx)]}, "
+                f"trip_start={col_value[f['trip_start'].col(None, k, r_idx)]}, "
+                f"trip_end={col_value[f['trip_end'].col(None, k, r_idx)]}"
+            )
+
+    if status not in {"Optimal", "Feasible"}:
+        return {
+            "status": status,
+            "mensagem": "O solver não encontrou solução viável para a formulação atual.",
+            "motivo_parada": acompanhamento.motivo,
+        }
+
+    return {
+        "status": status,
+        "plano": _extrair_plano(dados, estrutura, col_value),
+        "objective_value": float(arrays["col_cost"] @ col_value),
+        "gap": gap,
+        "modo": "mip",
+        "backend": opcoes.backend,
+        "custo_warm_start": None if custo_inicial is None else round(custo_inicial, 2),
+        "tempo_montagem_s": round(t_build, 3),
+        "portfolio": corridas,
+        "historico_incumbentes": acompanhamento.historico,
+        "motivo_parada": acompanhamento.motivo,
+        "limite_raiz": acompanhamento.limite_raiz,
+        "tempo_limite_s": opcoes.time_limit_s,
+    }
+
+
+def _viagens_minimas(dados: Dict[str, Any]) -> int:
+    """
+    Limite inferior de viagens por veículo (bin packing por item): os slots de cada item divididos
+    pela capacidade somada dos veículos compatíveis com ele, e o total pela capacidade da frota.
+    """
+    veiculos = dados["vehicles"]
+    nodes = [n for n in dados["service_nodes"] if n.service_type in ("delivery", "pickup")]
+    slots_item: Dict[str, float] = {}
+    for n in nodes:
+        slots_item[n.item] = slots_item.get(n.item, 0.0) + n.slots_total
+    viagens = math.ceil(sum(slots_item.values()) / max(1.0, sum(v["cap_slots"] for v in veiculos.values())))
+    for item, slots in slots_item.items():
+        cap = sum(v["cap_slots"] for k, v in veiculos.items() if dados["compat"].get((k, item), 0) == 1)
+        if cap > 0:
+            viagens = max(viagens, math.ceil(slots / cap))
+    return max(1, int(viagens))
+
+
+def _otimizar_horizonte_dinamico(dados: Dict[str, Any], arcs: Dict[str, List[Tuple[int, int]]], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    """
+    Resolve o MIP com poucas viagens por veículo e acrescenta viagens por rodadas: dobra enquanto o
+    modelo for inviável e soma uma enquanto houver atraso em algum veículo que usa todas as viagens e
+    o custo continuar caindo. Cada rodada parte do melhor plano anterior e usa o tempo que resta do
+    orçamento da execução inteira; a janela sem melhora também conta do melhor incumbente até ali.
+    """
+    r_max = int(dados["r_max"])
+    r = min(r_max, _viagens_minimas(dados))
+    opcoes = _com_orcamento(opcoes, len(dados["service_nodes"]))
+    t0 = time.perf_counter()
+    rodadas: List[Dict[str, Any]] = []
+    melhor: Dict[str, Any] | None = None
+    melhorado_em = t0
+    while True:
+        restante = opcoes.time_limit_s - (time.perf_counter() - t0)
+        t_rodada = time.perf_counter()
+        print(f"HORIZONTE: rodada {len(rodadas) + 1} com {r} viagens por veículo (r_max = {r_max})")
+        solucao = _otimizar_modelo_arcos(
+            dict(dados, r_max=r), arcs, replace(opcoes, time_limit_s=max(1.0, restante)),
+            plano_inicial=melhor["plano"] if melhor else None,
+            referencia=(melhor["objective_value"], melhorado_em) if melhor else None,
+        )
+        ok = solucao["status"] in ("Optimal", "Feasible")
+        atraso_h = sum(p["late"] for v in solucao["plano"]["viagens"] for p in v["stops"]) if ok else None
+        usadas: Dict[str, int] = {}
+        for v in solucao["plano"]["viagens"] if ok else []:
+            usadas[v["vehicle"]] = usadas.get(v["vehicle"], 0) + 1
+        saturados = [k for k, n in usadas.items() if n >= r]
+        rodadas.append({
+            "viagens": r,
+            "status": solucao["status"],
+            "objetivo": round(solucao["objective_value"], 2) if ok else None,
+            "atraso_h": None if atraso_h is None else round(atraso_h, 2),
+            "veiculos_saturados": len(saturados),
+            "tempo_s": round(time.perf_counter() - t_rodada, 2),
+        })
+        melhorou = ok and (melhor is None or solucao["objective_value"] < melhor["objective_value"] - 1e-6)
+        if melhorou:
+            melhor = solucao
+            # instante do último incumbente: fim da rodada menos o tempo de resolução depois dele
+            historico = solucao.get("historico_incumbentes") or []
+            duracao = time.perf_counter() - t_rodada - solucao.get("tempo_montagem_s", 0.0)
+            melhorado_em = time.perf_counter() - (max(0.0, duracao - historico[-1]["tempo_s"]) if historico else 0.0)
+        sem_melhora = opcoes.parar_sem_melhora_s is not None and time.perf_counter() - melhorado_em >= opcoes.parar_sem_melhora_s
+        if r >= r_max or time.perf_counter() - t0 >= opcoes.time_limit_s or sem_melhora:
+            break
+        if not ok and solucao["status"] == "Infeasible" and melhor is None:
+            r = min(r_max, 2 * r)
+        elif melhorou and atraso_h > 1e-6 and saturados:
+            r += 1
+        else:
+            break
+    resultado = melhor if melhor is not None else solucao
+    resultado["rodadas_horizonte"] = rodadas
+    print("HORIZONTE:", [(rd["viagens"], rd["status"], rd["objetivo"]) for rd in rodadas])
+    return resultado
+
+
+def _otimizar_mip(dados: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    # Modo granular: se a vizinhança restrita tornar o modelo inviável, dobra k até liberar todos os arcos
+    svc_nodes: List[ServiceNode] = dados["service_nodes"]
+    vehicles = list(dados["vehicles"].keys())
+    granular_k = opcoes.granular_k
+    while True:
+        arcs = _admissible_arcs(svc_nodes, vehicles, dados["compat"], dados["dist_loc"], dados["node_loc"], granular_k)
+        print("ARCOS POR VEÍCULO:", {k: len(a) for k, a in arcs.items()}, "| GRANULAR k =", granular_k)
+        if opcoes.horizonte_dinamico:
+            solucao = _otimizar_horizonte_dinamico(dados, arcs, opcoes)
+        else:
+            solucao = _otimizar_modelo_arcos(dados, arcs, opcoes)
+        if solucao["status"] != "Infeasible" or granular_k is None:
+            break
+        granular_k = granular_k * 2 if granular_k * 2 < len(svc_nodes) - 1 else None
+        print("MODELO GRANULAR INVIÁVEL: ampliando k para", granular_k if granular_k is not None else "todos os arcos")
+    solucao["granular_k"] = granular_k
+    return solucao
+
+
+def _resultado_da_solucao(dados: Dict[str, Any], solucao: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado completo (tabelas, mapa, resumo) a partir da solução neutra de `_otimizar_mip`."""
+    if "plano" not in solucao:
+        return solucao
+    meta = {k: v for k, v in solucao.items() if k not in ("status", "plano", "objective_value", "gap")}
+    resultado = _montar_resultado(dados, solucao["plano"], solucao["status"], solucao["objective_value"], solucao["gap"])
+    resultado.update(meta)
+    return resultado
+
+
+def _resolver_heuristica(dados: Dict[str, Any], opcoes: OpcoesSolver) -> Dict[str, Any]:
+    from heuristicas import plano_rapido
+
+    t0 = time.perf_counter()
+    estatisticas = None
+    if opcoes.modo == "alns":
+        from alns import ParametrosALNS, plano_alns
+
+        plano, pendentes, estatisticas = plano_alns(dados, ParametrosALNS(tempo_limite_s=opcoes.alns_tempo_s, seed=opcoes.seed))
+    else:
+        plano, pendentes = plano_rapido(dados)
+    t_heur = time.perf_counter() - t0
+    print(f"PLANO {opcoes.modo.upper()}: custo = {plano['custo']:.2f}, {len(plano['viagens'])} viagens em {t_heur:.2f}s")
+    if pendentes:
+        node_by_id = {n.node_id: n for n in dados["service_nodes"]}
+        locais = sorted({node_by_id[n].local for n in pendentes})
+        return {
+            "status": "Infeasible",
+            "mensagem": f"A heurística não conseguiu alocar tarefas em: {', '.join(locais)}.",
+        }
+
+    resultado = _montar_resultado(dados, plano, "Feasible", plano["custo"], {})
+    resultado["modo"] = opcoes.modo
+    resultado["tempo_heuristica_s"] = round(t_heur, 3)
+    if estatisticas is not None:
+        resultado["alns"] = {
+            "iteracoes": estatisticas.iteracoes,
+            "melhorias": estatisticas.melhorias,
+            "custo_inicial": round(estatisticas.custo_inicial, 2),
+            "pesos_remocao": estatisticas.pesos_remocao,
+            "pesos_insercao": estatisticas.pesos_insercao,
+            "seed": opcoes.seed,
+        }
+    return resultado
+
+
+def _com_tipos_veiculo(resultado: Dict[str, Any], dados: Dict[str, Any]) -> Dict[str, Any]:
+    # Tipo -> placas consideradas e placas efetivamente usadas nas rotas
+    usadas = {rt["vehicle"] for rt in resultado.get("route_tables", [])}
+    resultado["tipos_veiculo"] = {
+        tipo: {"placas": placas, "usadas": [k for k in placas if k in usadas]}
+        for tipo, placas in dados["vehicle_types"].items()
+    }
+    return resultado
+
+
+def _validar_dados(dados: Dict[str, Any]) -> Dict[str, Any] | None:
+    """Resultado de erro quando não há o que otimizar ou algum item não tem veículo compatível."""
+    vehicles = list(dados["vehicles"].keys())
+    svc_nodes: List[ServiceNode] = dados["service_nodes"]
+    if not vehicles or not svc_nodes:
+        return {"status": "Infeasible", "mensagem": "Sem veículos ou sem tarefas para otimizar."}
+
+    sem_veiculo = sorted({n.item for n in svc_nodes if not any(dados["compat"].get((k, n.item), 0) == 1 for k in vehicles)})
+    if sem_veiculo:
+        return {"status": "Infeasible", "mensagem": f"Nenhum veículo selecionado é compatível com: {', '.join(sem_veiculo)}."}
+    return None
+
+
+def executar_solver(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    final_destinos_nao_retornam=None,
+    opcoes: OpcoesSolver | None = None,
+) -> Dict[str, Any]:
+    opcoes = opcoes or OpcoesSolver()
+    argumentos = (df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam)
+    em_cache = resultado_em_cache(*argumentos, opcoes)
+    if em_cache is not None:
+        return em_cache
+    resultado = _executar_solver(*argumentos, opcoes)
+
+    cache = _get_result_cache() if opcoes.usar_cache else None
+    if cache is not None and resultado.get("status") in ("Optimal", "Feasible"):
+        chave = impressao_digital(*argumentos, opcoes)
+        try:
+            cache.put(chave, resultado)
+        except (sqlite3.Error, OSError, pickle.PicklingError) as exc:
+            print("CACHE DE RESULTADOS: não foi possível salvar:", exc)
+        else:
+            resultado["cache"] = {"hit": False, "chave": chave, "criado_em": time.time()}
+    return resultado
+
+
+def _executar_solver(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    final_destinos_nao_retornam,
+    opcoes: OpcoesSolver,
+) -> Dict[str, Any]:
+    dados = preparar_dados_solver(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam)
+    erro = _validar_dados(dados)
+    if erro is not None:
+        return erro
+
+    if opcoes.agrupar_veiculos_identicos:
+        dados = _agrupar_veiculos(dados)
+        vehicles = list(dados["vehicles"].keys())
+        print("TIPOS DE VEÍCULO:", {t: len(p) for t, p in dados["vehicle_types"].items()}, "| PLACAS NO MODELO:", len(vehicles))
+
+    if opcoes.modo in ("rapido", "alns"):
+        resultado = _resolver_heuristica(dados, opcoes)
+        return _com_tipos_veiculo(resultado, dados)
+    if opcoes.modo == "decomposicao":
+        from decomposicao import resolver_decomposicao
+
+        resultado = _resultado_da_solucao(dados, resolver_decomposicao(dados, opcoes))
+        return _com_tipos_veiculo(resultado, dados)
+    if opcoes.modo == "colunas":
+        from colunas import resolver_colunas
+
+        resultado = _resultado_da_solucao(dados, resolver_colunas(dados, opcoes))
+        return _com_tipos_veiculo(resultado, dados)
+    if opcoes.modo != "mip":
+        raise ValueError(f"Modo desconhecido: {opcoes.modo!r} (use 'mip', 'rapido', 'alns', 'decomposicao' ou 'colunas')")
+
+    resultado = _resultado_da_solucao(dados, _otimizar_mip(dados, opcoes))
+    return _com_tipos_veiculo(resultado, dados)
+
+
+def executar_reotimizacao(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    resultado_anterior: Dict[str, Any],
+    final_destinos_nao_retornam=None,
+    opcoes: OpcoesSolver | None = None,
+) -> Dict[str, Any]:
+    """
+    Reotimiza só a parte do plano de `resultado_anterior` afetada pelas mudanças em df_planejamento;
+    as viagens dos demais veículos são mantidas. Resultado no formato de `executar_solver`, com o
+    quanto do plano foi reaproveitado em "reaproveitamento".
+    """
+    from incremental import reotimizar
+
+    opcoes = opcoes or OpcoesSolver()
+    dados = preparar_dados_solver(df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam)
+    erro = _validar_dados(dados)
+    if erro is not None:
+        return erro
+    # sem agrupar placas idênticas aqui: as viagens mantidas seguem nas placas do plano anterior
+    resultado = _resultado_da_solucao(dados, reotimizar(dados, resultado_anterior, opcoes))
+    return _com_tipos_veiculo(resultado, dados)
+
+
+def executar_plano_rapido(
+    df_veiculos_selecionados: pd.DataFrame,
+    df_planejamento: pd.DataFrame,
+    df_itens: pd.DataFrame,
+    final_destinos_nao_retornam=None,
+) -> Dict[str, Any]:
+    """Plano heurístico com o mesmo formato de resultado do MIP, em segundos."""
+    return executar_solver(
+        df_veiculos_selecionados, df_planejamento, df_itens, final_destinos_nao_retornam,
+        opcoes=OpcoesSolver(modo="rapido"),
+    )
+
+
 run_optimization = executar_solver